@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Benchmarks how vs_build scales on a synthetic project.
+
+Usage: python benchmarks/bench_project.py [--modules=<N>] [--depth=<N>] [--fanout=<N>] [--nesting=<N>]
+                                          [--generators=<N>] [--repeat=<N>] [--output=<path>] [--compare=<path>]
+
+--modules -> number of Verilog modules, spread over the levels of the hierarchy (default 200).
+--depth -> number of levels of the module hierarchy (default 6).
+--fanout -> number of .vs files included by each module (default 4).
+--nesting -> number of .vs files included one inside the other by each of those (default 3).
+--generators -> number of files generated by no-op scripts, half by a Python script and half by a shell script (default 8).
+--repeat -> number of times each step is timed, the minimum and median are kept (default 3).
+--output -> JSON file where the results are written (default bench_project.json).
+--compare -> JSON file written by a previous run, printed next to the new results.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from VeriSnip import vs_build
+from VeriSnip.vs_graph import DependencyGraph
+from VeriSnip.vs_scheduler import GeneratorScheduler
+
+DEFAULT_CONFIG = {
+    "modules": 200,
+    "depth": 6,
+    "fanout": 4,
+    "nesting": 3,
+    "generators": 8,
+    "repeat": 3,
+}
+
+
+def parse_config():
+    """
+    Parses the benchmark options.
+
+    Returns:
+        tuple: The project configuration (dict), the output path and the path of the results to compare with.
+    """
+    config = dict(DEFAULT_CONFIG)
+    output_path = "bench_project.json"
+    compare_path = None
+    for argument in sys.argv[1:]:
+        option = re.match(r"^--(\w+)=(.+)$", argument)
+        if option is None:
+            sys.exit(__doc__)
+        name, value = option.groups()
+        if name == "output":
+            output_path = value
+        elif name == "compare":
+            compare_path = value
+        elif name in config and value.isdigit():
+            config[name] = int(value)
+        else:
+            sys.exit(__doc__)
+    return config, output_path, compare_path
+
+
+def generate_project(directory, config):
+    """
+    Writes a synthetic project.
+
+    The modules form a tree of `depth` levels under the "top" module, every module includes
+    `fanout` of the shared .vs files, each of them the start of a chain of `nesting` .vs files,
+    and "top" includes the files generated by the scripts.
+
+    Args:
+        directory (str): Directory where the project is written.
+        config (dict): The project configuration.
+    """
+    for subdirectory in ["rtl", "snippets", "scripts"]:
+        os.makedirs(os.path.join(directory, subdirectory))
+
+    modules = max(config["modules"], 1)
+    depth = max(min(config["depth"], modules), 1)
+    levels = [[] for _ in range(depth)]
+    levels[0].append("top")
+    for index in range(1, modules):
+        levels[1 + (index - 1) % (depth - 1) if depth > 1 else 0].append(f"m{index}")
+    children = {name: [] for level in levels for name in level}
+    for level, names in enumerate(levels[1:], 1):
+        for index, name in enumerate(names):
+            parents = levels[level - 1]
+            children[parents[index % len(parents)]].append(name)
+
+    chains = max(config["fanout"] * 4, 1)
+    for chain in range(chains):
+        for step in range(config["nesting"]):
+            lines = [f"  wire chain_{chain}_{step};\n"]
+            if step + 1 < config["nesting"]:
+                lines.append(f'  `include "chain_{chain}_{step + 1}.vs"\n')
+            with open(os.path.join(directory, "snippets", f"chain_{chain}_{step}.vs"), "w") as file:
+                file.writelines(lines)
+
+    generated = [
+        f"gen_py_{index}.vs" if index % 2 == 0 else f"gen_sh_{index}.vs"
+        for index in range(config["generators"])
+    ]
+    for module_index, name in enumerate(children):
+        lines = [f"module {name} #(\n  parameter WIDTH = 8\n) (\n  input clk\n);\n"]
+        if config["nesting"] > 0:
+            for include in range(config["fanout"]):
+                lines.append(f'  `include "chain_{(module_index + include) % chains}_0.vs"\n')
+        if name == "top":
+            lines.extend(f'  `include "{file_name}" // {{WIDTH}}\n' for file_name in generated)
+        for child in children[name]:
+            lines.append(f"  {child} #(.WIDTH(WIDTH)) u_{child} (\n    .clk(clk)\n  );\n")
+        lines.append("endmodule\n")
+        with open(os.path.join(directory, "rtl", f"{name}.v"), "w") as file:
+            file.writelines(lines)
+
+    scripts = {
+        "gen_py.py": (
+            "#!/usr/bin/env python3\nimport os, sys\n"
+            'output_directory = os.environ.get("VS_OUTPUT_DIR", ".")\n'
+            'with open(os.path.join(output_directory, f"gen_py_{sys.argv[1]}"), "w") as file:\n'
+            '    file.write("  // generated\\n")\n'
+        ),
+        "gen_sh.sh": '#!/bin/sh\necho "  // generated" > "${VS_OUTPUT_DIR:-.}/gen_sh_$1"\n',
+    }
+    for script_name, content in scripts.items():
+        script_path = os.path.join(directory, "scripts", script_name)
+        with open(script_path, "w") as file:
+            file.write(content)
+        os.chmod(script_path, 0o755)
+
+
+def clean_project(directory):
+    """
+    Removes everything vs_build wrote in the project.
+
+    Args:
+        directory (str): The project directory.
+    """
+    for subdirectory in ["build", "generated", vs_build.CACHE_DIRECTORY]:
+        shutil.rmtree(os.path.join(directory, subdirectory), ignore_errors=True)
+
+
+def time_step(repeat, step, setup=None):
+    """
+    Times a step several times.
+
+    Args:
+        repeat (int): Number of runs.
+        step (callable): The step to time.
+        setup (callable, optional): Called before each run, not timed.
+
+    Returns:
+        dict: The time of each run, their minimum and their median, in seconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        step()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def run_benchmarks(directory, config):
+    """
+    Times the stages of vs_build on the synthetic project.
+
+    Args:
+        directory (str): The project directory.
+        config (dict): The project configuration.
+
+    Returns:
+        dict: The timings of each step, by name.
+    """
+    repeat = max(config["repeat"], 1)
+    timings = {}
+    state = {}
+
+    def find_files():
+        state["files"] = vs_build.find_existing_files(directory, [])
+
+    timings["find_existing_files (cold)"] = time_step(
+        repeat, find_files, lambda: clean_project(directory)
+    )
+    timings["find_existing_files (warm)"] = time_step(repeat, find_files)
+
+    def dependency_tree():
+        script_files, verilog_files = vs_build.find_existing_files(directory, [])
+        graph = DependencyGraph(GeneratorScheduler())
+        os.makedirs(os.path.join(directory, "generated"), exist_ok=True)
+        state["sources"] = vs_build.build_dependency_tree(
+            directory, verilog_files, script_files, "top", {}, graph
+        )
+
+    timings["build_dependency_tree"] = time_step(
+        repeat, dependency_tree, lambda: clean_project(directory)
+    )
+
+    def substitute():
+        expanded_snippets = {}
+        for source_file in state["sources"]:
+            if not source_file.endswith(".vs"):
+                vs_build.substitute_vs_file(source_file, state["sources"], expanded_snippets)
+
+    timings["substitute_vs_file"] = time_step(repeat, substitute)
+
+    def end_to_end():
+        sys.argv = ["vs_build", "top", "--quiet"]
+        vs_build.main()
+
+    timings["main (cold)"] = time_step(repeat, end_to_end, lambda: clean_project(directory))
+    timings["main (warm)"] = time_step(repeat, end_to_end)
+    return timings
+
+
+def current_commit():
+    """
+    Returns the commit of the vs_build sources being benchmarked.
+
+    Returns:
+        str or None: The commit hash, or None if vs_build is not in a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(vs_build.__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    Generates the synthetic project, times vs_build on it and writes the results.
+    """
+    config, output_path, compare_path = parse_config()
+    output_path = os.path.abspath(output_path)
+    previous = None
+    if compare_path is not None:
+        with open(compare_path, "r") as file:
+            previous = json.load(file)
+
+    saved_directory = os.getcwd()
+    saved_arguments = sys.argv
+    with tempfile.TemporaryDirectory(prefix="vs_bench_") as directory:
+        generate_project(directory, config)
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                timings = run_benchmarks(directory, config)
+        finally:
+            os.chdir(saved_directory)
+            sys.argv = saved_arguments
+
+    results = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "timings": timings,
+    }
+    with open(output_path, "w") as file:
+        json.dump(results, file, indent=2)
+
+    print(f"Results written to {output_path}")
+    for name, timing in timings.items():
+        line = f"{name:>28}: {timing['min'] * 1000:9.1f} ms min, {timing['median'] * 1000:9.1f} ms median"
+        if previous is not None and name in previous["timings"]:
+            ratio = timing["median"] / previous["timings"][name]["median"]
+            line += f" ({ratio:5.2f}x of {(previous.get('commit') or 'previous')[:10]})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
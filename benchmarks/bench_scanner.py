@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Benchmarks the single-pass Verilog scanner against the regular expressions vs_build used before it.
+
+Usage: python benchmarks/bench_scanner.py [size_in_MB ...]
+
+The delayed-assignment netlists are kept small, the old regular expressions take quadratic time on them.
+"""
+
+import random
+import re
+import sys
+import time
+
+from VeriSnip.vs_scan import scan_verilog
+
+
+def legacy_scan(content):
+    """
+    Extracts the same facts as `scan_verilog` with the regular expressions vs_build used before.
+
+    Like `scan_verilog`, only the first instantiation of each module and the first of identical
+    parameter pairs are kept.
+
+    Args:
+        content (str): The content of the Verilog file.
+
+    Returns:
+        dict: The facts found in the file.
+    """
+    param_def_pattern = r"^\s*parameter\s+(?:\w+\s+)?(\w+)\s*=\s*([^,;\n)]+)"
+    param_inst_pattern = r"\.(\w+)\s*\(\s*([^)]+?)\s*\)"
+    module_inst_with_params = r"\n\s*?\w+?\s+?#\(([\s\S]*?)\)\s*?\w+?\s*?\("
+    moduleInstantiationPattern = r"\n\s*?(\w+?)\s+?(?:#\([\s\S]*?\))?\s*?(\w+?)\s*?\(\s*?(\.\w+?\s*?\([\s\S]*?)\);"
+    includePattern = r'\n\s*?`include\s+?"(.*?)"(?!\s*?/\*)(.*)'
+    multiCommentIncludePattern = r'\n\s*?`include\s+?"(.*?)"\s*?/\*([\s\S]*?)\*/'
+
+    definitions = unique_pairs(
+        [match.group(1), match.group(2).strip()]
+        for match in re.finditer(param_def_pattern, content, re.MULTILINE)
+    )
+    instantiations = unique_pairs(
+        [param_match.group(1), param_match.group(2).strip()]
+        for inst_match in re.finditer(module_inst_with_params, content)
+        for param_match in re.finditer(param_inst_pattern, inst_match.group(1))
+    )
+    modules = set()
+    dependencies = []
+    for module, instance in (item[:2] for item in re.findall(moduleInstantiationPattern, content)):
+        if module not in modules:
+            modules.add(module)
+            dependencies.append([module, instance])
+    for pattern in [includePattern, multiCommentIncludePattern]:
+        dependencies.extend(list(item[:2]) for item in re.findall(pattern, content))
+    return {
+        "parameter_definitions": definitions,
+        "parameter_instantiations": instantiations,
+        "dependencies": dependencies,
+    }
+
+
+def unique_pairs(pairs):
+    """
+    Keeps the first of identical pairs.
+
+    Args:
+        pairs (iterable): The pairs.
+
+    Returns:
+        list: The pairs, without repetitions.
+    """
+    seen = set()
+    unique = []
+    for pair in pairs:
+        if tuple(pair) not in seen:
+            seen.add(tuple(pair))
+            unique.append(pair)
+    return unique
+
+
+def synthetic_netlist(size, delays=False):
+    """
+    Generates a flat Verilog netlist of roughly the given size.
+
+    Args:
+        size (int): Approximate size of the netlist, in bytes.
+        delays (bool): Generate delayed assignments and no instantiations, like a behavioural model.
+            Each "#(" not followed by an instantiation makes the lazy spans of the old regular
+            expressions search to the end of the file.
+
+    Returns:
+        str: The netlist.
+    """
+    rng = random.Random(size)
+    chunks = ["// synthetic netlist\nmodule netlist #(\n  parameter WIDTH = 8\n) (\n  input clk\n);\n"]
+    written = len(chunks[0])
+    index = 0
+    while written < size:
+        kind = rng.random()
+        if delays:
+            chunk = f"  assign #({rng.randrange(1, 9)}) n{index} = n{index - 1} ^ {rng.randrange(256)};\n"
+        elif kind < 0.6:
+            chunk = (
+                f"  wire [WIDTH-1:0] n{index};\n"
+                f"  assign n{index} = n{index - 1} ^ {rng.randrange(256)};\n"
+            )
+        elif kind < 0.9:
+            chunk = (
+                f"  cell_{index % 17} #(.DEPTH(WIDTH), .INIT({rng.randrange(256)})) u_{index} (\n"
+                f"    .clk(clk),\n    .a(n{index - 1}),\n    .q(n{index})\n  );\n"
+            )
+        elif kind < 0.97:
+            chunk = f'  `include "snippet_{index % 31}.vs" // {rng.randrange(1000)}\n'
+        else:
+            chunk = f'  `include "block_{index % 7}.vs" /*\n    argument {index}\n  */\n'
+        chunks.append(chunk)
+        written += len(chunk)
+        index += 1
+    chunks.append("endmodule\n")
+    return "".join(chunks)
+
+
+def main():
+    """
+    Times both scanners on synthetic netlists and checks that they find the same facts.
+    """
+    sizes = [float(argument) for argument in sys.argv[1:]] or [1, 4, 16]
+    cases = [(size, False) for size in sizes] + [(size / 64, True) for size in sizes]
+    for size, delays in cases:
+        content = synthetic_netlist(int(size * 1024 * 1024), delays)
+        start = time.perf_counter()
+        legacy_facts = legacy_scan(content)
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        facts = scan_verilog(content)
+        scanner_time = time.perf_counter() - start
+        same = all(facts[kind] == legacy_facts[kind] for kind in legacy_facts)
+        same = "same facts" if same else "DIFFERENT facts"
+        print(
+            f"{'delays' if delays else 'plain':>6} {len(content) / 1024 / 1024:6.2f} MB: regexes {legacy_time:7.3f} s, "
+            f"scanner {scanner_time:7.3f} s ({legacy_time / scanner_time:5.1f}x), {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,52 @@
 #!/usr/bin/env python3
 """VeriSnip (VS) is a project designed to bring the power of Verilog scripting to the open-source hardware community. This tool simplifies the generation of Verilog modules or snippets by seamlessly integrating with other programs. The generated files can be easily included in any Verilog project."""
 
+import filecmp
+import functools
+import hashlib
+import json
 import os
 import re
+import shlex
 import shutil
 import subprocess
 import sys
-
-from .vs_colours import INFO, OK, WARNING, ERROR, DEBUG, vs_print
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .vs_cache import (
+    CACHE_DIRECTORY,
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_STORE_SIZE,
+    ArtifactStore,
+    GeneratorCache,
+    ParseCache,
+    RunTimes,
+    hash_file,
+    script_inputs,
+)
+from .vs_colours import INFO, OK, WARNING, ERROR, DEBUG, configure_logging, flush_log, log_enabled, vs_print
+from .vs_depfiles import DEPS_DIRECTORY, NINJA_FILE, write_depfile, write_ninja
+from .vs_graph import DependencyGraph, ParameterScope
+from .vs_index import RACY_INTERVAL_NS, OrderedFileSet, ProjectIndex, ScriptIndex
+from .vs_jobserver import job_server
+from .vs_plan import BuildPlan
+from .vs_plugins import is_plugin
+from .vs_scan import SCANNER_VERSION, scan_verilog, scan_verilog_file
+from .vs_scheduler import GeneratorJob, GeneratorScheduler, batch_jobs
+from .vs_server import parse_socket_path, serve_builds
+from .vs_state import STATE_FILE, open_state
+from .vs_trace import span, start_tracing, stop_tracing
+from .vs_watch import POLL_INTERVAL, FileWatcher
+
+EXCLUDED_DIRECTORIES = [".git", "build", "generated", "__pycache__", CACHE_DIRECTORY]
+VERILOG_EXTENSIONS = [".v", ".vh", ".sv", ".svh", ".vs"]
+SCRIPT_EXTENSIONS = [".py", ".sh", ".lua", ".scala", ".rb", ".pl", ".tcl"]
+TESTBENCH_EXTENSIONS = [".cpp"]
+
+# A reference to a parameter in the comment argument of an include
+_PARAMETER_REFERENCE = re.compile(r"\{(\w+)\}")
 
 
 def help_build():
@@ -17,18 +56,38 @@ To show this help page:
     Usage: vs_build --help
 
 Create a build directory containing all the compiled hardware:
-    Usage: vs_build <main_module> --TestBench <testbench_name> --Boards <board_modules> --quiet --debug
+    Usage: vs_build <main_module> --TestBench <testbench_name> --Boards <board_modules> --quiet --debug --jobs <N>
     <main_module> -> This is the name of the main RTL design.
     --TestBench=<testbench_name> (optional) -> by default vs_build looks for a TestBench file with the name <main_module>_tb.
     --Boards=<board_modules> (optional) -> by default vs_build looks for NO board RTL design top module. Multiple boards can be passed in a single argument (example, "Board1 Board2 Board3").
     --quiet (optional) -> suppresses INFO prints.
     --debug (optional) -> enables DEBUG prints.
+    --log=json (optional) -> prints every message as a JSON object on its own line ("time", "level", "tool" and "message"), for CI tools reading the output.
     --inc_dir=<directory> (optional) -> define aditional directories where vs_build will look for Verilog files and scripts.
+    --jobs=<N> or -j <N> (optional) -> maximum number of generator scripts running at the same time, by default the number of CPU cores. Under a parallel GNU Make (a recipe marked with "+", or make 4.4 and later), the scripts also take their slots from the make jobserver, and the default is the -j of make.
+    --no-cache (optional) -> always run the generator scripts, instead of restoring the files they generated before from the cache. Their files still replace the cached ones.
+    --cache_size=<MB> (optional) -> maximum size of the generator cache, by default 256 MB.
+    --store=<path> (optional) -> artifact store shared with other vs_build processes (for example CI jobs on a network file system), looked up when a generator call is not in the local cache. By default $VS_ARTIFACT_STORE, if set.
+    --store_size=<MB> (optional) -> maximum size of the artifact store, by default 10240 MB.
+    --profile=<path> (optional) -> trace every stage, analysed file, generator call and output of the build, writing a Chrome trace (by default vs_trace.json in the build directory, so each target of a manifest writes its own) and printing the slowest steps.
+    --ninja (optional) -> also write build/build.ninja, running vs_build again when a file any output depends on changes. Makefile depfiles are always written under build/deps.
+    --watch (optional) -> after building, keep watching the project files and rebuild what a change affects, until interrupted with Ctrl+C.
+    --plan or --plan=<path> (optional) -> resolve the whole build without running any script or writing any output, and print the generator calls (cached or to run), the outputs that would be written and the estimated script time. With a path, the plan is also written there as JSON.
+
+Build many top modules in one process, sharing the file index and the caches:
+    Usage: vs_build --manifest=<path> <options>
+    --manifest=<path> -> file listing one target per line, with the arguments vs_build takes for it (example, "core_a --Boards=_ecp5 WIDTH=8"). "#" starts a comment. The options given after vs_build apply to every target.
+    --build_dir=<name> (optional) -> build in build/<name> instead of build. Each target of a manifest is built in build/<main_module> by default.
+
+Serve build requests from a long-lived process, keeping the indexes and caches of each project in memory:
+    Usage: vs_build --server --socket=<path>
+    --socket=<path> (optional) -> Unix domain socket to listen on, by default vs_build-<uid>.sock in $XDG_RUNTIME_DIR, or server.sock in a private vs_build-<uid> directory of the temporary directory.
+    Send requests with "vs_client", which takes the same arguments as vs_build (and --socket=<path>) and builds locally if no server is listening.
     <PARAMETER_NAME>=<verilog_value> (optional) -> user defined parameters to use in the Verilog HDL code generation.
 
 Clean the contents generated by vs_build:
     Usage: vs_build --clean
-    "--clean" removes the "build" and "generated" directories.
+    "--clean" removes the "build" and "generated" directories and the generator cache.
 
 """
     vs_print(INFO, text)
@@ -43,6 +102,7 @@ def clean_build(current_directory):
     """
     remove_directory(f"{current_directory}/build")
     remove_directory(f"{current_directory}/generated")
+    remove_directory(f"{current_directory}/{CACHE_DIRECTORY}")
 
 
 def remove_directory(directory_to_remove):
@@ -61,70 +121,103 @@ def remove_directory(directory_to_remove):
         vs_print(WARNING, f"Could not remove directory. {e}")
 
 
-def find_existing_files(current_directory, include_directories):
+def create_project_index(current_directory):
+    """
+    Creates the persistent index of the Verilog, script and TestBench files of the project.
+
+    Args:
+        current_directory (str): The current working directory.
+
+    Returns:
+        ProjectIndex: The index, loaded from the previous run on its first update.
+    """
+    return ProjectIndex(
+        f"{current_directory}/{CACHE_DIRECTORY}/file_index.json",
+        VERILOG_EXTENSIONS + SCRIPT_EXTENSIONS + TESTBENCH_EXTENSIONS,
+        EXCLUDED_DIRECTORIES,
+    )
+
+
+def find_existing_files(current_directory, include_directories, project_index=None):
     """
     Finds all Verilog snippets, modules, and scripts under the given directory.
 
     Args:
         current_directory (str): The directory to search.
+        include_directories (list): Additional directories to search.
+        project_index (ProjectIndex, optional): Index of the project files, updated before the search.
 
     Returns:
-        tuple: A tuple containing lists of all Verilog snippets, modules, and scripts found in the directory.
+        tuple: A tuple containing the indexes of all scripts (ScriptIndex) and of all Verilog snippets and modules (OrderedFileSet) found in the directory.
+
+    Only the directories that changed since the previous run are listed again, see `ProjectIndex`.
     """
-    script_files = []
-    verilog_files = []
+    script_files = ScriptIndex()
+    verilog_files = OrderedFileSet()
     search_directories = [current_directory] + include_directories
     excluded_files = ["LICENSE", ".gitignore", ".gitmodules"]
-    verilog_extensions = [".v", ".vh", ".sv", ".svh", ".vs"]
-    script_extensions = [".py", ".sh", ".lua", ".scala", ".rb", ".pl", ".tcl"]
 
-    for directory in search_directories:
-        for root, directories, files in os.walk(directory, topdown=True):
-            filtered_dirs = []
-            for directory in directories:
-                if directory not in [".git", "build", "generated", "__pycache__"]:
-                    filtered_dirs.append(directory)
-            directories[:] = filtered_dirs
-            for file in files:
-                filename, extension = os.path.splitext(file)
-                file_path = os.path.join(root, file)
-                if filename not in excluded_files:
-                    if extension in script_extensions and file_path not in script_files:
-                        script_files.append(file_path)
-                    elif (
-                        extension in verilog_extensions
-                        and file_path not in verilog_files
-                    ):
-                        verilog_files.append(file_path)
-
-    vs_print(DEBUG, f"Found verilog files:")
-    for file_path in verilog_files:
-        vs_print(DEBUG, f"\t{relative_path(file_path)}")
-    vs_print(DEBUG, f"Found script files:")
-    for file_path in script_files:
-        vs_print(DEBUG, f"\t{relative_path(file_path)}")
+    if project_index is None:
+        project_index = create_project_index(current_directory)
+    with span("find_existing_files", "stage"):
+        project_index.update(search_directories)
+    for file_path in project_index.files():
+        filename, extension = os.path.splitext(os.path.basename(file_path))
+        if filename not in excluded_files:
+            if extension in SCRIPT_EXTENSIONS:
+                script_files.append(file_path)
+            elif extension in VERILOG_EXTENSIONS:
+                verilog_files.append(file_path)
+
+    if log_enabled(DEBUG):
+        vs_print(DEBUG, "Found verilog files:")
+        for file_path in verilog_files:
+            vs_print(DEBUG, "\t%s", relative_path(file_path))
+        vs_print(DEBUG, "Found script files:")
+        for file_path in script_files:
+            vs_print(DEBUG, "\t%s", relative_path(file_path))
 
     return script_files, verilog_files
 
 
-def build_dependency_tree(current_directory, verilog_files, script_files, top_module, parameters=None):
+def build_dependency_tree(
+    current_directory,
+    verilog_files,
+    script_files,
+    top_module,
+    parameters=None,
+    graph=None,
+):
     """
     Recursively resolve all dependencies for a given top module.
     
     This function finds or generates all Verilog files needed by the top module,
     including transitively instantiated modules and included files.
+    Every file missing after a pass over the known sources is queued in the scheduler,
+    and the queued generator scripts run together before the files they generated are analysed.
+    Each file is analysed once for every parameter scope it is used in (see `ParameterScope`),
+    a file used again in a scope it was already analysed in, for this or another top module, is
+    not analysed again and its dependencies are taken from the graph.
 
     Args:
         current_directory (str): The current working directory.
-        verilog_files (list): List of existing Verilog file paths.
-        script_files (list): List of script file paths.
+        verilog_files (OrderedFileSet): Index of existing Verilog file paths.
+        script_files (ScriptIndex): Index of script file paths.
         top_module (str): The top module name.
-        parameters (dict, optional): Parameters to pass to generation scripts.
+        parameters (dict, optional): Parameters given on the command line, they replace the values of
+            the parameters of every file.
+        graph (DependencyGraph, optional): Dependency graph shared by every top module built by this invocation.
 
     Returns:
-        list: A list of all Verilog files used by the module and its dependencies.
+        OrderedFileSet: All Verilog files used by the module and its dependencies.
     """
-    sources_list = []
+    if graph is None:
+        graph = DependencyGraph()
+    if parameters is None:
+        parameters = {}
+    scheduler = graph.scheduler
+    sources_list = OrderedFileSet()
+    graph.add_scope(top_module, ParameterScope({}, dict(parameters)))
     sources_list, verilog_files = resolve_dependency(
         current_directory,
         "",
@@ -133,107 +226,227 @@ def build_dependency_tree(current_directory, verilog_files, script_files, top_mo
         verilog_files,
         sources_list,
         parameters,
+        scheduler,
     )
 
     i = 0
-    while i < len(sources_list):
-        verilog_file = sources_list[i]
-        sources_list, verilog_files = analyse_file(
-            current_directory, verilog_file, script_files, verilog_files, sources_list, parameters
+    while True:
+        while i < len(sources_list):
+            sources_list, verilog_files = _analyse_scopes(
+                current_directory,
+                sources_list[i],
+                script_files,
+                verilog_files,
+                sources_list,
+                parameters,
+                graph,
+            )
+            i = i + 1
+        # Files already analysed can be used in new scopes by the files analysed after them
+        rescoped_files = []
+        for name in graph.take_new_scope_names():
+            file_path = _dependency_path((name,), verilog_files)
+            if file_path is not None and file_path in sources_list:
+                rescoped_files.append(file_path)
+        for file_path in rescoped_files:
+            sources_list, verilog_files = _analyse_scopes(
+                current_directory,
+                file_path,
+                script_files,
+                verilog_files,
+                sources_list,
+                parameters,
+                graph,
+            )
+        if rescoped_files:
+            continue
+        if not scheduler.pending:
+            break
+        sources_list, verilog_files = run_generator_jobs(
+            scheduler, current_directory, sources_list, verilog_files
         )
-        i = i + 1
+
+    # Every file that could be found or generated is known now
+    for file_path, items in graph.take_unresolved():
+        dependency_paths = []
+        for item in items:
+            dependency_path = _dependency_path(item, verilog_files)
+            if dependency_path is not None:
+                dependency_paths.append(dependency_path)
+        graph.set_dependencies(file_path, dependency_paths)
 
     return sources_list
 
 
-def extract_parameters_from_file(content, filename, parameters):
+def _analyse_scopes(
+    current_directory, file_path, script_files, verilog_files, sources_list, parameters, graph
+):
+    """
+    Analyses a file in each scope it is used in and was not analysed in yet.
+
+    A file used in no scope, like the other files written by a script, is analysed with the
+    command-line parameters only. A file already analysed in every scope it is used in adds
+    the dependencies recorded in the graph.
+
+    Args:
+        current_directory (str): The current working directory.
+        file_path (str): Path to the Verilog file.
+        script_files (ScriptIndex): Index of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog file paths.
+        sources_list (OrderedFileSet): Ordered set to store additional source file paths.
+        parameters (dict): Parameters given on the command line.
+        graph (DependencyGraph): Dependency graph where the file is recorded.
+
+    Returns:
+        tuple: A tuple containing the updated sources_list and verilog_files.
+    """
+    scopes = graph.take_scopes(file_path, ParameterScope({}, dict(parameters)))
+    if not scopes:
+        dependency_paths = graph.dependencies(file_path)
+        if dependency_paths is not None:
+            sources_list.extend(dependency_paths)
+        return sources_list, verilog_files
+    for scope in scopes:
+        sources_list, verilog_files = analyse_file(
+            current_directory,
+            file_path,
+            script_files,
+            verilog_files,
+            sources_list,
+            parameters,
+            graph,
+            scope,
+        )
+    return sources_list, verilog_files
+
+
+def _dependency_path(match_strings, verilog_files):
+    """
+    Finds the file a dependency resolved to, without printing anything.
+
+    Args:
+        match_strings (list): List of strings extracted from the instantiation or include directive.
+        verilog_files (OrderedFileSet): Index of Verilog file paths.
+
+    Returns:
+        str or None: The path to the file, or None if it is ignored or could not be found nor generated.
+    """
+    file_name = match_strings[0].split()[0]
+    comment_arg = match_strings[1] if len(match_strings) > 1 else ""
+    if "VS_NO_GENERATE" in comment_arg:
+        return None
+    if os.path.splitext(file_name)[1] == "":
+        candidates = [f"{file_name}.v", f"{file_name}.sv"]
+    else:
+        candidates = [file_name]
+    for candidate in candidates:
+        found_files = verilog_files.find(candidate)
+        if found_files:
+            return found_files[-1]
+    return None
+
+
+def instance_overrides(values, parameters, filename):
     """
-    Extract parameters from Verilog file content, including parameter definitions and instantiations.
+    Resolve the parameter values given by a module instantiation.
 
     Args:
-        content (str): The content of the Verilog file.
+        values (list): [name, value] pairs of the parameter values given by the instantiation.
+        parameters (dict): The parameters of the file where the module is instantiated.
         filename (str): The name of the file being analyzed.
-        parameters (dict): The parameters dictionary to update.
 
-    This function extracts:
-    1. Parameter definitions (e.g., parameter WIDTH = 8)
-    2. Parameter values from module instantiations (e.g., #(.WIDTH(16)))
+    Returns:
+        dict: The value given to each parameter, by name.
     """
-    
-    param_def_pattern = r'^\s*parameter\s+(?:\w+\s+)?(\w+)\s*=\s*([^,;\n)]+)'
-    param_inst_pattern = r'\.(\w+)\s*\(\s*([^)]+?)\s*\)'
-    
-    # Find parameter definitions in the file
-    for match in re.finditer(param_def_pattern, content, re.MULTILINE):
-        param_name = match.group(1)
-        param_value = match.group(2).strip()
-        
-        # Only add if not already in parameters dictionary
-        if param_name not in parameters:
-            parameters[param_name] = param_value
-            vs_print(DEBUG, f"Found parameter definition in {filename}: {param_name} = {param_value}")
-    
-    # Find parameter instantiations in module instances
-    module_inst_with_params = r'\n\s*?\w+?\s+?#\(([\s\S]*?)\)\s*?\w+?\s*?\('
-    for inst_match in re.finditer(module_inst_with_params, content):
-        param_block = inst_match.group(1)
-        
-        # Extract individual parameter assignments
-        for param_match in re.finditer(param_inst_pattern, param_block):
-            param_name = param_match.group(1)
-            param_value = param_match.group(2).strip()
-            
-            # Check if value references another parameter
-            if param_value in parameters:
-                # Replace with the actual parameter value
-                param_value = parameters[param_value]
-                vs_print(DEBUG, f"Replaced parameter {param_name} value with {param_value} from parameters dictionary")
-            elif re.match(r'^[A-Z_][A-Z0-9_]*$', param_value) and param_value not in parameters:
-                # If it looks like a parameter name but isn't defined, throw an error
-                vs_print(ERROR, f"Parameter {param_value} used in instantiation in {filename} is not defined in parameters dictionary")
-                exit(1)
-            
-            # Add to parameters if not already present
-            if param_name not in parameters:
-                parameters[param_name] = param_value
-                vs_print(DEBUG, f"Found parameter in module instantiation in {filename}: {param_name} = {param_value}")
+    overrides = {}
+    for param_name, param_value in values:
+        # Check if value references another parameter
+        if param_value in parameters:
+            # Replace with the actual parameter value
+            param_value = parameters[param_value]
+            vs_print(DEBUG, "Replaced parameter %s value with %s from the parameters of %s", param_name, param_value, filename)
+        elif re.match(r'^[A-Z_][A-Z0-9_]*$', param_value):
+            # If it looks like a parameter name but isn't defined, throw an error
+            vs_print(ERROR, f"Parameter {param_value} used in instantiation in {filename} is not defined in its parameters")
+            exit(1)
+        overrides[param_name] = param_value
+    return overrides
+
+
+def substitute_parameters(comment_arg, parameters):
+    """
+    Replace the "{NAME}" references in the comment argument of an include by the parameter values.
+
+    Args:
+        comment_arg (str): The comment argument.
+        parameters (dict): The parameters of the file where the include is written.
+
+    Returns:
+        str: The comment argument, with the references to unknown parameters left as they are.
+    """
+    return _PARAMETER_REFERENCE.sub(
+        lambda reference: parameters.get(reference.group(1), reference.group(0)), comment_arg
+    )
 
 
 def analyse_file(
-    current_directory, file_path, script_files, verilog_files, sources_list, parameters=None
+    current_directory,
+    file_path,
+    script_files,
+    verilog_files,
+    sources_list,
+    parameters=None,
+    graph=None,
+    scope=None,
 ):
     """
     Analyze a Verilog file for module instantiations or includes.
 
+    The parameters of the file are those of its scope: the "{NAME}" references in the comments
+    of its includes are replaced by their values, and the modules it instantiates and the files
+    it includes are recorded in the graph with the scopes they are used in.
+
     Args:
         current_directory (str): The current working directory.
         file_path (str): Path to the Verilog file.
-        script_files (list): List of script file paths.
-        verilog_files (list): List of Verilog file paths.
-        sources_list (list): List to store additional source file paths.
-        parameters (dict, optional): Parameters to pass to generation scripts.
+        script_files (ScriptIndex): Index of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog file paths.
+        sources_list (OrderedFileSet): Ordered set to store additional source file paths.
+        parameters (dict, optional): Parameters given on the command line.
+        graph (DependencyGraph, optional): Dependency graph where the file is recorded. Missing files are
+            queued for generation in its scheduler, and its parse cache is used to skip unchanged files.
+        scope (ParameterScope, optional): The scope the file is used in, by default the file only
+            sees the command-line parameters.
 
     Returns:
         tuple: A tuple containing the updated sources_list and verilog_files.
     """
-    with open(file_path, "r") as file:
-        content = file.read()
+    if parameters is None:
+        parameters = {}
+    if scope is None:
+        scope = ParameterScope({}, dict(parameters))
+    scheduler = None
     filename = os.path.basename(file_path)
-    
-    # Extract parameters from module definition and instantiations
-    extract_parameters_from_file(content, filename, parameters)
-
-    moduleInstantiationPattern = r"\n\s*?(\w+?)\s+?(?:#\([\s\S]*?\))?\s*?(\w+?)\s*?\(\s*?(\.\w+?\s*?\([\s\S]*?)\);"
-    includePattern = r'\n\s*?`include\s+?"(.*?)"(?!\s*?/\*)(.*)'
-    multiCommentIncludePattern = r'\n\s*?`include\s+?"(.*?)"\s*?/\*([\s\S]*?)\*/'
-    
-    for pattern in [
-        moduleInstantiationPattern,
-        includePattern,
-        multiCommentIncludePattern,
-    ]:
-        matches = re.findall(pattern, content)
-        for item in matches:
+    with span(filename, "analyse"):
+        if graph is not None and graph.parse_cache is not None:
+            facts = graph.parse_cache.facts(file_path, scan_verilog)
+        else:
+            facts = scan_verilog_file(file_path)
+        file_parameters = scope.parameters(facts["parameter_definitions"])
+        if graph is not None:
+            scheduler = graph.scheduler
+            graph.analysed(file_path, facts["dependencies"])
+            modules = set()
+            for module, values in facts["instance_parameters"]:
+                modules.add(module)
+                overrides = instance_overrides(values, file_parameters, filename)
+                overrides.update(parameters)
+                graph.add_scope(module, ParameterScope(file_parameters, overrides))
+            for item in facts["dependencies"]:
+                if item[0] not in modules:
+                    graph.add_scope(item[0].split()[0], ParameterScope(file_parameters, dict(parameters)))
+
+        for item in facts["dependencies"]:
             sources_list, verilog_files = resolve_dependency(
                 current_directory,
                 filename,
@@ -241,7 +454,8 @@ def analyse_file(
                 script_files,
                 verilog_files,
                 sources_list,
-                parameters,
+                file_parameters,
+                scheduler,
             )
 
     return sources_list, verilog_files
@@ -255,6 +469,7 @@ def resolve_dependency(
     verilog_files,
     sources_list,
     parameters=None,
+    scheduler=None,
 ):
     """
     Find or generate a file based on given conditions.
@@ -263,10 +478,13 @@ def resolve_dependency(
         current_directory (str): The current working directory.
         callee_filename (str): Name of the file where the "`include" is present.
         match_strings (list): List of strings extracted from the include directive.
-        script_files (list): List of script file paths.
-        verilog_files (list): List of Verilog file paths.
-        sources_list (list): List to store the generated or found file paths.
-        parameters (dict, optional): Parameters to pass to generation scripts.
+        script_files (ScriptIndex): Index of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog file paths.
+        sources_list (OrderedFileSet): Ordered set to store the generated or found file paths.
+        parameters (dict, optional): Parameters of the callee file, replacing their "{NAME}"
+            references in the comment argument.
+        scheduler (GeneratorScheduler, optional): Scheduler where the file is queued if it must be generated.
+            Without a scheduler the file is generated immediately.
 
     Returns:
         tuple: (sources_list, verilog_files) - Updated lists.
@@ -275,6 +493,8 @@ def resolve_dependency(
     file_name = match_strings[0].split()[0]
     _, extension = os.path.splitext(file_name)
     comment_arg = match_strings[1].strip() if len(match_strings) > 1 else ""
+    if parameters:
+        comment_arg = substitute_parameters(comment_arg, parameters)
 
     # Try to locate the file in the verilog_files list
     file_path = _locate_verilog_file(file_name, extension, verilog_files)
@@ -287,13 +507,29 @@ def resolve_dependency(
         )
         return sources_list, verilog_files
 
+    # A file is generated once, the first time it is used
+    if scheduler is not None:
+        job = scheduler.pending.get(file_name) or scheduler.history.get(file_name)
+        if job is not None and job.arguments[2] != comment_arg:
+            vs_print(
+                WARNING,
+                f"{file_name} is used with different parameters in {callee_filename}, "
+                f"it is only generated for \"{job.arguments[2]}\", not for \"{comment_arg}\".",
+            )
+        elif job is not None and job.parameters is not None and job.parameters != (parameters or {}):
+            vs_print(
+                WARNING,
+                f"{file_name} is used with different parameters in {callee_filename}, "
+                f"its plugin is only called with the parameters of its first use.",
+            )
+
     # Process the file: generate if not found, add to sources if found
     if file_path is None:
         sources_list, verilog_files = _run_generator_script(
             file_name, script_files, comment_arg, callee_filename,
-            current_directory, sources_list, verilog_files, parameters
+            current_directory, sources_list, verilog_files, scheduler, parameters
         )
-    elif file_path not in sources_list:
+    else:
         sources_list.append(file_path)
 
     return sources_list, verilog_files
@@ -306,7 +542,7 @@ def _locate_verilog_file(file_name, extension, verilog_files):
     Args:
         file_name (str): The base file name.
         extension (str): The file extension (may be empty).
-        verilog_files (list): List of available Verilog file paths.
+        verilog_files (OrderedFileSet): Index of available Verilog file paths.
 
     Returns:
         str or None: The path to the found file, or None if not found.
@@ -323,31 +559,28 @@ def _locate_verilog_file(file_name, extension, verilog_files):
 
 def _run_generator_script(
     file_name, script_files, comment_arg, callee_filename,
-    current_directory, sources_list, verilog_files, parameters=None
+    current_directory, sources_list, verilog_files, scheduler=None, parameters=None
 ):
     """
-    Run a generator script to create a Verilog file.
+    Run a generator script to create a Verilog file, or queue it in the scheduler.
 
     Args:
         file_name (str): The name of the file to generate.
-        script_files (list): List of available script file paths.
-        comment_arg (str): Comment arguments from the include directive.
+        script_files (ScriptIndex): Index of available script file paths.
+        comment_arg (str): Comment arguments from the include directive, with the parameter values.
         callee_filename (str): Name of the file requesting generation.
         current_directory (str): The current working directory.
-        sources_list (list): Current list of source files.
-        verilog_files (list): Current list of Verilog files.
-        parameters (dict, optional): Parameters to pass to generation scripts.
+        sources_list (OrderedFileSet): Current ordered set of source files.
+        verilog_files (OrderedFileSet): Current index of Verilog files.
+        scheduler (GeneratorScheduler, optional): Scheduler where the script call is queued.
+        parameters (dict, optional): Parameters of the requesting file, given to the script if it
+            is a plugin.
 
     Returns:
         tuple: Updated (sources_list, verilog_files).
     """
     script_path, file_suffix = find_most_common_prefix(file_name, script_files)
 
-    # Look for parameters name in comment_arg and replace by their value
-    if parameters:
-        for param_name, param_value in parameters.items():
-            comment_arg = re.sub("{"+param_name+"}", param_value, comment_arg)
-    
     if script_path != "":
         script_arguments = [
             script_path,
@@ -355,15 +588,227 @@ def _run_generator_script(
             comment_arg,
             callee_filename,
         ] + sys.argv[1:]
-        subprocess.run(script_arguments)
+        if scheduler is not None:
+            plugin_parameters = dict(parameters or {}) if is_plugin(script_path) else None
+            scheduler.submit(
+                GeneratorJob(file_name, script_path, script_arguments, callee_filename, plugin_parameters)
+            )
+            return sources_list, verilog_files
+        output_directory = _create_output_directory(current_directory)
+        trace_args = {"script": script_path, "arguments": script_arguments[1:]}
+        flush_log()
+        with span(os.path.basename(script_path), "generator", trace_args):
+            subprocess.run(
+                script_arguments, env=dict(os.environ, VS_OUTPUT_DIR=output_directory)
+            )
         
-        return move_to_generated_dir(
-            script_path, current_directory, sources_list, verilog_files
+        generated_files = _collect_generated_files(
+            script_path, current_directory, output_directory
         )
+        _add_generated_files(generated_files, sources_list, verilog_files)
     
     return sources_list, verilog_files
 
 
+def run_generator_jobs(scheduler, current_directory, sources_list, verilog_files):
+    """
+    Runs the generator scripts queued in the scheduler and collects the files they generated.
+
+    Args:
+        scheduler (GeneratorScheduler): The scheduler holding the queued jobs.
+        current_directory (str): The current working directory.
+        sources_list (OrderedFileSet): Current ordered set of source files.
+        verilog_files (OrderedFileSet): Current index of Verilog files.
+
+    Returns:
+        tuple: Updated (sources_list, verilog_files).
+
+    Jobs found in the scheduler cache are restored without running their scripts.
+    Each script runs with its own empty output directory, given in the VS_OUTPUT_DIR environment
+    variable, and its files are collected from there. Scripts that write their files to the current
+    directory instead are still supported: when several of them run at the same time their files
+    are collected once the whole wave has finished.
+    The jobs of a script supporting batches are sent to it in a single call, see `batch_jobs`.
+    A job is skipped if another job of the wave requests the same file, or when running one script at
+    a time, if an earlier script already generated its file.
+    When the scheduler has a plan, the jobs are recorded in it instead, see `_plan_generator_jobs`.
+    """
+    if scheduler.plan is not None:
+        return _plan_generator_jobs(scheduler, sources_list, verilog_files)
+    generated_dir = os.path.join(current_directory, "generated")
+    jobs = []
+    requested_files = set()
+    for job in scheduler.take_pending():
+        # Like running one script at a time, a file requested twice in a wave is generated once
+        _, extension = os.path.splitext(job.file_name)
+        if job.file_name in requested_files or _locate_verilog_file(job.file_name, extension, verilog_files) is not None:
+            vs_print(DEBUG, "%s is already generated in this wave, skipping %s.", job.file_name, job.script_path)
+            continue
+        requested_files.add(job.file_name)
+        restored_files = None
+        if scheduler.cache is not None:
+            with span(job.file_name, "cache"):
+                restored_files = scheduler.cache.restore(job, generated_dir)
+        if restored_files is None:
+            jobs.append(job)
+        else:
+            vs_print(INFO, f"{job.script_path} is unchanged, restored {', '.join(restored_files)}.")
+            _add_generated_files(restored_files, sources_list, verilog_files)
+    jobs = batch_jobs(jobs)
+
+    if scheduler.jobs == 1 or len(jobs) == 1:
+        for job in jobs:
+            _, extension = os.path.splitext(job.file_name)
+            if job.batch is None and _locate_verilog_file(job.file_name, extension, verilog_files) is not None:
+                vs_print(DEBUG, "%s was already generated, skipping %s.", job.file_name, job.script_path)
+                continue
+            job.output_directory = _create_output_directory(current_directory)
+            scheduler.run([job])
+            generated_files = _collect_generated_files(
+                job.script_path, current_directory, job.output_directory
+            )
+            _add_generated_files(generated_files, sources_list, verilog_files)
+            if scheduler.cache is not None:
+                _store_job_in_cache(scheduler.cache, job, generated_files)
+        return sources_list, verilog_files
+
+    if jobs:
+        vs_print(INFO, f"Running {len(jobs)} generator scripts, {scheduler.jobs} at a time.")
+        for job in jobs:
+            job.output_directory = _create_output_directory(current_directory)
+        scheduler.run(jobs)
+        legacy_jobs = []
+        generating_scripts = {}
+        for job in jobs:
+            generated_files = _move_verilog_files(job.output_directory, generated_dir)
+            shutil.rmtree(job.output_directory, ignore_errors=True)
+            if not generated_files:
+                legacy_jobs.append(job)
+                continue
+            for generated_file in generated_files:
+                if generated_file in generating_scripts:
+                    vs_print(
+                        WARNING,
+                        f"{job.script_path} and {generating_scripts[generated_file]} both generated "
+                        f"{os.path.basename(generated_file)}, keeping the file of {job.script_path}.",
+                    )
+                generating_scripts[generated_file] = job.script_path
+            vs_print(INFO, f"{job.script_path} generated {', '.join(generated_files)}.")
+            _add_generated_files(generated_files, sources_list, verilog_files)
+            if scheduler.cache is not None:
+                _store_job_in_cache(scheduler.cache, job, generated_files)
+
+        if legacy_jobs:
+            script_paths = []
+            for job in legacy_jobs:
+                if job.script_path not in script_paths:
+                    script_paths.append(job.script_path)
+            generated_files = _collect_generated_files(", ".join(script_paths), current_directory)
+            _add_generated_files(generated_files, sources_list, verilog_files)
+            if scheduler.cache is not None:
+                wave_jobs = []
+                for job in legacy_jobs:
+                    wave_jobs.extend(job.batch if job.batch is not None else [job])
+                _store_wave_in_cache(scheduler.cache, wave_jobs, generated_files)
+    return sources_list, verilog_files
+
+
+def _plan_generator_jobs(scheduler, sources_list, verilog_files):
+    """
+    Records the queued jobs in the plan of the scheduler, without running any script.
+
+    The files of a job found in the cache or the artifact store are used from the cache entry
+    itself, so the files they depend on are planned too, without restoring them. The files of a job
+    that must run are unknown until it runs, so whatever they depend on is missing from the plan.
+
+    Args:
+        scheduler (GeneratorScheduler): The scheduler holding the queued jobs and the plan.
+        sources_list (OrderedFileSet): Current ordered set of source files.
+        verilog_files (OrderedFileSet): Current index of Verilog files.
+
+    Returns:
+        tuple: Updated (sources_list, verilog_files).
+    """
+    for job in scheduler.take_pending():
+        if scheduler.plan.planned(job.file_name):
+            continue
+        status = "run"
+        cached_files = None
+        if scheduler.cache is not None and scheduler.cache.lookups:
+            cached_files = scheduler.cache.lookup(job)
+            if cached_files is not None:
+                status = "cached"
+            elif scheduler.cache.shared is not None:
+                cached_files = scheduler.cache.shared.lookup(job)
+                if cached_files is not None:
+                    status = "stored"
+        scheduler.plan.add_call(job, status)
+        if cached_files is not None:
+            _add_generated_files(cached_files, sources_list, verilog_files)
+    return sources_list, verilog_files
+
+
+def _create_output_directory(current_directory):
+    """
+    Creates an empty directory where a generator script writes its files.
+
+    Args:
+        current_directory (str): The current working directory.
+
+    Returns:
+        str: Path of the directory, inside the generated directory.
+    """
+    generated_dir = os.path.join(current_directory, "generated")
+    os.makedirs(generated_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix=".vs_output_", dir=generated_dir)
+
+
+def _store_job_in_cache(cache, job, generated_files):
+    """
+    Stores in the cache the files generated by a job.
+
+    The files of a batch are stored for each request it holds, like the files of a wave.
+
+    Args:
+        cache (GeneratorCache): The generator cache.
+        job (GeneratorJob): The job that ran.
+        generated_files (list): Paths of the files it generated.
+    """
+    if job.batch is None:
+        cache.store(job, generated_files)
+    else:
+        _store_wave_in_cache(cache, job.batch, generated_files)
+
+
+def _store_wave_in_cache(cache, jobs, generated_files):
+    """
+    Stores in the cache the files generated by a wave of concurrent jobs.
+
+    The files of concurrent jobs are all collected from the current directory, so each file is
+    assigned to the job that requested it by name. If any file cannot be assigned to a job, it is
+    unknown which script generated it, and nothing from the wave is cached.
+
+    Args:
+        cache (GeneratorCache): The generator cache.
+        jobs (list): The jobs that ran in the wave.
+        generated_files (list): Paths of the files collected after the wave.
+    """
+    files_by_job = {job.file_name: [] for job in jobs}
+    for file_path in generated_files:
+        filename = os.path.basename(file_path)
+        name, extension = os.path.splitext(filename)
+        if filename in files_by_job:
+            files_by_job[filename].append(file_path)
+        elif extension in [".v", ".sv"] and name in files_by_job:
+            files_by_job[name].append(file_path)
+        else:
+            vs_print(DEBUG, "Could not tell which script generated %s, not caching this wave.", filename)
+            return
+    for job in jobs:
+        if files_by_job[job.file_name]:
+            cache.store(job, files_by_job[job.file_name])
+
+
 def move_to_generated_dir(script_path, current_directory, sources_list, verilog_files):
     """
     Moves Verilog files generated by a script under the current directory to the generated directory.
@@ -371,8 +816,8 @@ def move_to_generated_dir(script_path, current_directory, sources_list, verilog_
     Args:
         script_path (str): A string equivalent to the script path executed.
         current_directory (str): A string equivalent to the current directory.
-        sources_list (list): List of source file paths.
-        verilog_files (list): List of Verilog file paths.
+        sources_list (OrderedFileSet): Ordered set of source file paths.
+        verilog_files (OrderedFileSet): Index of Verilog file paths.
 
     Returns:
         tuple: A tuple containing the updated sources_list and verilog_files.
@@ -380,21 +825,36 @@ def move_to_generated_dir(script_path, current_directory, sources_list, verilog_
     This function iterates through files in the current directory, identifies Verilog files based on their extensions,
     and moves them to the "generated/RTL" directory. It updates the sources_list and verilog_files accordingly.
     """
-    verilog_extensions = [".v", ".vh", ".sv", ".svh", ".vs"]
+    verilog_files_found = _collect_generated_files(script_path, current_directory)
+    _add_generated_files(verilog_files_found, sources_list, verilog_files)
+
+    return sources_list, verilog_files
+
+
+def _collect_generated_files(script_path, current_directory, output_directory=None):
+    """
+    Moves the Verilog files generated by a script to the generated directory.
+
+    The files are taken from the output directory given to the script, which is then removed.
+    Scripts that do not use it write their files to the current directory, so that is searched
+    when the output directory is empty or not given.
+
+    Args:
+        script_path (str): A string equivalent to the script path executed.
+        current_directory (str): A string equivalent to the current directory.
+        output_directory (str, optional): The output directory given to the script.
+
+    Returns:
+        list: Paths of the moved files, under the generated directory.
+    """
     verilog_files_found = []
     generated_dir = os.path.join(current_directory, "generated")
 
-    for filename in os.listdir(current_directory):
-        _, extension = os.path.splitext(filename)
-        file_dst_path = os.path.join(generated_dir, filename)
-        file_src_path = os.path.join(current_directory, filename)
-        if extension in verilog_extensions:
-            shutil.move(file_src_path, file_dst_path)
-            verilog_files_found.append(file_dst_path)
-            if file_dst_path not in verilog_files:
-                verilog_files.append(file_dst_path)
-            if file_dst_path not in sources_list:
-                sources_list.append(file_dst_path)
+    if output_directory is not None:
+        verilog_files_found = _move_verilog_files(output_directory, generated_dir)
+        shutil.rmtree(output_directory, ignore_errors=True)
+    if verilog_files_found == []:
+        verilog_files_found = _move_verilog_files(current_directory, generated_dir)
 
     if verilog_files_found == []:
         vs_print(WARNING, f"{script_path} generated no Verilog files.")
@@ -403,7 +863,49 @@ def move_to_generated_dir(script_path, current_directory, sources_list, verilog_
             INFO, f"{script_path} generated {', '.join(verilog_files_found)}."
         )
 
-    return sources_list, verilog_files
+    return verilog_files_found
+
+
+def _move_verilog_files(source_directory, generated_dir):
+    """
+    Moves the Verilog files found in a directory to the generated directory.
+
+    A file identical to the one already in the generated directory is only removed.
+
+    Args:
+        source_directory (str): The directory to search, without its sub-directories.
+        generated_dir (str): The generated directory.
+
+    Returns:
+        list: Paths of the moved files, under the generated directory, sorted by name.
+    """
+    verilog_files_found = []
+    for filename in sorted(os.listdir(source_directory)):
+        _, extension = os.path.splitext(filename)
+        file_dst_path = os.path.join(generated_dir, filename)
+        file_src_path = os.path.join(source_directory, filename)
+        if extension in VERILOG_EXTENSIONS and os.path.isfile(file_src_path):
+            # An identical file is left alone, keeping the modification time Make and Ninja compare
+            if os.path.isfile(file_dst_path) and filecmp.cmp(file_src_path, file_dst_path, shallow=False):
+                os.remove(file_src_path)
+            else:
+                shutil.move(file_src_path, file_dst_path)
+            verilog_files_found.append(file_dst_path)
+    return verilog_files_found
+
+
+def _add_generated_files(generated_files, sources_list, verilog_files):
+    """
+    Adds generated files to the sources and Verilog files lists.
+
+    Args:
+        generated_files (list): Paths of the generated files.
+        sources_list (OrderedFileSet): Ordered set of source file paths.
+        verilog_files (OrderedFileSet): Index of Verilog file paths.
+    """
+    for file_dst_path in generated_files:
+        verilog_files.append(file_dst_path)
+        sources_list.append(file_dst_path)
 
 
 def find_most_common_prefix(input_name, file_list):
@@ -412,40 +914,30 @@ def find_most_common_prefix(input_name, file_list):
 
     Args:
         input_name (str): A string equivalent to the file name to search for.
-        file_list (list): A list of script file names.
+        file_list (ScriptIndex or list): The script file paths.
 
     Returns:
         tuple: A tuple containing the file path and the remaining string words.
     """
-    input_words = input_name.split("_")
-    similar_word_counter = 0
-    most_similar_file = ""
+    if not isinstance(file_list, ScriptIndex):
+        file_list = ScriptIndex(file_list)
+    most_similar_file, similar_word_counter = file_list.longest_prefix(input_name)
     file_suffix = ""
-    for file_path in file_list:
-        file_name = os.path.splitext(os.path.basename(file_path))[0]
-        tmp_counter = 0
-        tmp_string = ""
-        for word in input_words:
-            tmp_string = tmp_string + word
-            tmp_counter = tmp_counter + 1
-            if file_name == tmp_string:
-                if tmp_counter > similar_word_counter:
-                    similar_word_counter = tmp_counter
-                    most_similar_file = file_path
-                    file_suffix = "_".join(input_words[tmp_counter:])
-            tmp_string = tmp_string + "_"
+    if most_similar_file != "":
+        file_suffix = "_".join(input_name.split("_")[similar_word_counter:])
     if most_similar_file == "" and file_suffix == "":
         vs_print(WARNING, f'Could not locate any matching files for "{input_name}".')
-    elif file_suffix == "":
-        vs_print(
-            DEBUG,
-            f'The most similar file to "{input_name}" is "{relative_path(most_similar_file)}" and "{input_name}" does not have a suffix at the end of its name.',
-        )
-    else:
-        vs_print(
-            DEBUG,
-            f'The most similar file to "{input_name}" is "{relative_path(most_similar_file)}" and the suffix is {file_suffix}.',
-        )
+    elif log_enabled(DEBUG):
+        if file_suffix == "":
+            vs_print(
+                DEBUG,
+                f'The most similar file to "{input_name}" is "{relative_path(most_similar_file)}" and "{input_name}" does not have a suffix at the end of its name.',
+            )
+        else:
+            vs_print(
+                DEBUG,
+                f'The most similar file to "{input_name}" is "{relative_path(most_similar_file)}" and the suffix is {file_suffix}.',
+            )
     return most_similar_file, file_suffix
 
 
@@ -457,6 +949,9 @@ def _build_module_generic(
     script_files,
     built_sources=None,
     parameters=None,
+    graph=None,
+    deferred_builds=None,
+    finish=None,
 ):
     """
     Generic build function for any module type (RTL, TestBench, Board).
@@ -465,33 +960,92 @@ def _build_module_generic(
         current_directory (str): The current working directory.
         module_name (str): The module name to build.
         build_dir (str): Directory under build/ (e.g., "RTL", "TestBench").
-        verilog_files (list): List of Verilog source file paths.
-        script_files (list): List of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog source file paths.
+        script_files (ScriptIndex): Index of script file paths.
         built_sources (list, optional): Sources to exclude from copy.
         parameters (dict, optional): Build parameters.
-        module_type (str): Type of module for logging (e.g., "RTL", "TestBench").
-        post_build_callback (callable, optional): Function to call after build completes.
+        graph (DependencyGraph, optional): Dependency graph shared between builds.
+        deferred_builds (list, optional): List where the copy to the build directory is added, to be run
+            later by `run_deferred_builds`, instead of copying the sources immediately.
+        finish (callable, optional): Called once the sources were copied to the build directory.
     
     Returns:
         list: The list of source files for this build.
     """
     
     # Resolve all dependencies
-    sources = build_dependency_tree(
-        current_directory, verilog_files, script_files, module_name, parameters
-    )
+    with span(f"resolve {module_name}", "stage"):
+        sources = build_dependency_tree(
+            current_directory,
+            verilog_files,
+            script_files,
+            module_name,
+            parameters,
+            graph,
+        )
     
     if not sources:
         vs_print(ERROR, f"No sources found for '{module_name}'")
         return []
     
     # Copy files to build directory
-    build_verilog_sources(sources, built_sources, build_dir, parameters)
+    expanded_snippets = None
+    changed_sources = None
+    state = None
+    if graph is not None:
+        expanded_snippets = graph.expanded_snippets
+        changed_sources = graph.changed_files
+        state = graph.state
+
+    def materialise():
+        with span(f"write {module_name}", "stage"):
+            outputs = build_verilog_sources(
+                sources, built_sources, build_dir, parameters, expanded_snippets, changed_sources, state
+            )
+            if graph is not None:
+                graph.outputs.update(outputs)
+            if finish is not None:
+                finish()
+
+    if deferred_builds is None:
+        materialise()
+    else:
+        deferred_builds.append((materialise, None))
     
     return sources
 
 
-def rtl_build(current_directory, module, parameters, verilog_files, script_files):
+def run_deferred_builds(deferred_builds, jobs=None):
+    """
+    Copies the sources of independent builds to their build directories concurrently.
+
+    Args:
+        deferred_builds (list): (build, message) pairs, where build is a callable or None and message
+            is printed once it and every build before it finished, if not None.
+        jobs (int, optional): Maximum number of builds running at the same time, by default the number of CPU cores.
+    """
+    build_count = len([build for build, _ in deferred_builds if build is not None])
+    workers = max(1, min(jobs or os.cpu_count() or 1, build_count))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(build) if build is not None else None for build, _ in deferred_builds
+        ]
+        for future, (_, message) in zip(futures, deferred_builds):
+            if future is not None:
+                future.result()
+            if message is not None:
+                vs_print(OK, message)
+
+
+def rtl_build(
+    current_directory,
+    module,
+    parameters,
+    verilog_files,
+    script_files,
+    graph=None,
+    build_directory=None,
+):
     """
     Builds Verilog files and creates a build directory for RTL sources.
 
@@ -499,29 +1053,43 @@ def rtl_build(current_directory, module, parameters, verilog_files, script_files
         current_directory (str): The current working directory.
         module (str): The module name for Verilog files.
         parameters (dict): Build parameters to pass to scripts.
-        verilog_files (list): List of Verilog source file paths.
-        script_files (list): List of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog source file paths.
+        script_files (ScriptIndex): Index of script file paths.
+        graph (DependencyGraph, optional): Dependency graph shared between builds.
+        build_directory (str, optional): Directory where the RTL directory is created, by default "build".
 
     Returns:
         list: The list of RTL Verilog source files.
     """
+    if build_directory is None:
+        build_directory = f"{current_directory}/build"
     create_directory(f"{current_directory}/generated")
 
     built_sources = _build_module_generic(
         current_directory=current_directory,
         module_name=module,
-        build_dir=f"{current_directory}/build/RTL",
+        build_dir=f"{build_directory}/RTL",
         verilog_files=verilog_files,
         script_files=script_files,
         built_sources=[],
         parameters=parameters,
+        graph=graph,
     )
     vs_print(OK, f"Built all RTL sources.")
     return built_sources
 
 
 def testbench_build(
-    current_directory, TestBench, verilog_files, script_files, rtl_sources, parameters
+    current_directory,
+    TestBench,
+    verilog_files,
+    script_files,
+    rtl_sources,
+    parameters,
+    graph=None,
+    project_index=None,
+    deferred_builds=None,
+    build_directory=None,
 ):
     """
     Builds TestBench Verilog files and creates a build directory.
@@ -529,11 +1097,17 @@ def testbench_build(
     Args:
         current_directory (str): The current working directory.
         TestBench (str): The TestBench name.
-        verilog_files (list): List of Verilog source file paths.
-        script_files (list): List of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog source file paths.
+        script_files (ScriptIndex): Index of script file paths.
         rtl_sources (list): List of RTL Verilog source files to exclude.
+        graph (DependencyGraph, optional): Dependency graph shared between builds.
+        project_index (ProjectIndex, optional): Index of the project files, used to find the TestBench C++ file.
+        deferred_builds (list, optional): List where the copy to the build directory is added, see `run_deferred_builds`.
+        build_directory (str, optional): Directory where the TestBench directory is created, by default "build".
     """
-    testBench_build_dir = f"{current_directory}/build/TestBench"
+    if build_directory is None:
+        build_directory = f"{current_directory}/build"
+    testBench_build_dir = f"{build_directory}/TestBench"
     _build_module_generic(
         current_directory=current_directory,
         module_name=TestBench,
@@ -542,9 +1116,14 @@ def testbench_build(
         script_files=script_files,
         built_sources=rtl_sources,
         parameters=parameters,
+        graph=graph,
+        deferred_builds=deferred_builds,
+        finish=functools.partial(copy_testbench_cpp, TestBench, testBench_build_dir, project_index),
     )
-    copy_testbench_cpp(TestBench, testBench_build_dir)
-    vs_print(OK, f"Built all TestBench sources.")
+    if deferred_builds is None:
+        vs_print(OK, f"Built all TestBench sources.")
+    else:
+        deferred_builds.append((None, "Built all TestBench sources."))
 
 
 def _extract_board_name(board_module, main_module):
@@ -565,7 +1144,16 @@ def _extract_board_name(board_module, main_module):
 
 
 def board_build(
-    current_directory, Boards, main_module, verilog_files, script_files, rtl_sources, parameters
+    current_directory,
+    Boards,
+    main_module,
+    verilog_files,
+    script_files,
+    rtl_sources,
+    parameters,
+    graph=None,
+    deferred_builds=None,
+    build_directory=None,
 ):
     """
     Builds Verilog files for specified boards and creates build directories.
@@ -574,11 +1162,18 @@ def board_build(
         current_directory (str): The current working directory.
         Boards (list): List of board module names.
         main_module (str): The main module name.
-        verilog_files (list): List of Verilog source file paths.
-        script_files (list): List of script file paths.
+        verilog_files (OrderedFileSet): Index of Verilog source file paths.
+        script_files (ScriptIndex): Index of script file paths.
         rtl_sources (list): List of RTL Verilog source files to exclude.
+        graph (DependencyGraph, optional): Dependency graph shared between builds.
+        deferred_builds (list, optional): List where the copies to the build directories are added, see `run_deferred_builds`.
+        build_directory (str, optional): Directory where the board directories are created, by default "build".
     """
+    if build_directory is None:
+        build_directory = f"{current_directory}/build"
     total_boards = len(Boards)
+    if graph is None:
+        graph = DependencyGraph()
     
     for idx, board_module in enumerate(Boards, 1):
         board_name = _extract_board_name(board_module, main_module)
@@ -588,41 +1183,44 @@ def board_build(
         _build_module_generic(
             current_directory=current_directory,
             module_name=board_module,
-            build_dir=f"{current_directory}/build/RTL/{board_name}",
+            build_dir=f"{build_directory}/RTL/{board_name}",
             verilog_files=verilog_files,
             script_files=script_files,
             built_sources=rtl_sources,
             parameters=parameters,
+            graph=graph,
+            deferred_builds=deferred_builds,
         )
 
-    vs_print(OK, f"Built all board sources.")
+    if deferred_builds is None:
+        vs_print(OK, f"Built all board sources.")
+    else:
+        deferred_builds.append((None, "Built all board sources."))
 
 
-def copy_testbench_cpp(TestBench, testbench_dir):
+def copy_testbench_cpp(TestBench, testbench_dir, project_index=None):
     """
     Copies TestBench C++ file to the TestBench build directory.
 
     Args:
         TestBench (str): The TestBench name.
         testbench_dir (str): The directory for TestBench files.
+        project_index (ProjectIndex, optional): Index of the project files, updated by `find_existing_files`.
     """
-    for root, directories, files in os.walk(os.path.abspath("."), topdown=True):
-        filtered_dirs = []
-        for directory in directories:
-            if directory not in [".git", "build", "generated", "__pycache__"]:
-                filtered_dirs.append(directory)
-        directories[:] = filtered_dirs
-        if f"{TestBench}.cpp" in files:
-            # Form the source and destination paths
-            source_path = os.path.join(root, f"{TestBench}.cpp")
-            destination_path = os.path.join(testbench_dir, f"{TestBench}.cpp")
-
-            # Copy the file to the testbench_dir
-            shutil.copy(source_path, destination_path)
-            vs_print(
-                INFO, f"Testbench '{source_path}' copied to '{destination_path}'"
-            )
-            return
+    current_directory = os.path.abspath(".")
+    if project_index is None:
+        project_index = create_project_index(current_directory)
+        project_index.update([current_directory])
+    source_path = project_index.find_file(f"{TestBench}.cpp", current_directory)
+    if source_path is not None:
+        destination_path = os.path.join(testbench_dir, f"{TestBench}.cpp")
+
+        # Copy the file to the testbench_dir
+        shutil.copy(source_path, destination_path)
+        vs_print(
+            INFO, f"Testbench '{source_path}' copied to '{destination_path}'"
+        )
+        return
 
     vs_print(
         INFO,
@@ -630,7 +1228,15 @@ def copy_testbench_cpp(TestBench, testbench_dir):
     )
 
 
-def build_verilog_sources(new_sources, existing_sources, build_dir, parameters):
+def build_verilog_sources(
+    new_sources,
+    existing_sources,
+    build_dir,
+    parameters,
+    expanded_snippets=None,
+    changed_sources=None,
+    state=None,
+):
     """
     Copy Verilog files to build directories and substitute ".vs" on said files.
 
@@ -638,86 +1244,249 @@ def build_verilog_sources(new_sources, existing_sources, build_dir, parameters):
         new_sources (list): List of new Verilog source file paths.
         existing_sources (list): List of existing Verilog source file paths.
         build_dir (str): Path to the build directory.
+        expanded_snippets (dict, optional): Expanded content of the .vs files, by path, shared between builds.
+        changed_sources (set, optional): Only these sources are substituted again, the others only if their
+            output is missing or was modified since it was written. By default every source is substituted.
+        state (BuildState, optional): State of the previous builds, where the digest of each output is
+            recorded. Without it, every existing output is read to know whether it changed.
+
+    Returns:
+        dict: The source file of each output, by output path.
     """
+    if expanded_snippets is None:
+        expanded_snippets = {}
     sources_list = filter_list(new_sources, existing_sources)
     create_directory(build_dir)
+    output_hashes = state.output_hashes(build_dir) if state is not None else {}
+    outputs = {}
     for verilog_file in sources_list:
         if not verilog_file.endswith(".vs"):
-            verilog_content = ""
-            verilog_content = substitute_vs_file(verilog_file, sources_list)
             file_name = os.path.basename(verilog_file)
             destination_path = f"{build_dir}/{file_name}"
-
-            # Check if file exists and compare contents
-            if os.path.exists(destination_path):
-                with open(destination_path, "r") as existing_file:
-                    existing_content = existing_file.read()
-                if existing_content == verilog_content:
-                    vs_print(DEBUG, f"File '{file_name}' unchanged, skipping write.")
-                    continue
-            with open(f"{build_dir}/{file_name}", "w") as file:
-                file.write(verilog_content)
+            outputs[destination_path] = verilog_file
+            if (
+                changed_sources is not None
+                and verilog_file not in changed_sources
+                and _output_is_current(destination_path, output_hashes)
+            ):
+                continue
+            with span(file_name, "output"):
+                written = _write_output(
+                    verilog_file, sources_list, destination_path, expanded_snippets, output_hashes
+                )
+            if not written:
+                vs_print(DEBUG, "File '%s' unchanged, skipping write.", file_name)
+    if state is not None:
+        state.save_output_hashes(build_dir, output_hashes)
+    return outputs
 
 
-def filter_list(target_list, source_list):
+def _write_output(verilog_file, sources_list, destination_path, expanded_snippets, output_hashes):
     """
-    Filter common files between the target list and the source list.
+    Substitutes the ".vs" of a file into a temporary file, replacing the destination only if it changed.
+
+    The substituted content is streamed to the temporary file while its digest is computed, and
+    compared with the digest recorded when the destination was last written. The destination is
+    only read if it has no recorded digest, or if its size or modification time no longer match it.
 
     Args:
-        target_list (list): List to be filtered.
-        source_list (list): Secondary source files list.
+        verilog_file (str): Path to the Verilog source file.
+        sources_list (OrderedFileSet): Ordered set of source file paths.
+        destination_path (str): Path to the output file.
+        expanded_snippets (dict): Expanded content of the .vs files, by path.
+        output_hashes (dict): Recorded digest, size and modification time of each output, by file name. Updated in place.
 
     Returns:
-        list: `target_list` filtered, remains with all ".vs" files and files not present in `source_list`.
+        bool: True if the destination was written, False if it was already up to date.
     """
-    # Create an empty list to store elements from target_list that are not in source_list
-    filtered_list = []
-
-    # Iterate through target_list and only add elements not present in source_list to filtered_list
-    for element in target_list:
-        if element not in source_list:
-            filtered_list.append(element)
-
-    return filtered_list
+    file_name = os.path.basename(destination_path)
+    temporary_path = f"{os.path.dirname(destination_path)}/.{file_name}.tmp{os.getpid()}"
+    digest = hashlib.sha256()
 
+    def write(chunk):
+        file.write(chunk)
+        digest.update(chunk.encode())
 
-def substitute_vs_file(source_file, sources_list):
+    try:
+        with open(temporary_path, "w") as file:
+            _write_substituted(verilog_file, sources_list, write, expanded_snippets, [])
+        digest = digest.hexdigest()
+
+        current_digest, stat = _current_digest(destination_path, output_hashes)
+        if current_digest == digest:
+            output_hashes[file_name] = {
+                "sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns
+            }
+            return False
+
+        os.replace(temporary_path, destination_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    stat = os.stat(destination_path)
+    output_hashes[file_name] = {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    return True
+
+
+def _current_digest(destination_path, output_hashes):
     """
-    Recursively substitutes included .vs files in the source file content.
+    Returns the digest of an output, reading it only if it changed since its digest was recorded.
 
     Args:
-        source_file (str): The source file containing potential `include directives.
-        sources_list (list): List of source file paths.
+        destination_path (str): Path to the output file.
+        output_hashes (dict): Recorded digest, size and modification time of each output, by file name.
 
     Returns:
-        str: The new content with included .vs files substituted.
+        tuple: The digest of the output and its os.stat result, or (None, None) if it does not exist.
+    """
+    try:
+        stat = os.stat(destination_path)
+    except OSError:
+        return None, None
+    recorded = output_hashes.get(os.path.basename(destination_path))
+    if (
+        recorded is None
+        or recorded["size"] != stat.st_size
+        or recorded["mtime"] != stat.st_mtime_ns
+    ):
+        return hash_file(destination_path), stat
+    return recorded["sha256"], stat
+
+
+def _output_is_current(destination_path, output_hashes):
+    """
+    Checks whether an output is still as it was last written, from its size and modification time.
+
+    Args:
+        destination_path (str): Path to the output file.
+        output_hashes (dict): Recorded digest, size and modification time of each output, by file name.
+
+    Returns:
+        bool: True if the output exists and matches its record.
+    """
+    recorded = output_hashes.get(os.path.basename(destination_path))
+    if recorded is None:
+        return False
+    try:
+        stat = os.stat(destination_path)
+    except OSError:
+        return False
+    return recorded["size"] == stat.st_size and recorded["mtime"] == stat.st_mtime_ns
+
+
+def filter_list(target_list, source_list):
+    """
+    Filter common files between the target list and the source list.
+
+    Args:
+        target_list (list): List to be filtered.
+        source_list (list): Secondary source files list.
+
+    Returns:
+        OrderedFileSet: `target_list` filtered, remains with all ".vs" files and files not present in `source_list`.
+    """
+    if not isinstance(source_list, OrderedFileSet):
+        source_list = OrderedFileSet(source_list)
+    # Create an empty set to store elements from target_list that are not in source_list
+    filtered_list = OrderedFileSet()
+
+    # Iterate through target_list and only add elements not present in source_list to filtered_list
+    for element in target_list:
+        if element not in source_list:
+            filtered_list.append(element)
+
+    return filtered_list
+
+
+def substitute_vs_file(source_file, sources_list, expanded_snippets=None):
+    """
+    Recursively substitutes included .vs files in the source file content.
+
+    Args:
+        source_file (str): The source file containing potential `include directives.
+        sources_list (OrderedFileSet): Ordered set of source file paths.
+        expanded_snippets (dict, optional): Expanded content of the .vs files, by path, shared between calls.
+
+    Returns:
+        str: The new content with included .vs files substituted.
+    """
+    if expanded_snippets is None:
+        expanded_snippets = {}
+    chunks = []
+    _write_substituted(source_file, sources_list, chunks.append, expanded_snippets, [])
+    return "".join(chunks)
+
+
+_VS_INCLUDE_PATTERN = re.compile(r'^\s*?`include\s+?"(.+?)\.vs"')
+
+
+def _write_substituted(source_file, sources_list, write, expanded_snippets, including):
+    """
+    Writes the content of a file, replacing each included .vs file by its expanded content.
+
+    Args:
+        source_file (str): The source file containing potential `include directives.
+        sources_list (OrderedFileSet): Ordered set of source file paths.
+        write (callable): Function called with each chunk of the new content, in order.
+        expanded_snippets (dict): Expanded content of the .vs files, by path.
+            Each .vs file is expanded once, and its expansion reused by every file including it.
+        including (list): Paths of the .vs files being expanded, used to detect include cycles.
     """
-    new_content = ""
     on_comment = False
 
     with open(source_file, "r") as file:
         for line in file:
             if not on_comment:
-                filename_match = re.findall(r'^\s*?`include\s+?"(.+?)\.vs"', line)
+                filename_match = _VS_INCLUDE_PATTERN.match(line)
                 if filename_match:
-                    vs_file = filename_match[0] + ".vs"
+                    vs_file = filename_match.group(1) + ".vs"
                     vs_file_path = find_filename_in_list(vs_file, sources_list)
 
                     if vs_file_path:
-                        new_content += substitute_vs_file(vs_file_path, sources_list)
+                        write(_expand_snippet(vs_file_path, sources_list, expanded_snippets, including))
                     else:
                         warning_text = f"File {vs_file} does not exist to substitute."
                         vs_print(WARNING, warning_text)
-                        new_content += f"  // {warning_text}\n"
-                    if "/*" in line:
+                        write(f"  // {warning_text}\n")
+                    # The comment argument of the include is dropped, up to the line where it ends
+                    if "/*" in line and "*/" not in line.split("/*", 1)[1]:
                         on_comment = True
                 else:
-                    new_content += line
+                    write(line)
             else:
                 if "*/" in line:
                     on_comment = False
 
-    return new_content
+
+def _expand_snippet(vs_file_path, sources_list, expanded_snippets, including):
+    """
+    Returns the expanded content of a .vs file, expanding it only the first time.
+
+    Args:
+        vs_file_path (str): Path to the .vs file.
+        sources_list (OrderedFileSet): Ordered set of source file paths.
+        expanded_snippets (dict): Expanded content of the .vs files, by path.
+        including (list): Paths of the .vs files being expanded.
+
+    Returns:
+        str: The content of the .vs file with its own includes substituted.
+    """
+    if vs_file_path in expanded_snippets:
+        return expanded_snippets[vs_file_path]
+    if vs_file_path in including:
+        cycle = including[including.index(vs_file_path):] + [vs_file_path]
+        vs_print(
+            ERROR,
+            f"Include cycle found: {' -> '.join(os.path.basename(path) for path in cycle)}",
+        )
+        exit(1)
+
+    including.append(vs_file_path)
+    chunks = []
+    _write_substituted(vs_file_path, sources_list, chunks.append, expanded_snippets, including)
+    including.pop()
+    expanded_snippets[vs_file_path] = "".join(chunks)
+    return expanded_snippets[vs_file_path]
 
 
 def find_filename_in_list(filename, files_list):
@@ -726,23 +1495,22 @@ def find_filename_in_list(filename, files_list):
 
     Args:
         filename (str): The filename to find.
-        files_list (list): The list of files to search.
+        files_list (OrderedFileSet or list): The files to search.
 
     Returns:
-        str or None: The first matching file, or None if the file is not found.
+        str or None: The last matching file, or None if the file is not found.
     """
-    found_files = None
-    for file in files_list:
-        if os.path.basename(file) == filename:
-            if found_files != None:
-                vs_print(
-                    WARNING,
-                    f"Found more than one directory with file {filename}.\n  {file}",
-                )
-            found_files = file
+    if not isinstance(files_list, OrderedFileSet):
+        files_list = OrderedFileSet(files_list)
+    found_files = files_list.find(filename)
+    for file in found_files[1:]:
+        vs_print(
+            WARNING,
+            f"Found more than one directory with file {filename}.\n  {file}",
+        )
 
     if found_files:
-        return found_files
+        return found_files[-1]
     return None
 
 
@@ -771,7 +1539,7 @@ def create_directory(path):
         os.makedirs(path)
         vs_print(INFO, f"Created directory '{path}'.")
     except OSError as e:
-        vs_print(DEBUG, f"Did not create directory: {e}")
+        vs_print(DEBUG, "Did not create directory: %s", e)
 
 
 def parse_arguments():
@@ -791,6 +1559,8 @@ def parse_arguments():
     include_directories = []
 
     for i in range(1, len(sys.argv)):
+        if sys.argv[i - 1] == "-j" or re.match(r"^-j\d*$", sys.argv[i]):
+            continue
         parameter = re.match(r'^(\w+)="?([^"]+)"?$', sys.argv[i])
         testbench = re.match(r'^--TestBench="?([^"]+)"?$', sys.argv[i])
         boards = re.match(r'^--Boards="?(.+?)"?$', sys.argv[i])
@@ -838,7 +1608,7 @@ def parse_arguments():
             
             if re.match(verilog_pattern, value) or re.match(integer_pattern, value):
                 parameters[name] = value
-                vs_print(DEBUG, f"Parsed parameter {name} = {value}")
+                vs_print(DEBUG, "Parsed parameter %s = %s", name, value)
             else:
                 vs_print(WARNING, f"Invalid parameter value format: {sys.argv[i]}")
             continue
@@ -849,41 +1619,1141 @@ def parse_arguments():
     return module_name, testbench_name, board_modules, parameters, include_directories
 
 
-def main():
+def parse_options():
     """
-    Main function to handle the vs_build script execution.
-    It processes command-line arguments, cleans the build directory if requested,
-    and builds the RTL, TestBench, and board modules as specified.
+    Parses the options that control how vs_build runs, rather than what it builds.
+
+    Returns:
+        dict: A dictionary with the options:
+            "jobs" (int or None): maximum number of generator scripts running at once, None if not given.
+            "cache" (bool): whether the files generated by scripts are restored from the cache.
+            "cache_size" (int): maximum size of the generator cache, in bytes.
+            "watch" (bool): whether to keep rebuilding the project when its files change.
+            "profile" (str or None): None to not trace the build, otherwise the path of the trace
+                file to write, or an empty string for vs_trace.json in the build directory.
+            "ninja" (bool): whether to write a Ninja build file.
+            "store" (str or None): directory of the artifact store shared with other vs_build processes.
+            "store_size" (int): maximum size of the artifact store, in bytes.
+            "plan" (str or None): None to build, otherwise only plan the build, writing the plan
+                as JSON to this path if it is not empty.
+            "build_dir" (str or None): subdirectory of "build" where everything is built, or None
+                to build directly in "build".
+            "manifest" (str or None): path of the file listing the targets to build, see `run_batch`.
     """
-    current_directory = os.getcwd()
-    if len(sys.argv) < 2 or sys.argv[1] == "--help":
-        help_build()        
-    else:
-        if "--clean" in sys.argv:
-            clean_build(current_directory)
-        main_module, testbench, board_modules, parameters, include_directories = parse_arguments()
-        if main_module != None:
-            script_files, verilog_files = find_existing_files(current_directory, include_directories)
-            rtl_sources = rtl_build(
-                current_directory, main_module, parameters, verilog_files, script_files
+    options = {
+        "jobs": None,
+        "cache": True,
+        "cache_size": DEFAULT_CACHE_SIZE,
+        "watch": False,
+        "profile": None,
+        "ninja": False,
+        "store": os.environ.get("VS_ARTIFACT_STORE") or None,
+        "store_size": DEFAULT_STORE_SIZE,
+        "plan": None,
+        "build_dir": None,
+        "manifest": None,
+    }
+
+    for i in range(1, len(sys.argv)):
+        jobs = re.match(r"^(?:--jobs=|-j)(\d*)$", sys.argv[i])
+        if jobs:
+            value = jobs.group(1)
+            if value == "" and i + 1 < len(sys.argv):
+                value = sys.argv[i + 1]
+            if not value.isdigit() or int(value) < 1:
+                vs_print(ERROR, f"Invalid number of jobs {value}")
+                help_build()
+                exit(1)
+            options["jobs"] = int(value)
+        elif sys.argv[i] == "--no-cache":
+            options["cache"] = False
+        elif sys.argv[i] == "--watch":
+            options["watch"] = True
+        elif sys.argv[i] == "--ninja":
+            options["ninja"] = True
+        elif sys.argv[i].startswith("--build_dir="):
+            value = sys.argv[i][len("--build_dir="):].strip('"').strip("/")
+            if not re.match(r"^[\w.-]+(/[\w.-]+)*$", value) or ".." in value.split("/"):
+                vs_print(ERROR, f"Invalid build directory {value}")
+                help_build()
+                exit(1)
+            options["build_dir"] = value
+        elif sys.argv[i].startswith("--manifest="):
+            options["manifest"] = os.path.abspath(sys.argv[i][len("--manifest="):].strip('"'))
+        elif re.match(r"^--plan(=.*)?$", sys.argv[i]):
+            options["plan"] = sys.argv[i][len("--plan="):].strip('"')
+        elif re.match(r"^--profile(=.*)?$", sys.argv[i]):
+            options["profile"] = sys.argv[i][len("--profile="):].strip('"')
+        elif sys.argv[i].startswith("--cache_size="):
+            value = sys.argv[i][len("--cache_size="):]
+            if not value.isdigit():
+                vs_print(ERROR, f"Invalid cache size {value}")
+                help_build()
+                exit(1)
+            options["cache_size"] = int(value) * 1024 * 1024
+        elif sys.argv[i].startswith("--store="):
+            options["store"] = os.path.abspath(sys.argv[i][len("--store="):].strip('"'))
+        elif sys.argv[i].startswith("--store_size="):
+            value = sys.argv[i][len("--store_size="):]
+            if not value.isdigit():
+                vs_print(ERROR, f"Invalid store size {value}")
+                help_build()
+                exit(1)
+            options["store_size"] = int(value) * 1024 * 1024
+
+    return options
+
+
+def build_project(
+    current_directory,
+    main_module,
+    testbench,
+    board_modules,
+    parameters,
+    verilog_files,
+    script_files,
+    graph,
+    project_index=None,
+    ninja=False,
+    build_directory=None,
+):
+    """
+    Builds the RTL, the TestBench and the boards of the project.
+
+    Args:
+        current_directory (str): The current working directory.
+        main_module (str): The main module name.
+        testbench (str): The TestBench name.
+        board_modules (list): List of board module names.
+        parameters (dict): Build parameters to pass to scripts.
+        verilog_files (OrderedFileSet): Index of Verilog source file paths.
+        script_files (ScriptIndex): Index of script file paths.
+        graph (DependencyGraph): Dependency graph shared between builds.
+        project_index (ProjectIndex, optional): Index of the project files, used to find the TestBench C++ file.
+        ninja (bool, optional): Whether to write a Ninja build file next to the depfiles.
+        build_directory (str, optional): Directory where everything is built, by default "build".
+    """
+    graph.outputs = {}
+    rtl_sources = rtl_build(
+        current_directory,
+        main_module,
+        parameters,
+        verilog_files,
+        script_files,
+        graph,
+        build_directory,
+    )
+    # The TestBench and the boards only depend on the RTL sources, their build
+    # directories are written concurrently once all their sources are resolved
+    deferred_builds = []
+    testbench_build(
+        current_directory,
+        testbench,
+        verilog_files,
+        script_files,
+        rtl_sources,
+        parameters,
+        graph,
+        project_index,
+        deferred_builds,
+        build_directory,
+    )
+    if board_modules != []:
+        board_build(
+            current_directory,
+            board_modules,
+            main_module,
+            verilog_files,
+            script_files,
+            rtl_sources,
+            parameters,
+            graph,
+            deferred_builds,
+            build_directory,
+        )
+    run_deferred_builds(deferred_builds, graph.scheduler.jobs)
+    with span("dependency files", "stage"):
+        write_dependency_files(current_directory, graph, verilog_files, ninja, build_directory)
+
+
+def plan_build(
+    current_directory,
+    main_module,
+    testbench,
+    board_modules,
+    parameters,
+    verilog_files,
+    script_files,
+    graph,
+    build_directory=None,
+):
+    """
+    Resolves the RTL, the TestBench and the boards like `build_project`, recording in the plan of
+    the graph scheduler what building them would do instead of doing it.
+
+    Args:
+        current_directory (str): The current working directory.
+        main_module (str): The main module name.
+        testbench (str): The TestBench name.
+        board_modules (list): List of board module names.
+        parameters (dict): Build parameters to pass to scripts.
+        verilog_files (OrderedFileSet): Index of Verilog source file paths.
+        script_files (ScriptIndex): Index of script file paths.
+        graph (DependencyGraph): Dependency graph shared between builds, its scheduler holds the plan.
+        build_directory (str, optional): Directory where everything is built, by default "build".
+    """
+    plan = graph.scheduler.plan
+    build_dir = build_directory if build_directory is not None else f"{current_directory}/build"
+    targets = [(main_module, f"{build_dir}/RTL", False), (testbench, f"{build_dir}/TestBench", True)]
+    for board_module in board_modules:
+        board_name = _extract_board_name(board_module, main_module)
+        targets.append((board_module, f"{build_dir}/RTL/{board_name}", True))
+
+    rtl_sources = []
+    for module_name, target_dir, excludes_rtl in targets:
+        plan.target = module_name
+        first_call = len(plan.calls)
+        with span(f"resolve {module_name}", "stage"):
+            sources = build_dependency_tree(
+                current_directory, verilog_files, script_files, module_name, parameters, graph
             )
-            testbench_build(
-                current_directory, testbench, verilog_files, script_files, rtl_sources, parameters
+        if not excludes_rtl:
+            rtl_sources = sources
+        _plan_outputs(
+            filter_list(sources, rtl_sources if excludes_rtl else []),
+            target_dir,
+            graph,
+            plan.calls[first_call:],
+        )
+
+
+def _plan_outputs(sources_list, build_dir, graph, calls):
+    """
+    Records in the plan the outputs a build would write to its directory.
+
+    The content of each output is substituted in memory and compared with the output on disk. An
+    output including a .vs file a script must generate first is pending, as is the file of each
+    module a script must generate.
+
+    Args:
+        sources_list (OrderedFileSet): The sources of the build, without those of other builds.
+        build_dir (str): Path to the build directory.
+        graph (DependencyGraph): Dependency graph shared between builds, its scheduler holds the plan.
+        calls (list): The calls recorded in the plan while resolving this build.
+    """
+    plan = graph.scheduler.plan
+    pending_files = plan.pending_files()
+    output_hashes = graph.state.output_hashes(build_dir) if graph.state is not None else {}
+    for verilog_file in sources_list:
+        if verilog_file.endswith(".vs"):
+            continue
+        destination_path = f"{build_dir}/{os.path.basename(verilog_file)}"
+        pending = False
+        for file_path in [verilog_file] + graph.included_files(verilog_file):
+            facts = graph.parse_cache.cached_facts(file_path) if graph.parse_cache is not None else None
+            if facts is None:
+                facts = scan_verilog_file(file_path)
+            names = [item[0].split()[0] for item in facts["dependencies"]]
+            if any(name.endswith(".vs") and name in pending_files for name in names):
+                pending = True
+                break
+        if pending:
+            plan.add_output(destination_path, verilog_file, "pending")
+            continue
+
+        digest = hashlib.sha256()
+        _write_substituted(
+            verilog_file,
+            sources_list,
+            lambda chunk: digest.update(chunk.encode()),
+            graph.expanded_snippets,
+            [],
+        )
+        current_digest, _ = _current_digest(destination_path, output_hashes)
+        if current_digest is None:
+            status = "new"
+        elif current_digest == digest.hexdigest():
+            status = "unchanged"
+        else:
+            status = "rewrite"
+        plan.add_output(destination_path, verilog_file, status)
+
+    for call in calls:
+        name, extension = os.path.splitext(call["file"])
+        if call["status"] == "run" and extension != ".vs":
+            file_name = call["file"] if extension else f"{name}.v"
+            plan.add_output(f"{build_dir}/{file_name}", None, "pending")
+
+
+def write_dependency_files(current_directory, graph, verilog_files, ninja=False, build_directory=None):
+    """
+    Writes the files each output under the build directory depends on, for Make or Ninja.
+
+    Each output gets a Makefile depfile under build/deps, listing its source, the .vs files
+    substituted into it and the scripts that generated any of them. Optionally, build/build.ninja
+    runs vs_build again, with the same arguments, when any of those files changes.
+
+    Args:
+        current_directory (str): The current working directory.
+        graph (DependencyGraph): Dependency graph of the build, with its outputs.
+        verilog_files (OrderedFileSet): Index of Verilog file paths, including the generated files.
+        ninja (bool, optional): Whether to write build/build.ninja.
+        build_directory (str, optional): Directory holding the outputs, by default "build".
+    """
+    generating_scripts = _generating_scripts(graph, verilog_files)
+    if build_directory is None:
+        build_directory = os.path.join(current_directory, "build")
+    outputs = []
+    inputs = {}
+    for output_path, source_path in sorted(graph.outputs.items()):
+        prerequisites = {}
+        for file_path in [source_path] + graph.included_files(source_path):
+            prerequisites[os.path.relpath(file_path, current_directory)] = None
+            if file_path in generating_scripts:
+                prerequisites[os.path.relpath(generating_scripts[file_path], current_directory)] = None
+        depfile_path = _depfile_path(build_directory, output_path)
+        output = os.path.relpath(output_path, current_directory)
+        write_depfile(depfile_path, output, list(prerequisites))
+        outputs.append(output)
+        inputs.update(prerequisites)
+
+    if ninja:
+        generated_files = {
+            os.path.relpath(file_path, current_directory) for file_path in generating_scripts
+        }
+        arguments = [
+            argument for argument in sys.argv[1:] if not _NOT_REBUILT_OPTIONS.match(argument)
+        ]
+        write_ninja(
+            os.path.join(build_directory, NINJA_FILE),
+            shlex.join([sys.executable, "-m", "VeriSnip.vs_build"] + arguments),
+            outputs + sorted(generated_files),
+            [file_path for file_path in inputs if file_path not in generated_files],
+        )
+
+
+def _generating_scripts(graph, verilog_files):
+    """
+    Finds the script that generated each generated file of a build.
+
+    Args:
+        graph (DependencyGraph): Dependency graph of the build.
+        verilog_files (OrderedFileSet): Index of Verilog file paths, including the generated files.
+
+    Returns:
+        dict: The path of the script, by generated file path.
+    """
+    generating_scripts = {}
+    for job in graph.scheduler.history.values():
+        generated_file = _dependency_path((job.file_name,), verilog_files)
+        if generated_file is not None:
+            generating_scripts[generated_file] = job.script_path
+    return generating_scripts
+
+
+def _depfile_path(build_directory, output_path):
+    """
+    Returns the path of the depfile of an output.
+
+    Args:
+        build_directory (str): Directory holding the outputs.
+        output_path (str): Path of the output.
+
+    Returns:
+        str: The path of the depfile, under the deps directory of the build directory.
+    """
+    return os.path.join(
+        build_directory, DEPS_DIRECTORY, os.path.relpath(output_path, build_directory) + ".d"
+    )
+
+
+def record_build_state(current_directory, graph, verilog_files, build_directory):
+    """
+    Records the outputs and the generated files of a build in the build state, and removes those
+    that are no longer used.
+
+    The outputs the target wrote before and no longer writes, like the file of a module removed
+    from the hierarchy, are removed with their depfiles. The generated files the target used
+    before, that neither it nor any other target recorded in the state uses now, are removed too.
+    Files the state never recorded are left alone.
+
+    Args:
+        current_directory (str): The current working directory.
+        graph (DependencyGraph): Dependency graph of the build, with its outputs and state.
+        verilog_files (OrderedFileSet): Index of Verilog file paths, including the generated files.
+        build_directory (str): Directory holding the outputs of the target.
+    """
+    state = graph.state
+    generating_scripts = _generating_scripts(graph, verilog_files)
+    outputs = {
+        output_path: (source_path, generating_scripts.get(source_path))
+        for output_path, source_path in graph.outputs.items()
+    }
+    for output_path in state.record_outputs(build_directory, outputs):
+        _remove_output(output_path, build_directory)
+
+    generated_directory = os.path.join(current_directory, "generated")
+    generated_files = {
+        file_path: generating_scripts.get(file_path)
+        for file_path in verilog_files
+        if os.path.dirname(file_path) == generated_directory
+    }
+    for file_path in state.record_generated(build_directory, generated_files):
+        if os.path.isfile(file_path):
+            vs_print(INFO, f"Removing {relative_path(file_path)}, no target uses it anymore.")
+            _remove_file(file_path)
+
+
+def _remove_output(output_path, build_directory):
+    """
+    Removes an output no longer written and its depfile, and the directories they leave empty.
+
+    Args:
+        output_path (str): Path of the output.
+        build_directory (str): Directory holding the outputs of the target.
+    """
+    vs_print(INFO, f"Removing {relative_path(output_path)}, it is no longer built.")
+    for file_path in [output_path, _depfile_path(build_directory, output_path)]:
+        _remove_file(file_path)
+        directory = os.path.dirname(file_path)
+        while directory.startswith(build_directory + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+def _remove_file(file_path):
+    """
+    Removes a file, if it exists.
+
+    Args:
+        file_path (str): Path of the file.
+    """
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        vs_print(WARNING, f"Could not remove {relative_path(file_path)}. {e}")
+
+
+def _build_inputs(file_paths):
+    """
+    Lists the files a build reads: the project files and the inputs of its generator scripts.
+
+    The scripts are called or restored from the cache depending on their inputs, see
+    `script_inputs`, so a build reading the same project files is only the same if those are too.
+
+    Args:
+        file_paths (iterable): Paths of the indexed project files.
+
+    Returns:
+        list: Paths of the files, without repetitions.
+    """
+    input_paths = dict.fromkeys(file_paths)
+    script_directories = set()
+    for file_path in list(input_paths):
+        directory = os.path.dirname(file_path)
+        if os.path.splitext(file_path)[1] in SCRIPT_EXTENSIONS and directory not in script_directories:
+            script_directories.add(directory)
+            input_paths.update(dict.fromkeys(script_inputs(file_path)))
+    return list(input_paths)
+
+
+def _file_signatures(file_paths):
+    """
+    Returns the size and modification time of files.
+
+    Args:
+        file_paths (iterable): Paths of the files.
+
+    Returns:
+        dict: [size, modification time in nanoseconds] of each file that exists, by path.
+    """
+    signatures = {}
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        signatures[file_path] = [stat.st_size, stat.st_mtime_ns]
+    return signatures
+
+
+def _build_outputs(graph, build_directory, testbench, ninja=False):
+    """
+    Lists the files a build wrote.
+
+    The generated files are left out: the targets of a manifest may generate the same files with
+    different parameters, and the outputs of a target are still current when another target
+    generated its files again.
+
+    Args:
+        graph (DependencyGraph): Dependency graph of the build, with its outputs.
+        build_directory (str): Directory holding the outputs of the target.
+        testbench (str): The TestBench name.
+        ninja (bool, optional): Whether the build wrote a Ninja build file.
+
+    Returns:
+        list: Paths of the outputs, their depfiles, the TestBench C++ file and the Ninja build file.
+    """
+    file_paths = []
+    for output_path in graph.outputs:
+        file_paths.extend([output_path, _depfile_path(build_directory, output_path)])
+    file_paths.append(f"{build_directory}/TestBench/{testbench}.cpp")
+    if ninja:
+        file_paths.append(os.path.join(build_directory, NINJA_FILE))
+    return file_paths
+
+
+def _build_is_current(state, build_directory, arguments, inputs):
+    """
+    Checks whether a target was built with the same arguments from the same files, and its outputs
+    were not modified since.
+
+    Args:
+        state (BuildState): State of the previous builds.
+        build_directory (str): Directory holding the outputs of the target.
+        arguments (str): The arguments of the build, see `run_build`.
+        inputs (dict): Signatures of the project files, see `_file_signatures`.
+
+    Returns:
+        bool: True if building the target again would not change anything.
+    """
+    stamp = state.stamp(build_directory)
+    if stamp is None or stamp["arguments"] != arguments or stamp["inputs"] != inputs:
+        return False
+    return _file_signatures(stamp["outputs"]) == stamp["outputs"]
+
+
+def _stamp_build(state, build_directory, arguments, inputs, outputs, started):
+    """
+    Records the stamp of a target after building it, unless its files changed while it was built.
+
+    Args:
+        state (BuildState): State of the previous builds.
+        build_directory (str): Directory holding the outputs of the target.
+        arguments (str): The arguments of the build, see `run_build`.
+        inputs (dict): Signatures of the project files taken before the build, see `_file_signatures`.
+        outputs (list): Paths of the files the build wrote or used from the generated directory.
+        started (int): Time the build started at, in nanoseconds.
+    """
+    racy = any(mtime > started - RACY_INTERVAL_NS for _, mtime in inputs.values())
+    if racy or _file_signatures(inputs) != inputs:
+        state.set_stamp(build_directory, None)
+        return
+    state.set_stamp(
+        build_directory,
+        {"arguments": arguments, "inputs": inputs, "outputs": _file_signatures(outputs)},
+    )
+
+
+# Options left out of the command written to build.ninja, they do not change what is built
+_NOT_REBUILT_OPTIONS = re.compile(r"^(--clean|--watch|--profile(=.*)?|--server|--socket=.*)$")
+
+
+def watch_build(
+    current_directory,
+    main_module,
+    testbench,
+    board_modules,
+    parameters,
+    include_directories,
+    verilog_files,
+    graph,
+    project_index,
+    watcher,
+    ninja=False,
+    build_directory=None,
+):
+    """
+    Rebuilds the project each time its files change, until interrupted.
+
+    The file index, the dependency graph and the expanded .vs files are kept between builds.
+    Only the changed files are analysed again, only the scripts that changed run again, and only
+    the outputs of the changed files and of the files including them are written again.
+
+    Args:
+        current_directory (str): The current working directory.
+        main_module (str): The main module name.
+        testbench (str): The TestBench name.
+        board_modules (list): List of board module names.
+        parameters (dict): The parameters given on the command line.
+        include_directories (list): Additional directories with Verilog files and scripts.
+        verilog_files (OrderedFileSet): Index of Verilog file paths, including the generated files.
+        graph (DependencyGraph): Dependency graph of the previous build.
+        project_index (ProjectIndex): Index of the project files.
+        watcher (FileWatcher): Watcher polled before the previous build.
+        ninja (bool, optional): Whether to write a Ninja build file, see `write_dependency_files`.
+        build_directory (str, optional): Directory where everything is built, by default "build".
+    """
+    search_directories = [current_directory] + include_directories
+    vs_print(INFO, "Watching the project files for changes, press Ctrl+C to stop.")
+    try:
+        while True:
+            flush_log()
+            time.sleep(POLL_INTERVAL)
+            project_index.update(search_directories)
+            changed_files, added_files, removed_files = watcher.poll(project_index.files())
+            if not (changed_files or added_files or removed_files):
+                continue
+            for file_path in changed_files + added_files:
+                vs_print(INFO, f"{relative_path(file_path)} changed.")
+            for file_path in removed_files:
+                vs_print(INFO, f"{relative_path(file_path)} was removed.")
+
+            script_files, verilog_files = _invalidate_changes(
+                current_directory,
+                include_directories,
+                changed_files,
+                added_files,
+                removed_files,
+                verilog_files,
+                graph,
+                project_index,
             )
-            if board_modules != []:
-                board_build(
+            try:
+                build_project(
                     current_directory,
-                    board_modules,
                     main_module,
+                    testbench,
+                    board_modules,
+                    parameters,
                     verilog_files,
                     script_files,
-                    rtl_sources,
-                    parameters,
+                    graph,
+                    project_index,
+                    ninja,
+                    build_directory,
                 )
-            vs_print(OK, f"Created {main_module} project build directory.")
-        else:
-            vs_print(ERROR, f"Undefined main module!")
+            except SystemExit:
+                vs_print(WARNING, "The build failed, waiting for changes.")
+                graph.reset()
+                continue
+            if graph.state is not None:
+                record_build_state(current_directory, graph, verilog_files, build_directory)
+            if graph.parse_cache is not None:
+                graph.parse_cache.save()
+            vs_print(OK, f"Rebuilt {main_module} project build directory.")
+    except KeyboardInterrupt:
+        vs_print(INFO, "Stopped watching the project files.")
+
+
+def _invalidate_changes(
+    current_directory,
+    include_directories,
+    changed_files,
+    added_files,
+    removed_files,
+    verilog_files,
+    graph,
+    project_index,
+):
+    """
+    Updates the file indexes and the dependency graph after some project files changed.
+
+    Files whose content changed are analysed again. When a script changes the files it generated
+    are removed, so they are generated again. When files are added or removed, scripts change or
+    the parameters of a file change, every file is analysed again (from the parse cache, if
+    unchanged). If the parameters changed, the generated files are also generated again, or
+    restored from the generator cache. `graph.changed_files` is set to the sources whose outputs
+    must be written again, or to None when every output must be checked.
+
+    Args:
+        current_directory (str): The current working directory.
+        include_directories (list): Additional directories with Verilog files and scripts.
+        changed_files (list): Paths of the project files that changed.
+        added_files (list): Paths of the project files that were added.
+        removed_files (list): Paths of the project files that were removed.
+        verilog_files (OrderedFileSet): Index of Verilog file paths, including the generated files.
+        graph (DependencyGraph): Dependency graph of the previous build.
+        project_index (ProjectIndex): Index of the project files, already updated.
+
+    Returns:
+        tuple: The updated indexes of the scripts (ScriptIndex) and Verilog files (OrderedFileSet).
+    """
+    changed_sources = [
+        file_path
+        for file_path in changed_files
+        if os.path.splitext(file_path)[1] in VERILOG_EXTENSIONS
+    ]
+    changed_scripts = [
+        file_path
+        for file_path in changed_files + added_files + removed_files
+        if os.path.splitext(file_path)[1] in SCRIPT_EXTENSIONS
+    ]
+    structure_changed = any(
+        os.path.splitext(file_path)[1] in VERILOG_EXTENSIONS + SCRIPT_EXTENSIONS
+        for file_path in added_files + removed_files
+    )
+
+    affected_files = set(changed_sources)
+    if graph.scheduler.cache is not None:
+        for script_path in changed_scripts:
+            graph.scheduler.cache.forget_script(script_path)
+    for job in graph.scheduler.history.values():
+        if job.script_path in changed_scripts:
+            generated_file = _dependency_path((job.file_name,), verilog_files)
+            if generated_file is not None and os.path.exists(generated_file):
+                os.remove(generated_file)
+                affected_files.add(generated_file)
+                if log_enabled(DEBUG):
+                    vs_print(DEBUG, f"Removed {relative_path(generated_file)}, {job.script_path} changed.")
+
+    parameters_changed = graph.parse_cache is None and bool(changed_sources)
+    if graph.parse_cache is not None:
+        for file_path in changed_sources:
+            previous_facts = graph.parse_cache.cached_facts(file_path)
+            facts = graph.parse_cache.facts(file_path, scan_verilog)
+            if previous_facts is None or any(
+                previous_facts[kind] != facts[kind]
+                for kind in ["parameter_definitions", "instance_parameters"]
+            ):
+                parameters_changed = True
+
+    affected_files |= graph.includers(affected_files)
+    for file_path in affected_files:
+        graph.expanded_snippets.pop(file_path, None)
+    if structure_changed or changed_scripts or parameters_changed:
+        graph.reset()
+    else:
+        for file_path in changed_sources:
+            graph.forget(file_path)
+    graph.changed_files = affected_files
+    if structure_changed or parameters_changed:
+        graph.changed_files = None
+
+    # Generated files are not in the project index, keep the ones that still exist
+    generated_directory = os.path.join(current_directory, "generated")
+    script_files, project_verilog_files = find_existing_files(
+        current_directory, include_directories, project_index
+    )
+    if not parameters_changed:
+        for file_path in verilog_files:
+            if os.path.dirname(file_path) == generated_directory and os.path.exists(file_path):
+                project_verilog_files.append(file_path)
+    return script_files, project_verilog_files
+
+
+class BuildSession:
+    """
+    State kept in memory between the build requests for one project served by `vs_build --server`.
+
+    The indexes, the parse cache and the dependency graph of the previous request are reused as
+    long as the parameters, include directories and cache options stay the same. Like `--watch`,
+    the project files changed since the previous request are found by polling them, and only
+    what they affect is analysed, generated and written again.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the state, so the next request builds the project like a new vs_build process.
+        """
+        self.key = None
+        self.project_index = None
+        self.graph = None
+        self.script_files = None
+        self.verilog_files = None
+        self.watcher = None
+
+
+class BuildBatch:
+    """
+    State shared by the targets of a manifest built by `run_batch`.
+
+    The first target lists the project files and opens the caches, the next ones reuse them as
+    long as their include directories and cache options are the same. Each target still resolves
+    its own dependency graph, since its parameters may differ, and starts from the project files
+    only, without the files generated for the previous targets.
+
+    Attributes:
+        key (list or None): The include directories and cache options the state was created with.
+        project_index (ProjectIndex or None): Index of the project files.
+        script_files (ScriptIndex or None): Index of the script files.
+        verilog_files (OrderedFileSet or None): Index of the Verilog files of the project, not
+            including any generated file.
+        cache (GeneratorCache or None): Cache of the files generated by the scripts.
+        parse_cache (ParseCache or None): Cache of the facts found in each file.
+        run_times (RunTimes or None): Record of how long the calls to each script take.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.project_index = None
+        self.script_files = None
+        self.verilog_files = None
+        self.cache = None
+        self.parse_cache = None
+        self.run_times = None
+
+
+def run_batch(current_directory, manifest_path):
+    """
+    Builds every target listed in a manifest, in one process.
+
+    Each line of the manifest holds the vs_build arguments of one target: its top module and,
+    optionally, its --TestBench, --Boards, parameters and other options; "#" starts a comment.
+    The targets are built one after another, with the arguments vs_build received before theirs,
+    each in build/<top module> unless it gives its own --build_dir. They share the file index,
+    the parse cache, the generator cache and the plugin workers, see `BuildBatch`.
+
+    Args:
+        current_directory (str): The current working directory.
+        manifest_path (str): Path of the manifest.
+    """
+    try:
+        with open(manifest_path, "r") as file:
+            lines = file.readlines()
+    except OSError as e:
+        vs_print(ERROR, f"Could not read the manifest {manifest_path}. {e}")
+        exit(1)
+    targets = []
+    for line_number, line in enumerate(lines, 1):
+        try:
+            arguments = shlex.split(line, comments=True)
+        except ValueError as e:
+            vs_print(ERROR, f"Invalid line {line_number} in the manifest {manifest_path}. {e}")
             exit(1)
+        if arguments:
+            targets.append(arguments)
+    if not targets:
+        vs_print(ERROR, f"No targets in the manifest {manifest_path}.")
+        exit(1)
+    if "--watch" in sys.argv:
+        vs_print(WARNING, "--watch is ignored with --manifest.")
+
+    options = parse_options()
+    common_arguments = [
+        argument
+        for argument in sys.argv[1:]
+        if not argument.startswith("--manifest=") and argument not in ("--clean", "--watch")
+    ]
+    program_arguments = sys.argv
+    batch = BuildBatch()
+    try:
+        for index, arguments in enumerate(targets, 1):
+            vs_print(INFO, f"Building target {index}/{len(targets)}: {' '.join(arguments)}")
+            sys.argv = [program_arguments[0]] + common_arguments + arguments
+            run_build(current_directory, batch=batch)
+    finally:
+        sys.argv = program_arguments
+    if options["plan"] is None:
+        batch.parse_cache.save()
+        batch.run_times.save()
+    store = batch.cache.shared if batch.cache is not None else None
+    if store is not None:
+        vs_print(INFO, store.report())
+    vs_print(OK, f"Built the {len(targets)} targets of {relative_path(manifest_path)}.")
+
+
+def _trace_path(profile, build_directory, build_dir, batch):
+    """
+    Finds where the trace of a build is written.
+
+    The targets of a manifest each write their own trace: in their build directory by default,
+    otherwise next to the given path, with the name of their build directory appended.
+
+    Args:
+        profile (str): The path given to --profile, empty for the default one.
+        build_directory (str): Directory holding the outputs of the target.
+        build_dir (str or None): Subdirectory of "build" the target is built in.
+        batch (BuildBatch or None): State shared with the other targets of a manifest.
+
+    Returns:
+        str: Path of the trace file.
+    """
+    if not profile:
+        return os.path.join(build_directory, "vs_trace.json")
+    if batch is None or build_dir is None:
+        return profile
+    root, extension = os.path.splitext(profile)
+    return f"{root}_{build_dir.replace('/', '_')}{extension}"
+
+
+def handle_build_request(sessions, current_directory):
+    """
+    Runs a build request received by the server, with the arguments already in sys.argv.
+
+    Args:
+        sessions (dict): The BuildSession of each project directory.
+        current_directory (str): The project directory.
+    """
+    session = sessions.setdefault(current_directory, BuildSession())
+    try:
+        run_build(current_directory, session)
+    except BaseException:
+        session.reset()
+        raise
+
+
+def run_build(current_directory, session=None, batch=None):
+    """
+    Builds the project as requested by the command-line arguments.
+
+    Args:
+        current_directory (str): The current working directory.
+        session (BuildSession, optional): State kept from the previous request for this project,
+            updated for the next one. By default the project is built from scratch.
+        batch (BuildBatch, optional): State shared with the other targets of a manifest, the
+            target is then built in build/<top module> by default.
+    """
+    configure_logging()
+    if "--clean" in sys.argv:
+        clean_build(current_directory)
+        if session is not None:
+            session.reset()
+    options = parse_options()
+    if options["manifest"] is not None and batch is None:
+        run_batch(current_directory, options["manifest"])
+        return
+    main_module, testbench, board_modules, parameters, include_directories = parse_arguments()
+    if main_module == None:
+        if "--clean" in sys.argv:
+            # Only cleaning was requested
+            return
+        vs_print(ERROR, f"Undefined main module!")
+        exit(1)
+    # Under a parallel make, the scripts take their slots from its jobserver instead
+    job_slots = job_server(inherited=session is None)
+    if options["jobs"] is None:
+        if job_slots is not None and job_slots.limit is not None:
+            options["jobs"] = job_slots.limit
+        else:
+            options["jobs"] = os.cpu_count() or 1
+    if batch is not None:
+        options["watch"] = False
+        if options["build_dir"] is None:
+            options["build_dir"] = main_module
+    build_directory = f"{current_directory}/build"
+    if options["build_dir"] is not None:
+        build_directory = f"{build_directory}/{options['build_dir']}"
+    if options["watch"] and session is not None:
+        vs_print(WARNING, "--watch is ignored by the vs_build server.")
+        options["watch"] = False
+    if options["watch"] and options["plan"] is not None:
+        vs_print(WARNING, "--watch is ignored with --plan.")
+        options["watch"] = False
+
+    trace_path = None
+    if options["profile"] is not None:
+        trace_path = _trace_path(options["profile"], build_directory, options["build_dir"], batch)
+        start_tracing()
+    state = None
+    try:
+        shared_key = [
+            include_directories,
+            options["cache"],
+            options["cache_size"],
+            options["store"],
+            options["store_size"],
+        ]
+        key = [sorted(parameters.items()), options["build_dir"]] + shared_key
+        generated_directory = os.path.join(current_directory, "generated")
+        if session is not None and session.key == key and all(
+            os.path.exists(file_path)
+            for file_path in session.verilog_files
+            if os.path.dirname(file_path) == generated_directory
+        ):
+            project_index = session.project_index
+            watcher = session.watcher
+            graph = session.graph
+            graph.scheduler.jobs = options["jobs"]
+            graph.scheduler.job_slots = job_slots
+            project_index.update([current_directory] + include_directories)
+            changed_files, added_files, removed_files = watcher.poll(project_index.files())
+            script_files, verilog_files = session.script_files, session.verilog_files
+            graph.changed_files = set()
+            if changed_files or added_files or removed_files:
+                script_files, verilog_files = _invalidate_changes(
+                    current_directory,
+                    include_directories,
+                    changed_files,
+                    added_files,
+                    removed_files,
+                    verilog_files,
+                    graph,
+                    project_index,
+                )
+        elif batch is not None and batch.key == shared_key:
+            # The targets of a manifest share the file index and the caches
+            project_index = batch.project_index
+            script_files = batch.script_files
+            verilog_files = OrderedFileSet(batch.verilog_files)
+            scheduler = GeneratorScheduler(options["jobs"], batch.cache, batch.run_times, job_slots)
+            graph = DependencyGraph(scheduler, batch.parse_cache)
+        else:
+            store = None
+            if options["store"]:
+                store = ArtifactStore(options["store"], options["store_size"])
+            # With --no-cache every script runs, and its files still replace the cached ones
+            cache = GeneratorCache(
+                f"{current_directory}/{CACHE_DIRECTORY}/generators",
+                options["cache_size"],
+                store,
+                lookups=options["cache"],
+            )
+            run_times = RunTimes(f"{current_directory}/{CACHE_DIRECTORY}/run_times.json")
+            scheduler = GeneratorScheduler(options["jobs"], cache, run_times, job_slots)
+            project_index = create_project_index(current_directory)
+            parse_cache = ParseCache(
+                f"{current_directory}/{CACHE_DIRECTORY}/parse_cache.json", SCANNER_VERSION
+            )
+            graph = DependencyGraph(scheduler, parse_cache)
+            script_files, verilog_files = find_existing_files(
+                current_directory, include_directories, project_index
+            )
+            if batch is not None:
+                if batch.parse_cache is not None:
+                    # Save what the previous targets cached before replacing it
+                    batch.parse_cache.save()
+                    batch.run_times.save()
+                batch.key = shared_key
+                batch.project_index = project_index
+                batch.script_files = script_files
+                batch.verilog_files = OrderedFileSet(verilog_files)
+                batch.cache = cache
+                batch.parse_cache = parse_cache
+                batch.run_times = run_times
+            if options["watch"] or session is not None:
+                # Taken before building, so files changed during the build are rebuilt
+                watcher = FileWatcher()
+                watcher.poll(project_index.files())
+            if session is not None:
+                session.key = key
+                session.project_index = project_index
+                session.graph = graph
+                session.watcher = watcher
+        # A plan does not create the build state, it only reads the digests recorded by previous builds
+        if options["plan"] is None or os.path.exists(os.path.join(current_directory, "build", STATE_FILE)):
+            state = open_state(current_directory)
+        graph.state = state
+
+        # A target built with the same arguments from unchanged files is not built again
+        stamped = (
+            state is not None
+            and options["cache"]
+            and options["plan"] is None
+            and not options["watch"]
+            and session is None
+        )
+        if stamped:
+            arguments = json.dumps(
+                [
+                    main_module,
+                    testbench,
+                    board_modules,
+                    sorted(parameters.items()),
+                    include_directories,
+                    options["ninja"],
+                    SCANNER_VERSION,
+                ]
+            )
+            started = time.time_ns()
+            inputs = _file_signatures(_build_inputs(project_index.files()))
+            if _build_is_current(state, build_directory, arguments, inputs):
+                vs_print(OK, f"The {main_module} project build directory is up to date.")
+                return
+        if options["plan"] is not None:
+            # The plan is resolved in a graph and an index of its own, which the files of the
+            # cache entries are added to, so the session keeps the state of the last build
+            plan = BuildPlan(graph.scheduler.run_times)
+            scheduler = GeneratorScheduler(options["jobs"], graph.scheduler.cache, graph.scheduler.run_times)
+            scheduler.plan = plan
+            plan_graph = DependencyGraph(scheduler, graph.parse_cache)
+            plan_graph.state = state
+            with span("plan", "stage"):
+                plan_build(
+                    current_directory,
+                    main_module,
+                    testbench,
+                    board_modules,
+                    parameters,
+                    OrderedFileSet(verilog_files),
+                    script_files,
+                    plan_graph,
+                    build_directory,
+                )
+            plan.report(options["jobs"])
+            if options["plan"]:
+                plan.write_json(options["plan"], options["jobs"])
+            if session is not None:
+                session.script_files = script_files
+                session.verilog_files = verilog_files
+            return
+        with span("build", "stage"):
+            build_project(
+                current_directory,
+                main_module,
+                testbench,
+                board_modules,
+                parameters,
+                verilog_files,
+                script_files,
+                graph,
+                project_index,
+                options["ninja"],
+                build_directory,
+            )
+        if state is not None:
+            record_build_state(current_directory, graph, verilog_files, build_directory)
+            if stamped:
+                outputs = _build_outputs(graph, build_directory, testbench, options["ninja"])
+                _stamp_build(state, build_directory, arguments, inputs, outputs, started)
+        if batch is None:
+            graph.parse_cache.save()
+            graph.scheduler.run_times.save()
+            store = graph.scheduler.cache.shared if graph.scheduler.cache is not None else None
+            if store is not None:
+                vs_print(INFO, store.report())
+        if session is not None:
+            session.script_files = script_files
+            session.verilog_files = verilog_files
+        vs_print(OK, f"Created {main_module} project build directory.")
+    finally:
+        if state is not None:
+            state.close()
+        # --watch keeps the jobserver for the following builds, until the process exits
+        if job_slots is not None and not options["watch"]:
+            job_slots.close()
+        if trace_path is not None:
+            stop_tracing(trace_path)
+    if options["watch"]:
+        watch_build(
+            current_directory,
+            main_module,
+            testbench,
+            board_modules,
+            parameters,
+            include_directories,
+            verilog_files,
+            graph,
+            project_index,
+            watcher,
+            options["ninja"],
+            build_directory,
+        )
+
+
+def main():
+    """
+    Main function to handle the vs_build script execution.
+    It processes command-line arguments, cleans the build directory if requested,
+    and builds the RTL, TestBench, and board modules as specified.
+    """
+    current_directory = os.getcwd()
+    if len(sys.argv) < 2 or sys.argv[1] == "--help":
+        help_build()        
+    elif "--server" in sys.argv:
+        serve_builds(
+            parse_socket_path(sys.argv[1:]), functools.partial(handle_build_request, {})
+        )
+    else:
+        run_build(current_directory)
 
 
 # Check if this script is called directly
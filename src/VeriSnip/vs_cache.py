@@ -0,0 +1,784 @@
+"""This module keeps the files generated by the scripts called by vs_build and the facts parsed from each source, so unchanged work is not done again."""
+
+import filecmp
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import time
+
+from .vs_colours import DEBUG, WARNING, vs_print
+from .vs_index import RACY_INTERVAL_NS
+from .vs_scan import LARGE_FILE_SIZE, mapped_file
+
+CACHE_DIRECTORY = ".vs_cache"
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+DEFAULT_STORE_SIZE = 10 * 1024 * 1024 * 1024
+
+# Options that change how vs_build runs but not what the scripts generate
+_RUNTIME_OPTIONS = r"^(--quiet|--debug|--log=.*|--plan(=.*)?|--manifest=.*|--build_dir=.*|--watch|--ninja|--profile(=.*)?|--server|--socket=.*|--no-cache|--cache_size=.*|--store=.*|--store_size=.*|--jobs=.*|-j\d*)$"
+
+
+def hash_file(file_path):
+    """
+    Computes the SHA-256 digest of a file.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: The hexadecimal digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def script_inputs(script_path):
+    """
+    Lists the files a generator script may read besides itself: every other file of its directory.
+
+    Scripts usually keep their data, templates and helper modules next to them. Hidden files and
+    sub-directories, like __pycache__, are left out.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        list: Paths of the files, sorted.
+    """
+    directory = os.path.dirname(script_path) or "."
+    script_name = os.path.basename(script_path)
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return []
+    return sorted(
+        entry.path
+        for entry in entries
+        if entry.name != script_name and not entry.name.startswith(".") and entry.is_file()
+    )
+
+
+def script_interpreter(script_path):
+    """
+    Finds the interpreter that runs a script, based on its shebang line.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        str: The shebang line followed by the resolved path of the interpreter, or an empty string.
+    """
+    shebang = _read_shebang(script_path)
+    if shebang is None:
+        return ""
+    first_line, program = shebang
+    if program is None:
+        return first_line
+    resolved = shutil.which(program)
+    if resolved:
+        resolved = os.path.realpath(resolved)
+    return f"{first_line} {resolved}"
+
+
+def interpreter_path(script_path):
+    """
+    Finds the program that runs a script, as its shebang line names it.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        str or None: The absolute path of the interpreter, looked up in the PATH if the shebang
+            line runs it through `env`, or None if it cannot be found.
+    """
+    shebang = _read_shebang(script_path)
+    if shebang is None or shebang[1] is None:
+        return None
+    program = shutil.which(shebang[1])
+    return os.path.abspath(program) if program else None
+
+
+def _read_shebang(script_path):
+    """
+    Reads the shebang line of a script.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        tuple or None: The shebang line and the program it runs, None if it names no program, or
+            None if the script has no shebang line.
+    """
+    try:
+        with open(script_path, "rb") as file:
+            first_line = file.readline().decode(errors="replace").strip()
+    except OSError:
+        return None
+    if not first_line.startswith("#!"):
+        return None
+    words = first_line[2:].split()
+    if not words:
+        return first_line, None
+    program = words[1] if os.path.basename(words[0]) == "env" and len(words) > 1 else words[0]
+    return first_line, program
+
+
+class GeneratorCache:
+    """
+    Content-addressed cache of the Verilog files generated by each script call.
+
+    A call is identified by the hash of the script, its interpreter, the content of its inputs
+    (see `script_inputs`) and its argument vector (suffix, comment argument, callee file and
+    vs_build arguments), and for a plugin the parameters it receives. Each entry is a directory
+    named after that key, holding the generated files and a manifest. Entries are evicted,
+    least recently used first, when the cache grows over its size cap.
+
+    Attributes:
+        shared (ArtifactStore or None): Store shared with other vs_build processes, looked up when a
+            job is not in this cache and where every stored job is published too.
+        lookups (bool): Whether jobs are restored from the cache. Without lookups, like with
+            --no-cache, every script runs and its files replace those cached for the same key.
+    """
+
+    def __init__(self, cache_directory, max_size=DEFAULT_CACHE_SIZE, shared=None, lookups=True):
+        self.cache_directory = cache_directory
+        self.max_size = max_size
+        self.shared = shared
+        self.lookups = lookups
+        self._script_hashes = {}
+        # Digest of the inputs of each script, with the signatures of the files it was computed from
+        self._input_digests = {}
+        self._entries = None
+
+    def key(self, job):
+        """
+        Computes the cache key of a generator job.
+
+        Args:
+            job (GeneratorJob): The job.
+
+        Returns:
+            str: The hexadecimal key.
+        """
+        script_path = job.script_path
+        if script_path not in self._script_hashes:
+            self._script_hashes[script_path] = (
+                hash_file(script_path),
+                script_interpreter(script_path),
+            )
+        script_hash, interpreter = self._script_hashes[script_path]
+        inputs = self._inputs_digest(script_path)
+        arguments = [
+            argument
+            for index, argument in enumerate(job.arguments[1:], 1)
+            if not re.match(_RUNTIME_OPTIONS, argument)
+            and job.arguments[index - 1] != "-j"
+        ]
+        key = [script_hash, interpreter, inputs, arguments]
+        if job.parameters is not None:
+            # Plugins also receive the parameters of the requesting file
+            key.append(sorted(job.parameters.items()))
+        digest = hashlib.sha256()
+        digest.update(json.dumps(key).encode())
+        return digest.hexdigest()
+
+    def _inputs_digest(self, script_path):
+        """
+        Computes the digest of the inputs of a script.
+
+        The files are only hashed again when their size or modification time changed, so the
+        inputs of a long-lived cache, like the one of the vs_build server, follow their edits.
+
+        Args:
+            script_path (str): Path to the script.
+
+        Returns:
+            str: The hexadecimal digest of the names and contents of its inputs.
+        """
+        signatures = []
+        for file_path in script_inputs(script_path):
+            try:
+                status = os.stat(file_path)
+            except OSError:
+                continue
+            signatures.append((file_path, status.st_size, status.st_mtime_ns))
+        known = self._input_digests.get(script_path)
+        if known is not None and known[0] == signatures:
+            return known[1]
+        digest = hashlib.sha256()
+        for file_path, _, _ in signatures:
+            digest.update(os.path.basename(file_path).encode() + b"\0")
+            try:
+                digest.update(hash_file(file_path).encode())
+            except OSError:
+                continue
+        self._input_digests[script_path] = (signatures, digest.hexdigest())
+        return digest.hexdigest()
+
+    def forget_script(self, script_path):
+        """
+        Forgets the hash of a script, so it is computed again for its next job.
+
+        Args:
+            script_path (str): Path to the script.
+        """
+        self._script_hashes.pop(script_path, None)
+        if self.shared is not None:
+            self.shared.forget_script(script_path)
+
+    def restore(self, job, destination_directory):
+        """
+        Copies the files cached for a job into the destination directory.
+
+        Args:
+            job (GeneratorJob): The job.
+            destination_directory (str): Directory where the files are restored.
+
+        Returns:
+            list or None: Paths of the restored files, or None if the job is not cached.
+        """
+        if not self.lookups:
+            return None
+        entry_directory = os.path.join(self.cache_directory, self.key(job))
+        manifest = _read_manifest(entry_directory)
+        if manifest is None:
+            if self.shared is None:
+                return None
+            restored_files = self.shared.restore(job, destination_directory)
+            if restored_files is not None:
+                self._store_entry(job, restored_files)
+            return restored_files
+        restored_files = [
+            _restore_file(entry_directory, filename, destination_directory)
+            for filename in manifest["files"]
+        ]
+        os.utime(entry_directory)
+        vs_print(DEBUG, "Restored %s from the cache.", ", ".join(manifest["files"]))
+        return restored_files
+
+    def lookup(self, job):
+        """
+        Finds the files cached for a job in this cache, without restoring them.
+
+        Args:
+            job (GeneratorJob): The job.
+
+        Returns:
+            list or None: Paths of the cached files inside the cache entry, or None if the job is not cached.
+        """
+        if not self.lookups:
+            return None
+        entry_directory = os.path.join(self.cache_directory, self.key(job))
+        manifest = _read_manifest(entry_directory)
+        if manifest is None:
+            return None
+        return [os.path.join(entry_directory, filename) for filename in manifest["files"]]
+
+    def store(self, job, generated_files):
+        """
+        Stores the files generated by a job, and publishes them to the shared store.
+
+        Args:
+            job (GeneratorJob): The job.
+            generated_files (list): Paths of the files the job generated.
+        """
+        self._store_entry(job, generated_files)
+        if self.shared is not None:
+            self.shared.store(job, generated_files)
+
+    def _store_entry(self, job, generated_files):
+        """
+        Stores the files generated by a job in this cache only.
+
+        Args:
+            job (GeneratorJob): The job.
+            generated_files (list): Paths of the files the job generated.
+        """
+        key = self.key(job)
+        entry_directory = os.path.join(self.cache_directory, key)
+        temporary_directory = f"{entry_directory}.tmp{os.getpid()}"
+        try:
+            os.makedirs(temporary_directory, exist_ok=True)
+            size = 0
+            filenames = []
+            for file_path in generated_files:
+                filename = os.path.basename(file_path)
+                shutil.copyfile(file_path, os.path.join(temporary_directory, filename))
+                size += os.path.getsize(file_path)
+                filenames.append(filename)
+            with open(os.path.join(temporary_directory, "manifest.json"), "w") as file:
+                json.dump({"script": job.script_path, "files": filenames, "size": size}, file)
+            if os.path.isdir(entry_directory):
+                shutil.rmtree(entry_directory)
+            os.rename(temporary_directory, entry_directory)
+        except OSError as e:
+            vs_print(WARNING, f"Could not cache the files generated by {job.script_path}. {e}")
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+            return
+        self._load_entries()[key] = size
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits within its size cap.
+        """
+        entries = self._load_entries()
+        total_size = sum(entries.values())
+        if total_size <= self.max_size:
+            return
+        last_used = []
+        for key in entries:
+            try:
+                last_used.append((os.path.getmtime(os.path.join(self.cache_directory, key)), key))
+            except OSError:
+                last_used.append((0, key))
+        for _, key in sorted(last_used):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(os.path.join(self.cache_directory, key), ignore_errors=True)
+            total_size -= entries.pop(key)
+            vs_print(DEBUG, "Evicted cache entry %s.", key)
+
+    def _load_entries(self):
+        """
+        Lists the entries in the cache directory with their sizes, once per cache instance.
+
+        Returns:
+            dict: Size in bytes of each entry, by key.
+        """
+        if self._entries is None:
+            self._entries = {}
+            if os.path.isdir(self.cache_directory):
+                for key in os.listdir(self.cache_directory):
+                    manifest = _read_manifest(os.path.join(self.cache_directory, key))
+                    if manifest is not None:
+                        self._entries[key] = manifest["size"]
+        return self._entries
+
+
+class ArtifactStore(GeneratorCache):
+    """
+    Generator cache shared by many vs_build processes, for example the CI jobs building one commit
+    from a directory on a network file system.
+
+    Entries have the same keys as `GeneratorCache`, which do not depend on where the project is,
+    and the same layout. Several processes, possibly on several machines, read, publish and evict
+    entries at the same time without any lock:
+    - an entry is written to a temporary directory and published with one rename, so readers only
+      ever see complete entries, and the first process to publish an entry wins;
+    - restored files are copied to a temporary file renamed over the destination, and an entry
+      evicted while it is being read is a miss;
+    - an entry is evicted by renaming it away before removing it.
+
+    Attributes:
+        hits (int): Jobs restored from the store by this process.
+        misses (int): Jobs looked up in the store and not found.
+        published (int): Jobs published to the store by this process.
+    """
+
+    # Leftovers of processes that stopped while publishing or evicting are removed after this many seconds
+    _STALE_AGE = 3600
+    # Names of those leftovers: a key followed by the suffix `store` and `evict` append to it
+    _LEFTOVER = re.compile(r"[0-9a-f]{64}\.(?:tmp|evicted).+")
+
+    def __init__(self, store_directory, max_size=DEFAULT_STORE_SIZE):
+        super().__init__(store_directory, max_size)
+        self.hits = 0
+        self.misses = 0
+        self.published = 0
+        self._suffix = f"{platform.node()}-{os.getpid()}"
+
+    def restore(self, job, destination_directory):
+        """
+        Copies the files stored for a job into the destination directory.
+
+        Args:
+            job (GeneratorJob): The job.
+            destination_directory (str): Directory where the files are restored.
+
+        Returns:
+            list or None: Paths of the restored files, or None if the job is not in the store.
+        """
+        entry_directory = os.path.join(self.cache_directory, self.key(job))
+        manifest = _read_manifest(entry_directory)
+        restored_files = None
+        if manifest is not None:
+            try:
+                restored_files = [
+                    _restore_file(entry_directory, filename, destination_directory, self._suffix)
+                    for filename in manifest["files"]
+                ]
+            except OSError:
+                vs_print(DEBUG, "The store entry of %s was evicted while restoring it.", job.file_name)
+        if restored_files is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(entry_directory)
+        except OSError:
+            pass
+        vs_print(DEBUG, "Restored %s from the artifact store.", ", ".join(manifest["files"]))
+        return restored_files
+
+    def store(self, job, generated_files):
+        """
+        Publishes the files generated by a job, unless another process already did.
+
+        Args:
+            job (GeneratorJob): The job.
+            generated_files (list): Paths of the files the job generated.
+        """
+        key = self.key(job)
+        entry_directory = os.path.join(self.cache_directory, key)
+        if _read_manifest(entry_directory) is not None:
+            return
+        temporary_directory = f"{entry_directory}.tmp{self._suffix}"
+        try:
+            os.makedirs(temporary_directory, exist_ok=True)
+            size = 0
+            filenames = []
+            for file_path in generated_files:
+                filename = os.path.basename(file_path)
+                shutil.copyfile(file_path, os.path.join(temporary_directory, filename))
+                size += os.path.getsize(file_path)
+                filenames.append(filename)
+            with open(os.path.join(temporary_directory, "manifest.json"), "w") as file:
+                json.dump({"script": job.script_path, "files": filenames, "size": size}, file)
+            os.rename(temporary_directory, entry_directory)
+        except OSError:
+            # Most likely another process published the same entry first
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+            return
+        self.published += 1
+        entries = self._load_entries()
+        entries[key] = size
+        if sum(entries.values()) > self.max_size:
+            # Other processes published entries too, count them again before evicting
+            self._entries = None
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the store fits within its size cap.
+        """
+        entries = self._load_entries()
+        total_size = sum(entries.values())
+        if total_size <= self.max_size:
+            return
+        last_used = []
+        for key in entries:
+            try:
+                last_used.append((os.path.getmtime(os.path.join(self.cache_directory, key)), key))
+            except OSError:
+                last_used.append((0, key))
+        for _, key in sorted(last_used):
+            if total_size <= self.max_size:
+                break
+            total_size -= entries.pop(key)
+            evicted_directory = os.path.join(self.cache_directory, f"{key}.evicted{self._suffix}")
+            try:
+                os.rename(os.path.join(self.cache_directory, key), evicted_directory)
+            except OSError:
+                continue
+            shutil.rmtree(evicted_directory, ignore_errors=True)
+            vs_print(DEBUG, "Evicted store entry %s.", key)
+
+    def report(self):
+        """
+        Describes how the store was used since the previous report, and resets the counters.
+
+        Returns:
+            str: The numbers of hits, misses and published entries.
+        """
+        lookups = self.hits + self.misses
+        hit_rate = f", {100 * self.hits / lookups:.0f}% hit rate" if lookups else ""
+        report = (
+            f"Artifact store {self.cache_directory}: {self.hits} hits, {self.misses} misses"
+            f"{hit_rate}, {self.published} entries published."
+        )
+        self.hits = self.misses = self.published = 0
+        return report
+
+    def _load_entries(self):
+        """
+        Lists the complete entries in the store with their sizes, removing stale leftovers.
+
+        The store directory may be shared with other files, only the leftovers of `store` and
+        `evict` are ever removed.
+
+        Returns:
+            dict: Size in bytes of each entry, by key.
+        """
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        try:
+            names = os.listdir(self.cache_directory)
+        except OSError:
+            return self._entries
+        now = time.time()
+        for name in names:
+            entry_directory = os.path.join(self.cache_directory, name)
+            if re.fullmatch(r"[0-9a-f]{64}", name):
+                manifest = _read_manifest(entry_directory)
+                if manifest is not None:
+                    self._entries[name] = manifest["size"]
+                continue
+            if not self._LEFTOVER.fullmatch(name):
+                continue
+            try:
+                stale = now - os.path.getmtime(entry_directory) > self._STALE_AGE
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(entry_directory, ignore_errors=True)
+        return self._entries
+
+
+def _restore_file(entry_directory, filename, destination_directory, suffix=None):
+    """
+    Copies a file of a cache entry to the destination directory.
+
+    A file identical to the one already in the destination is left alone, keeping the modification
+    time Make and Ninja compare. Otherwise the file is copied next to the destination and renamed
+    over it, so the destination is never seen partially written.
+
+    Args:
+        entry_directory (str): Directory of the cache entry.
+        filename (str): Name of the file.
+        destination_directory (str): Directory where the file is restored.
+        suffix (str, optional): Makes the temporary copy unique among processes sharing the destination.
+
+    Returns:
+        str: Path of the restored file.
+    """
+    file_src_path = os.path.join(entry_directory, filename)
+    file_dst_path = os.path.join(destination_directory, filename)
+    if os.path.isfile(file_dst_path) and filecmp.cmp(file_src_path, file_dst_path, shallow=False):
+        return file_dst_path
+    temporary_path = f"{file_dst_path}.tmp{suffix or os.getpid()}"
+    try:
+        shutil.copyfile(file_src_path, temporary_path)
+        os.replace(temporary_path, file_dst_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return file_dst_path
+
+
+def _read_manifest(entry_directory):
+    """
+    Reads the manifest of a cache entry.
+
+    Args:
+        entry_directory (str): Directory of the cache entry.
+
+    Returns:
+        dict or None: The manifest, or None if the entry does not exist or is incomplete.
+    """
+    try:
+        with open(os.path.join(entry_directory, "manifest.json"), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+class RunTimes:
+    """
+    Persistent record of how long the calls to each generator script took, to estimate the cost of
+    a build before running it.
+
+    Each script keeps a moving average of its last calls, so it follows a script getting slower or
+    faster without being thrown off by a single unusual call.
+    """
+
+    # Weight of the last call in the average, once a script has been called this many times
+    _HISTORY = 8
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._dirty = False
+
+    def record(self, script_path, seconds):
+        """
+        Records the duration of a call to a script.
+
+        Args:
+            script_path (str): Path to the script.
+            seconds (float): Duration of the call.
+        """
+        if self._entries is None:
+            self._entries = self._load()
+        entry = self._entries.setdefault(script_path, {"calls": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        weight = 1 / min(entry["calls"], self._HISTORY)
+        entry["seconds"] += (seconds - entry["seconds"]) * weight
+        self._dirty = True
+
+    def estimate(self, script_path):
+        """
+        Estimates the duration of a call to a script.
+
+        Args:
+            script_path (str): Path to the script.
+
+        Returns:
+            float or None: The average duration of its recent calls, in seconds, or None if it never ran.
+        """
+        if self._entries is None:
+            self._entries = self._load()
+        entry = self._entries.get(script_path)
+        return entry["seconds"] if entry is not None else None
+
+    def save(self):
+        """
+        Saves the record if it changed.
+        """
+        if not self._dirty:
+            return
+        temporary_path = f"{self.path}.tmp{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary_path, "w") as file:
+                json.dump(self._entries, file)
+            os.replace(temporary_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            vs_print(WARNING, f"Could not save the script run times. {e}")
+
+    def _load(self):
+        """
+        Loads the record saved by a previous run.
+
+        Returns:
+            dict: The calls and average duration of each script, by path.
+        """
+        try:
+            with open(self.path, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+
+class ParseCache:
+    """
+    Persistent cache of the facts extracted from each Verilog file by `analyse_file`.
+
+    Entries are keyed by file path and validated by size and modification time. The whole cache
+    is discarded when the version of the facts, given by the scanner, changes. When those
+    changed, the file is read and its content hash compared, so touching a file does not make it
+    be parsed again. Files modified too recently to trust their timestamp are always hashed.
+    """
+
+    def __init__(self, cache_path, version=""):
+        self.cache_path = cache_path
+        self.version = version
+        self._entries = None
+        self._dirty = False
+
+    def facts(self, file_path, scan):
+        """
+        Returns the facts of a file, scanning it only if it changed since it was cached.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+            scan (callable): Function extracting the facts from the file content, given as text, or as
+                a memory map of the file if it is LARGE_FILE_SIZE or more.
+
+        Returns:
+            dict: The facts returned by `scan` for the current content of the file.
+        """
+        if self._entries is None:
+            self._entries = self._load()
+        stat = os.stat(file_path)
+        entry = self._entries.get(file_path)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        ):
+            return entry["facts"]
+
+        # Large files are hashed and scanned through a memory map, never held in memory whole
+        large = stat.st_size >= LARGE_FILE_SIZE
+        if large:
+            digest = hash_file(file_path)
+        else:
+            with open(file_path, "rb") as file:
+                data = file.read()
+            digest = hashlib.sha256(data).hexdigest()
+        if entry is None or entry["sha256"] != digest:
+            if large:
+                with mapped_file(file_path) as content:
+                    entry = {"sha256": digest, "facts": scan(content)}
+            else:
+                # Same decoding and newline translation as `scan_verilog_file`
+                content = data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+                entry = {"sha256": digest, "facts": scan(content)}
+        elif entry["mtime"] >= 0:
+            vs_print(DEBUG, "%s was touched but its content is unchanged.", os.path.basename(file_path))
+        entry["size"] = stat.st_size
+        entry["mtime"] = stat.st_mtime_ns
+        if time.time_ns() - stat.st_mtime_ns < RACY_INTERVAL_NS:
+            entry["mtime"] = -1
+        self._entries[file_path] = entry
+        self._dirty = True
+        return entry["facts"]
+
+    def cached_facts(self, file_path):
+        """
+        Returns the facts cached for a file, without checking whether it changed.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+
+        Returns:
+            dict or None: The cached facts, or None if the file is not cached.
+        """
+        if self._entries is None:
+            self._entries = self._load()
+        entry = self._entries.get(file_path)
+        return entry["facts"] if entry is not None else None
+
+    def save(self):
+        """
+        Saves the cache if it changed, dropping the entries of files that no longer exist.
+        """
+        if not self._dirty:
+            return
+        for file_path in [path for path in self._entries if not os.path.exists(path)]:
+            del self._entries[file_path]
+        temporary_path = f"{self.cache_path}.tmp{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(temporary_path, "w") as file:
+                json.dump({"version": self.version, "files": self._entries}, file)
+            os.replace(temporary_path, self.cache_path)
+            self._dirty = False
+        except OSError as e:
+            vs_print(WARNING, f"Could not save the parse cache. {e}")
+
+    def _load(self):
+        """
+        Loads the cache saved by a previous run.
+
+        Returns:
+            dict: The cache entries, by file path, or no entries if they were parsed by another version.
+        """
+        try:
+            with open(self.cache_path, "r") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get("version") != self.version:
+            return {}
+        return cache["files"]
@@ -1,7 +1,12 @@
 """This module provides color to the messages printed while using the VT-Tool."""
 
-import sys
+import atexit
+import json
 import os
+import re
+import sys
+import threading
+import time
 
 # Based on ANSI escape code
 OK_BLUE = "\033[94m"  # Blue
@@ -14,18 +19,133 @@ NORMAL = "\033[0m"  # White
 BOLD = "\033[1m"
 UNDERLINE = "\033[4m"
 
-def vs_print(modifier, string):
+# Rank and JSON name of each message type, messages ranked below the level are not printed
+_LEVELS = {
+    DEBUG: (0, "debug"),
+    INFO: (1, "info"),
+    OK: (2, "done"),
+    WARNING: (2, "warning"),
+    ERROR: (3, "error"),
+}
+
+# Buffered messages are written once they take this many characters
+_BUFFER_SIZE = 64 * 1024
+
+
+class _Logger:
+    """
+    The state of the messages printed by `vs_print`.
+
+    Attributes:
+        level (int): Rank of the least important message type printed.
+        json (bool): Whether messages are printed as JSON lines instead of coloured text.
+        script_name (str): Name of the running tool, printed with each message.
+        configured (bool): Whether `configure_logging` was called.
+        buffer (list): The lines not written yet.
+        buffered (int): Number of characters in the buffer.
+    """
+
+    def __init__(self):
+        self.level = 1
+        self.json = False
+        self.script_name = ""
+        self.configured = False
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.buffered = 0
+
+
+_logger = _Logger()
+
+
+def configure_logging(arguments=None):
+    """
+    Fixes which messages are printed and how, from the command-line arguments.
+
+    "--debug" prints DEBUG messages, "--quiet" hides INFO messages, and "--log=json" prints every
+    message as a JSON object on its own line, for tools reading the output. The first `vs_print`
+    configures the messages from sys.argv if this function was not called before.
+
+    Args:
+        arguments (list, optional): The command-line arguments, sys.argv by default.
+    """
+    if arguments is None:
+        arguments = sys.argv
+    flush_log()
+    with _logger.lock:
+        if "--debug" in arguments:
+            _logger.level = 0
+        elif "--quiet" in arguments:
+            _logger.level = 2
+        else:
+            _logger.level = 1
+        _logger.json = any(re.match(r"^--log=\"?json\"?$", argument) for argument in arguments)
+        _logger.script_name = os.path.basename(arguments[0]) if arguments else ""
+        _logger.configured = True
+
+
+def log_enabled(modifier):
+    """
+    Checks whether messages of a type are printed, to skip preparing messages that are not.
+
+    Args:
+        modifier: The text modifier of the messages.
+
+    Returns:
+        bool: True if `vs_print` prints messages of this type.
+    """
+    if not _logger.configured:
+        configure_logging()
+    return _LEVELS.get(modifier, (2,))[0] >= _logger.level
+
+
+def vs_print(modifier, string, *args):
     """This function prints the given string with the given text modifier.
+
+    DEBUG and INFO messages are buffered and written together, the other messages are written at
+    once with everything buffered before them.
+
     Args:
         modifier: The text modifier.
-        string: The string to print."""
-    script_name = os.path.basename(sys.argv[0])
-    # Check conditions for printing based on arguments and modifier
-    if modifier == DEBUG:
-        if "--debug" in sys.argv:
-            print(f"{modifier} ({script_name}): {string}{NORMAL}")
-    elif modifier == INFO:
-        if "--quiet" not in sys.argv:
-            print(f"{modifier} ({script_name}): {string}{NORMAL}")
+        string: The string to print. If arguments follow, the message is `string % args`,
+            only formatted if the message is printed.
+        args: The arguments of the message."""
+    rank, level_name = _LEVELS.get(modifier, (2, "message"))
+    if not _logger.configured:
+        configure_logging()
+    if rank < _logger.level:
+        return
+    if args:
+        string = string % args
+    if _logger.json:
+        line = json.dumps(
+            {"time": time.time(), "level": level_name, "tool": _logger.script_name, "message": string}
+        )
     else:
-        print(f"{modifier} ({script_name}): {string}{NORMAL}")
+        line = f"{modifier} ({_logger.script_name}): {string}{NORMAL}"
+    with _logger.lock:
+        _logger.buffer.append(line)
+        _logger.buffered += len(line)
+        if rank < 2 and _logger.buffered < _BUFFER_SIZE:
+            return
+    flush_log()
+
+
+def flush_log():
+    """
+    Writes the buffered messages to the standard output.
+
+    Called before anything else writes to the standard output, so the messages keep their order
+    with the output of the generator scripts.
+    """
+    with _logger.lock:
+        if not _logger.buffer:
+            return
+        text = "\n".join(_logger.buffer) + "\n"
+        _logger.buffer = []
+        _logger.buffered = 0
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+atexit.register(flush_log)
@@ -0,0 +1,120 @@
+"""This module writes the dependencies vs_build found as Makefile depfiles and a Ninja build file, for outer build flows to know when vs_build must run again."""
+
+import os
+
+from .vs_colours import WARNING, vs_print
+
+DEPS_DIRECTORY = "deps"
+NINJA_FILE = "build.ninja"
+
+
+def write_depfile(depfile_path, target, prerequisites):
+    """
+    Writes a Makefile rule listing the files an output depends on, like `gcc -MD` does.
+
+    Args:
+        depfile_path (str): Path of the depfile.
+        target (str): The output, relative to the project directory.
+        prerequisites (list): The files it depends on, relative to the project directory.
+
+    Returns:
+        bool: True if the depfile was written, False if it was already up to date.
+    """
+    lines = [f"{_escape_make(target)}:"]
+    lines.extend(f" \\\n  {_escape_make(prerequisite)}" for prerequisite in prerequisites)
+    return _write_if_changed(depfile_path, "".join(lines) + "\n")
+
+
+def write_ninja(ninja_path, command, outputs, inputs):
+    """
+    Writes a Ninja build file running vs_build again when one of its inputs changes.
+
+    Everything vs_build produces is an output of a single edge, restat so that the outputs vs_build
+    leaves unchanged do not make the edges depending on them run. The build file is an output of
+    the same edge, so Ninja regenerates it before building when the project structure changes.
+
+    Args:
+        ninja_path (str): Path of the build file.
+        command (str): The vs_build command line, run from the project directory.
+        outputs (list): The files vs_build writes, relative to the project directory.
+        inputs (list): The files they depend on, relative to the project directory.
+
+    Returns:
+        bool: True if the build file was written, False if it was already up to date.
+    """
+    build_file = os.path.relpath(ninja_path)
+    statement = "build " + " $\n    ".join(_escape_ninja(path) for path in [build_file] + outputs)
+    statement += ": vs_build"
+    if inputs:
+        statement += " | $\n    " + " $\n    ".join(_escape_ninja(path) for path in inputs)
+    lines = [
+        "# Written by vs_build, run from the project directory with:",
+        f"#   ninja -f {build_file}",
+        "",
+        "rule vs_build",
+        f"  command = {command}",
+        "  description = vs_build",
+        "  generator = 1",
+        "  restat = 1",
+        "",
+        statement,
+        "",
+        f"default {_escape_ninja(build_file)}",
+        "",
+    ]
+    return _write_if_changed(ninja_path, "\n".join(lines))
+
+
+def _escape_make(path):
+    """
+    Escapes a path for a Makefile rule.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        str: The escaped path.
+    """
+    return path.replace("\\", "\\\\").replace(" ", "\\ ").replace("#", "\\#").replace("$", "$$")
+
+
+def _escape_ninja(path):
+    """
+    Escapes a path for a Ninja build statement.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        str: The escaped path.
+    """
+    return path.replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+
+def _write_if_changed(file_path, content):
+    """
+    Writes a file, unless it already holds the given content.
+
+    Leaving unchanged files alone keeps their modification time, which Make and Ninja compare.
+
+    Args:
+        file_path (str): Path of the file.
+        content (str): The content to write.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    try:
+        with open(file_path, "r") as file:
+            if file.read() == content:
+                return False
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as file:
+            file.write(content)
+    except OSError as e:
+        vs_print(WARNING, f"Could not write {file_path}. {e}")
+        return False
+    return True
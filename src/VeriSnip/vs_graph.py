@@ -0,0 +1,237 @@
+"""This module keeps the dependency graph vs_build resolves once per invocation and shares between the RTL, TestBench and board builds."""
+
+import os
+
+from .vs_scheduler import GeneratorScheduler
+
+
+class ParameterScope:
+    """
+    The parameters a file is instantiated or included with.
+
+    A module sees the parameters of the file instantiating it, replaced by the defaults it defines,
+    then by the values the instantiation gives. A .vs file sees the parameters of the file
+    including it. The parameters given on the command line replace every other value.
+
+    Attributes:
+        inherited (dict): The parameters of the file instantiating or including this one, by name.
+        overrides (dict): The parameter values given by the instantiation, by name, including
+            the command-line parameters.
+        key (tuple): Identifies the scope, equal scopes have equal keys.
+    """
+
+    def __init__(self, inherited, overrides):
+        self.inherited = inherited
+        self.overrides = overrides
+        self.key = (tuple(sorted(inherited.items())), tuple(sorted(overrides.items())))
+
+    def parameters(self, definitions):
+        """
+        Returns the parameters of a file in this scope.
+
+        Args:
+            definitions (list): [name, value] pairs of the parameter definitions of the file.
+
+        Returns:
+            dict: The value of each parameter, by name.
+        """
+        parameters = dict(self.inherited)
+        parameters.update(definitions)
+        parameters.update(self.overrides)
+        return parameters
+
+
+class DependencyGraph:
+    """
+    Resolved dependencies of every Verilog file analysed during one vs_build invocation.
+
+    Every build target starts from its own top module, but most of their hierarchies are shared
+    (a board instantiates the RTL top, the TestBench instantiates it too). A file analysed for one
+    target keeps the paths of its dependencies here, so the other targets reuse them instead of
+    analysing the file again. The graph also holds the state shared by every target: the scheduler
+    running the generator scripts, the parse cache and the expanded .vs files.
+
+    The graph also records the parameter scopes each file is used in, by the name files refer to it
+    with, so a file used with different parameter values is analysed once for each of them.
+
+    Attributes:
+        scheduler (GeneratorScheduler): Scheduler running the generator scripts.
+        parse_cache (ParseCache or None): Cache of the facts found in each file.
+        expanded_snippets (dict): Expanded content of the .vs files, by path.
+        changed_files (set or None): Source files whose outputs must be written again, or None to write
+            every output. Set by `vs_build --watch` to the files affected by the last changes.
+        outputs (dict): Source file of each output written under the build directory, by output path.
+        state (BuildState or None): State of the previous builds, with the digests of their outputs.
+    """
+
+    def __init__(self, scheduler=None, parse_cache=None):
+        self.scheduler = scheduler if scheduler is not None else GeneratorScheduler()
+        self.parse_cache = parse_cache
+        self.expanded_snippets = {}
+        self.changed_files = None
+        self.outputs = {}
+        self.state = None
+        self._dependencies = {}
+        self._unresolved = {}
+        # Scopes by the name files refer to them with, and the keys of the scopes analysed by path
+        self._scopes = {}
+        self._analysed_scopes = {}
+        self._new_scope_names = set()
+
+    def dependencies(self, file_path):
+        """
+        Returns the resolved dependencies of a file.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+
+        Returns:
+            list or None: Paths of the files it depends on, in the order they are used,
+                or None if the file was not analysed yet.
+        """
+        return self._dependencies.get(file_path)
+
+    def analysed(self, file_path, items):
+        """
+        Records that a file was analysed, before the files it depends on were all found or generated.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+            items (list): The dependencies found in the file, as returned by `scan_verilog`.
+        """
+        self._unresolved[file_path] = items
+
+    def take_unresolved(self):
+        """
+        Removes and returns the files analysed since the last call.
+
+        Returns:
+            list: (file path, dependencies found in the file) pairs, in the order they were analysed.
+        """
+        unresolved = list(self._unresolved.items())
+        self._unresolved = {}
+        return unresolved
+
+    def set_dependencies(self, file_path, dependency_paths):
+        """
+        Records the resolved dependencies of a file.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+            dependency_paths (list): Paths of the files it depends on.
+        """
+        self._dependencies[file_path] = dependency_paths
+
+    def forget(self, file_path):
+        """
+        Forgets the dependencies of a file, so it is analysed again.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+        """
+        self._dependencies.pop(file_path, None)
+        self._unresolved.pop(file_path, None)
+        self._analysed_scopes.pop(file_path, None)
+
+    def reset(self):
+        """
+        Forgets the dependencies and parameter scopes of every file and the expanded .vs files.
+        """
+        self._dependencies = {}
+        self._unresolved = {}
+        self._scopes = {}
+        self._analysed_scopes = {}
+        self._new_scope_names = set()
+        self.expanded_snippets = {}
+
+    def add_scope(self, name, scope):
+        """
+        Records a scope a file is used in.
+
+        Args:
+            name (str): The name the file is referred to with, a module name or an included file name.
+            scope (ParameterScope): The scope.
+        """
+        scopes = self._scopes.setdefault(name, {})
+        if scope.key not in scopes:
+            scopes[scope.key] = scope
+            self._new_scope_names.add(name)
+
+    def take_new_scope_names(self):
+        """
+        Removes and returns the names of the files used in new scopes since the last call.
+
+        Returns:
+            set: The names the files are referred to with.
+        """
+        names = self._new_scope_names
+        self._new_scope_names = set()
+        return names
+
+    def take_scopes(self, file_path, default):
+        """
+        Returns the scopes a file is used in that it was not analysed in yet, and marks them as analysed.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+            default (ParameterScope): The scope of a file used in no recorded scope.
+
+        Returns:
+            list: The scopes (ParameterScope), in the order they were recorded.
+        """
+        file_name = os.path.basename(file_path)
+        stem, extension = os.path.splitext(file_name)
+        scopes = dict(self._scopes.get(file_name, {}))
+        if extension in (".v", ".sv"):
+            scopes.update(self._scopes.get(stem, {}))
+        analysed = self._analysed_scopes.setdefault(file_path, set())
+        if not scopes and not analysed:
+            scopes = {default.key: default}
+        new_scopes = [scope for key, scope in scopes.items() if key not in analysed]
+        analysed.update(scopes)
+        return new_scopes
+
+    def includers(self, file_paths):
+        """
+        Finds the files whose substituted content includes one of the given files.
+
+        Args:
+            file_paths (iterable): Paths of the files, only the .vs files among them are included by others.
+
+        Returns:
+            set: Paths of the files including them, directly or through other .vs files.
+        """
+        included_by = {}
+        for file_path, dependency_paths in self._dependencies.items():
+            for dependency_path in dependency_paths:
+                if dependency_path.endswith(".vs"):
+                    included_by.setdefault(dependency_path, []).append(file_path)
+        found = set()
+        stack = [file_path for file_path in file_paths if file_path.endswith(".vs")]
+        while stack:
+            for file_path in included_by.get(stack.pop(), []):
+                if file_path not in found:
+                    found.add(file_path)
+                    if file_path.endswith(".vs"):
+                        stack.append(file_path)
+        return found
+
+    def included_files(self, file_path):
+        """
+        Finds the .vs files substituted into a file.
+
+        Args:
+            file_path (str): Path to the Verilog file.
+
+        Returns:
+            list: Paths of the .vs files it includes, directly or through other .vs files, in the
+                order they are first found.
+        """
+        found = {}
+        stack = list(reversed(self._dependencies.get(file_path, [])))
+        while stack:
+            dependency_path = stack.pop()
+            if dependency_path.endswith(".vs") and dependency_path not in found:
+                found[dependency_path] = None
+                stack.extend(reversed(self._dependencies.get(dependency_path, [])))
+        return list(found)
@@ -0,0 +1,305 @@
+"""This module provides the indexes vs_build uses to look up Verilog files and scripts by name."""
+
+import json
+import os
+import time
+
+# Files and directories modified this recently may still change within the same timestamp
+RACY_INTERVAL_NS = 2 * 1000 * 1000 * 1000
+
+
+class OrderedFileSet:
+    """
+    Ordered set of file paths, indexed by file name.
+
+    It behaves like the lists of paths vs_build used to pass around: it keeps the insertion
+    order and can be iterated or indexed, but membership tests and lookups by file name take
+    constant time. Adding a path that is already present does nothing.
+    """
+
+    def __init__(self, paths=()):
+        self._paths = []
+        self._members = set()
+        self._by_name = {}
+        self.extend(paths)
+
+    def append(self, path):
+        """
+        Adds a path to the end of the set, if not present.
+
+        Args:
+            path (str): The file path.
+        """
+        if path in self._members:
+            return
+        self._paths.append(path)
+        self._members.add(path)
+        self._by_name.setdefault(os.path.basename(path), []).append(path)
+
+    def extend(self, paths):
+        """
+        Adds several paths to the end of the set.
+
+        Args:
+            paths (iterable): The file paths.
+        """
+        for path in paths:
+            self.append(path)
+
+    def find(self, filename):
+        """
+        Finds the paths with the given file name.
+
+        Args:
+            filename (str): The file name, without directories.
+
+        Returns:
+            list: The matching paths, in insertion order.
+        """
+        return self._by_name.get(filename, [])
+
+    def __contains__(self, path):
+        return path in self._members
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        return self._paths[index]
+
+    def __repr__(self):
+        return f"OrderedFileSet({self._paths!r})"
+
+
+class ScriptIndex:
+    """
+    Index of script paths, organised as a trie over the "_"-separated words of their names.
+
+    Looking up the script whose name is the longest word prefix of a file name walks the trie
+    once, instead of comparing every prefix of the file name against every script.
+    """
+
+    def __init__(self, paths=()):
+        self._paths = []
+        self._members = set()
+        self._root = {}
+        for path in paths:
+            self.append(path)
+
+    def append(self, path):
+        """
+        Adds a script to the index, if not present.
+
+        Args:
+            path (str): The script path.
+        """
+        if path in self._members:
+            return
+        self._paths.append(path)
+        self._members.add(path)
+        node = self._root
+        for word in os.path.splitext(os.path.basename(path))[0].split("_"):
+            node = node.setdefault(word, {})
+        node.setdefault(None, []).append(path)
+
+    def longest_prefix(self, input_name):
+        """
+        Finds the script whose name matches the most leading words of the input name.
+
+        Args:
+            input_name (str): The name of the file to generate.
+
+        Returns:
+            tuple: The script path and the number of words it matched, or ("", 0) if none matches.
+        """
+        input_words = input_name.split("_")
+        node = self._root
+        most_similar_file = ""
+        similar_word_counter = 0
+        for counter, word in enumerate(input_words, 1):
+            node = node.get(word)
+            if node is None:
+                break
+            if None in node:
+                most_similar_file = node[None][0]
+                similar_word_counter = counter
+        return most_similar_file, similar_word_counter
+
+    def __contains__(self, path):
+        return path in self._members
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        return self._paths[index]
+
+    def __repr__(self):
+        return f"ScriptIndex({self._paths!r})"
+
+
+class ProjectIndex:
+    """
+    Persistent index of the files found under the project directories.
+
+    For every directory it records its modification time, its sub-directories and the files with
+    one of the indexed extensions. A directory's modification time changes whenever an entry is
+    added, removed or renamed in it, so on the next run only the directories whose time changed
+    are listed again, and the others are only checked with a stat call.
+    """
+
+    def __init__(self, index_path, extensions, excluded_directories):
+        self.index_path = index_path
+        self.extensions = set(extensions)
+        self.excluded_directories = set(excluded_directories)
+        self._directories = None
+        self._walk_order = []
+        self._dirty = False
+
+    def update(self, roots):
+        """
+        Brings the index up to date with the given directory trees and saves it if it changed.
+
+        Directories are visited in the same order as a top-down os.walk.
+
+        Args:
+            roots (list): The directories to index.
+        """
+        if self._directories is None:
+            self._directories = self._load()
+        visited = {}
+        self._walk_order = []
+        for root in roots:
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                entry = visited.get(directory)
+                if entry is None:
+                    entry = self._revalidate(directory)
+                    if entry is None:
+                        continue
+                    visited[directory] = entry
+                self._walk_order.append(directory)
+                for subdirectory in reversed(entry["subdirs"]):
+                    stack.append(os.path.join(directory, subdirectory))
+        if len(visited) != len(self._directories):
+            self._dirty = True
+        self._directories = visited
+        if self._dirty:
+            self._save()
+
+    def files(self):
+        """
+        Lists the indexed files found by the last update.
+
+        Returns:
+            list: The file paths, in os.walk order.
+        """
+        return [
+            os.path.join(directory, filename)
+            for directory in self._walk_order
+            for filename in self._directories[directory]["files"]
+        ]
+
+    def find_file(self, filename, root):
+        """
+        Finds the first indexed file with the given name under a directory.
+
+        Args:
+            filename (str): The file name, without directories.
+            root (str): The directory to search under.
+
+        Returns:
+            str or None: The file path, or None if the file is not indexed under root.
+        """
+        for directory in self._walk_order:
+            if directory == root or directory.startswith(root.rstrip(os.sep) + os.sep):
+                if filename in self._directories[directory]["files"]:
+                    return os.path.join(directory, filename)
+        return None
+
+    def _revalidate(self, directory):
+        """
+        Returns the entry of a directory, listing it again only if it changed.
+
+        Args:
+            directory (str): The directory path.
+
+        Returns:
+            dict or None: The directory entry, or None if the directory does not exist.
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        entry = self._directories.get(directory)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry
+
+        subdirectories = []
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for dir_entry in entries:
+                    try:
+                        is_directory = dir_entry.is_dir()
+                    except OSError:
+                        is_directory = False
+                    if is_directory:
+                        if (
+                            dir_entry.name not in self.excluded_directories
+                            and not dir_entry.is_symlink()
+                        ):
+                            subdirectories.append(dir_entry.name)
+                    elif os.path.splitext(dir_entry.name)[1] in self.extensions:
+                        files.append(dir_entry.name)
+        except OSError:
+            return None
+        if time.time_ns() - mtime < RACY_INTERVAL_NS:
+            mtime = -1
+        self._dirty = True
+        return {"mtime": mtime, "subdirs": subdirectories, "files": files}
+
+    def _load(self):
+        """
+        Loads the index saved by a previous run.
+
+        Returns:
+            dict: The directory entries, by directory path.
+        """
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if (
+            index.get("extensions") != sorted(self.extensions)
+            or index.get("excluded_directories") != sorted(self.excluded_directories)
+        ):
+            return {}
+        return index["directories"]
+
+    def _save(self):
+        """
+        Saves the index, replacing the previous one atomically.
+        """
+        index = {
+            "extensions": sorted(self.extensions),
+            "excluded_directories": sorted(self.excluded_directories),
+            "directories": self._directories,
+        }
+        temporary_path = f"{self.index_path}.tmp{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(temporary_path, "w") as file:
+                json.dump(index, file)
+            os.replace(temporary_path, self.index_path)
+            self._dirty = False
+        except OSError:
+            pass
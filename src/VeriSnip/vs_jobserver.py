@@ -0,0 +1,182 @@
+"""This module takes the job slots of the generator scripts from the GNU Make jobserver vs_build runs under, so a parallel vs_build inside a parallel make does not oversubscribe the machine."""
+
+import os
+import re
+import select
+import stat
+import threading
+from contextlib import contextmanager
+
+from .vs_colours import DEBUG, WARNING, vs_print
+
+# The jobserver make advertises to its recipes, the last one given is the one in use
+_JOBSERVER_AUTH = re.compile(r"--jobserver-(?:auth|fds)=(\S+)")
+_PIPE_AUTH = re.compile(r"^(-?\d+),(-?\d+)$")
+_JOBS = re.compile(r"(?:^|\s)-j(\d+)(?=\s|$)")
+
+
+class JobServer:
+    """
+    Client of a GNU Make jobserver.
+
+    Make runs vs_build in one job slot, which vs_build uses without asking. Every other job slot
+    is a token: a byte read from the jobserver, either a named fifo or a pipe inherited from make,
+    and written back once the job finished. While make runs other recipes the tokens are taken, and
+    vs_build runs fewer scripts at the same time.
+
+    Attributes:
+        limit (int or None): The number of jobs make runs at the same time, if it says.
+    """
+
+    def __init__(self, read_fd, write_fd, limit=None, owned=False):
+        self.limit = limit
+        self._read_fd = read_fd
+        self._write_fd = write_fd
+        self._owned = owned
+        self._lock = threading.Lock()
+        self._implicit_slot_free = True
+        self._closed = False
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds a job slot while the block runs, waiting until one is free.
+        """
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def acquire(self):
+        """
+        Takes a job slot, waiting until one is free.
+
+        Returns:
+            bytes or None: The token read from the jobserver, to give back to `release`, or None
+                for the slot make runs vs_build in.
+        """
+        with self._lock:
+            if self._implicit_slot_free:
+                self._implicit_slot_free = False
+                return None
+        while True:
+            try:
+                token = os.read(self._read_fd, 1)
+            except BlockingIOError:
+                # Make may share the pipe in non-blocking mode
+                select.select([self._read_fd], [], [])
+                continue
+            except OSError as e:
+                vs_print(WARNING, f"Could not read from the GNU Make jobserver, running without a slot. {e}")
+                return b""
+            if not token:
+                vs_print(WARNING, "The GNU Make jobserver was closed, running without a slot.")
+            return token
+
+    def release(self, token):
+        """
+        Gives back a job slot.
+
+        Args:
+            token (bytes or None): The value returned by `acquire`.
+        """
+        if token is None:
+            with self._lock:
+                self._implicit_slot_free = True
+            return
+        if not token or self._closed:
+            return
+        try:
+            os.write(self._write_fd, token)
+        except OSError as e:
+            vs_print(WARNING, f"Could not give a job slot back to the GNU Make jobserver. {e}")
+
+    def close(self):
+        """
+        Closes the jobserver fifo, if this client opened it.
+        """
+        if self._owned and not self._closed:
+            os.close(self._read_fd)
+        self._closed = True
+
+
+def job_server(makeflags=None, inherited=True):
+    """
+    Connects to the GNU Make jobserver a build runs under.
+
+    Every build connects again and closes its client once done: the vs_build server runs the
+    builds of clients started by different makes, or by none.
+
+    Args:
+        makeflags (str, optional): The make flags, by default the MAKEFLAGS environment variable.
+        inherited (bool, optional): Whether the file descriptors of a pipe jobserver were
+            inherited by this process. The vs_build server receives the make flags of its clients
+            but not their file descriptors, it only connects to a fifo jobserver.
+
+    Returns:
+        JobServer or None: The client, or None if the build does not run under a parallel make or
+            cannot reach its jobserver.
+    """
+    if makeflags is None:
+        makeflags = os.environ.get("MAKEFLAGS", "")
+    return _connect(makeflags, inherited)
+
+
+def _connect(makeflags, inherited):
+    """
+    Connects to the jobserver advertised in the make flags.
+
+    Args:
+        makeflags (str): The make flags.
+        inherited (bool): Whether the file descriptors of a pipe jobserver are those of this process.
+
+    Returns:
+        JobServer or None: The client, or None if there is no jobserver to connect to.
+    """
+    authorisations = _JOBSERVER_AUTH.findall(makeflags)
+    if not authorisations:
+        return None
+    authorisation = authorisations[-1]
+    jobs = _JOBS.findall(makeflags)
+    limit = int(jobs[-1]) if jobs else None
+
+    if authorisation.startswith("fifo:"):
+        fifo_path = authorisation[len("fifo:"):]
+        try:
+            # Opened for reading and writing, so opening never waits for the other end
+            fd = os.open(fifo_path, os.O_RDWR)
+        except OSError as e:
+            vs_print(WARNING, f"Could not open the GNU Make jobserver {fifo_path}, using --jobs instead. {e}")
+            return None
+        if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+            os.close(fd)
+            vs_print(WARNING, f"The GNU Make jobserver {fifo_path} is not a fifo, using --jobs instead.")
+            return None
+        vs_print(DEBUG, "Taking the job slots from the GNU Make jobserver %s.", fifo_path)
+        return JobServer(fd, fd, limit, owned=True)
+
+    pipe = _PIPE_AUTH.match(authorisation)
+    if pipe is not None and not inherited:
+        vs_print(DEBUG, "The GNU Make jobserver pipe of the client is not shared with the server, using --jobs instead.")
+        return None
+    if pipe is None:
+        vs_print(DEBUG, "Unsupported GNU Make jobserver %s, using --jobs instead.", authorisation)
+        return None
+    read_fd, write_fd = int(pipe.group(1)), int(pipe.group(2))
+    if read_fd < 0 or write_fd < 0:
+        # Make disables the jobserver of recipes it does not consider make commands
+        return None
+    try:
+        for fd in (read_fd, write_fd):
+            if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+                raise OSError(f"file descriptor {fd} is not a pipe")
+    except OSError as e:
+        vs_print(
+            WARNING,
+            "The GNU Make jobserver is not available, mark the recipe running vs_build with \"+\" "
+            f"to share it, using --jobs instead. {e}",
+        )
+        return None
+    vs_print(DEBUG, "Taking the job slots from the GNU Make jobserver pipe %d,%d.", read_fd, write_fd)
+    return JobServer(read_fd, write_fd, limit)
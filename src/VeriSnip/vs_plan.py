@@ -0,0 +1,181 @@
+"""This module records what a vs_build invocation would do, for `vs_build --plan` to report it without running any generator script or writing any output."""
+
+import json
+import os
+
+from .vs_colours import INFO, OK, WARNING, vs_print
+
+
+class BuildPlan:
+    """
+    The generator calls and outputs of a build, found by resolving its whole dependency graph.
+
+    A call is "cached" if its files are in the local generator cache, "stored" if they are in the
+    artifact store, and "run" if its script must run. An output is "new" if it does not exist yet,
+    "rewrite" if its content would change, "unchanged" if it would not, and "pending" if it depends
+    on a file a script must generate first, so its content cannot be known before running it.
+
+    Attributes:
+        calls (list): The generator calls, as dictionaries, in the order they would be made.
+        outputs (list): The outputs under the build directory, as dictionaries, by build target.
+        target (str or None): The build target being planned, recorded with its calls and outputs.
+    """
+
+    def __init__(self, run_times=None):
+        self.calls = []
+        self.outputs = []
+        self.target = None
+        self._run_times = run_times
+
+    def add_call(self, job, status):
+        """
+        Records a generator call.
+
+        Args:
+            job (GeneratorJob): The queued call.
+            status (str): "cached", "stored" or "run".
+        """
+        estimate = None
+        if status == "run" and self._run_times is not None:
+            estimate = self._run_times.estimate(job.script_path)
+        self.calls.append(
+            {
+                "target": self.target,
+                "file": job.file_name,
+                "script": os.path.relpath(job.script_path),
+                "suffix": job.arguments[1],
+                "comment": job.arguments[2],
+                "callee": job.callee_filename,
+                "status": status,
+                "estimate": estimate,
+            }
+        )
+
+    def add_output(self, output_path, source_path, status):
+        """
+        Records an output of the build.
+
+        Args:
+            output_path (str): Path of the output.
+            source_path (str or None): Path of the file it is written from, None if it is not generated yet.
+            status (str): "new", "rewrite", "unchanged" or "pending".
+        """
+        self.outputs.append(
+            {
+                "target": self.target,
+                "output": os.path.relpath(output_path),
+                "source": os.path.relpath(source_path) if source_path is not None else None,
+                "status": status,
+            }
+        )
+
+    def planned(self, file_name):
+        """
+        Checks whether a call generating a file was already recorded.
+
+        Args:
+            file_name (str): The name of the generated file.
+
+        Returns:
+            bool: True if it was.
+        """
+        return any(call["file"] == file_name for call in self.calls)
+
+    def pending_files(self):
+        """
+        Returns the files that only exist once their script ran.
+
+        Returns:
+            set: The names of the files, as they are referred to.
+        """
+        return {call["file"] for call in self.calls if call["status"] == "run"}
+
+    @property
+    def up_to_date(self):
+        """
+        bool: True if the build would run no script and write no output.
+        """
+        return all(call["status"] != "run" for call in self.calls) and all(
+            output["status"] == "unchanged" for output in self.outputs
+        )
+
+    def estimate(self, jobs=1):
+        """
+        Estimates how long running the scripts would take, from their past calls.
+
+        Args:
+            jobs (int, optional): Maximum number of scripts running at the same time.
+
+        Returns:
+            tuple: The total duration of the calls that must run, in seconds, an estimate of the
+                build duration with `jobs` scripts running at once, and the number of calls whose
+                script never ran, which are not counted.
+        """
+        durations = [call["estimate"] for call in self.calls if call["status"] == "run"]
+        known = [duration for duration in durations if duration is not None]
+        total = sum(known)
+        wall_time = max(total / max(jobs, 1), max(known, default=0.0))
+        return total, wall_time, len(durations) - len(known)
+
+    def report(self, jobs=1):
+        """
+        Prints the plan.
+
+        Args:
+            jobs (int, optional): Maximum number of scripts running at the same time.
+        """
+        for call in self.calls:
+            estimate = f", ~{call['estimate']:.2f}s" if call["estimate"] is not None else ""
+            vs_print(
+                INFO,
+                f"[{call['status']}] {call['file']} <- {call['script']} "
+                f"(suffix \"{call['suffix']}\", comment \"{call['comment']}\", from {call['callee']}{estimate})",
+            )
+        for output in self.outputs:
+            if output["status"] != "unchanged":
+                vs_print(INFO, f"[{output['status']}] {output['output']}")
+
+        counts = {}
+        for item in self.calls + self.outputs:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        total, wall_time, unknown = self.estimate(jobs)
+        vs_print(
+            OK,
+            f"Plan: {len(self.calls)} generator calls ({counts.get('cached', 0)} cached, "
+            f"{counts.get('stored', 0)} in the artifact store, {counts.get('run', 0)} to run), "
+            f"{len(self.outputs)} outputs ({counts.get('new', 0)} new, {counts.get('rewrite', 0)} rewritten, "
+            f"{counts.get('pending', 0)} pending, {counts.get('unchanged', 0)} unchanged).",
+        )
+        if counts.get("run", 0):
+            message = f"Estimated script time: {total:.2f}s, about {wall_time:.2f}s running {jobs} at a time."
+            if unknown:
+                message += f" {unknown} calls have no recorded run time."
+            vs_print(OK, message)
+        elif self.up_to_date:
+            vs_print(OK, "The build is up to date.")
+
+    def write_json(self, path, jobs=1):
+        """
+        Writes the plan as a JSON file.
+
+        Args:
+            path (str): Path of the file.
+            jobs (int, optional): Maximum number of scripts running at the same time.
+        """
+        total, wall_time, unknown = self.estimate(jobs)
+        plan = {
+            "calls": self.calls,
+            "outputs": self.outputs,
+            "estimate": {"seconds": total, "wall_seconds": wall_time, "jobs": jobs, "unknown": unknown},
+            "up_to_date": self.up_to_date,
+        }
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "w") as file:
+                json.dump(plan, file, indent=2)
+        except OSError as e:
+            vs_print(WARNING, f"Could not write the plan to {path}. {e}")
+            return
+        vs_print(INFO, f"Plan written to {path}.")
@@ -0,0 +1,346 @@
+"""This module runs Python generator plugins inside a pool of long-lived worker interpreters, instead of starting a new interpreter for every call."""
+
+import atexit
+import importlib.util
+import io
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+
+from .vs_cache import interpreter_path
+from .vs_colours import DEBUG, vs_print
+
+# A Python script is a plugin if it has the marker in its first bytes and defines the function at the top level
+_PLUGIN_MARKER = re.compile(rb"\bVS_PLUGIN\b")
+_PLUGIN_MARKER_SEARCH_SIZE = 4096
+_ENTRY_POINT = re.compile(rb"^def generate\(", re.MULTILINE)
+
+_PARAMETER = re.compile(r'^(\w+)="?([^"]+)"?$')
+
+# Whether each script is a plugin, by path, with the modification time, size and PATH it was checked with
+_plugin_scripts = {}
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Modules loaded by a worker, by script path, with the modification time and size they were loaded at
+# and those of the modules they imported from their directory
+_loaded_plugins = {}
+_plugins_loaded = 0
+
+
+def is_plugin(script_path):
+    """
+    Checks whether a generator script is called as a Python plugin.
+
+    A plugin is a ".py" script with the word VS_PLUGIN in its first 4 KB, usually in a comment,
+    defining a top-level function `generate(suffix, comment, callee, params)`, called instead of
+    running the script. It is only called by the worker interpreters when its shebang line runs it
+    with the interpreter of vs_build, from the same directory so from the same virtual environment.
+    Otherwise it is run as a script, like any other.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        bool: True if the script is called as a plugin.
+    """
+    if not script_path.endswith(".py"):
+        return False
+    try:
+        status = os.stat(script_path)
+    except OSError:
+        return False
+    # The interpreter the shebang line runs through `env` depends on the PATH
+    signature = (status.st_mtime_ns, status.st_size, os.environ.get("PATH"))
+    checked = _plugin_scripts.get(script_path)
+    if checked is None or checked[0] != signature:
+        with open(script_path, "rb") as file:
+            content = file.read()
+        plugin = (
+            _PLUGIN_MARKER.search(content, 0, _PLUGIN_MARKER_SEARCH_SIZE) is not None
+            and _ENTRY_POINT.search(content) is not None
+        )
+        if plugin and not _runs_with_this_interpreter(script_path):
+            vs_print(DEBUG, "Running the plugin %s as a script, its interpreter is not vs_build's.", script_path)
+            plugin = False
+        checked = (signature, plugin)
+        _plugin_scripts[script_path] = checked
+    return checked[1]
+
+
+def _runs_with_this_interpreter(script_path):
+    """
+    Checks whether the shebang line of a script runs it with the interpreter running vs_build.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        bool: True if both are the same program, found in the same directory.
+    """
+    program = interpreter_path(script_path)
+    if program is None:
+        return False
+    executable = os.path.abspath(sys.executable)
+    return os.path.dirname(program) == os.path.dirname(executable) and os.path.realpath(
+        program
+    ) == os.path.realpath(executable)
+
+
+def run_plugin(job, workers):
+    """
+    Runs a generator job by calling its plugin in a worker interpreter.
+
+    The workers are started with the first plugin call and kept for the following ones, also
+    across the builds of `vs_build --watch` and `vs_build --server`, so each plugin and the modules
+    it imports are loaded once per worker.
+
+    The plugin receives the parameters of the requesting file in its scope, the values its
+    "{NAME}" references are replaced with, or the parameters given to vs_build if the job has none.
+
+    Args:
+        job (GeneratorJob): The job to run, its script must be a plugin.
+        workers (int): Number of worker interpreters.
+    """
+    arguments = job.arguments
+    if job.parameters is not None:
+        params = dict(job.parameters)
+    else:
+        params = {}
+        for argument in arguments[4:]:
+            parameter = _PARAMETER.match(argument)
+            if parameter:
+                params[parameter.group(1)] = parameter.group(2)
+    pool = _get_pool(workers)
+    try:
+        future = pool.submit(
+            _call_plugin,
+            job.script_path,
+            arguments,
+            params,
+            job.file_name,
+            job.output_directory,
+            os.getcwd(),
+            dict(os.environ),
+        )
+        job.returncode, job.stdout, job.stderr = future.result()
+    except BrokenProcessPool:
+        with _pool_lock:
+            if pool is _pool:
+                _shutdown_pool()
+        job.returncode = 1
+        job.stdout = b""
+        job.stderr = f"The worker running {job.script_path} stopped unexpectedly.\n".encode()
+
+
+def shutdown_plugins():
+    """
+    Stops the worker interpreters, they are started again by the next plugin call.
+    """
+    with _pool_lock:
+        _shutdown_pool()
+
+
+def _shutdown_pool():
+    """
+    Stops the worker interpreters, the caller holds the pool lock.
+    """
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_workers = 0
+
+
+def _get_pool(workers):
+    """
+    Returns the pool of worker interpreters, starting it if needed.
+
+    Args:
+        workers (int): Number of worker interpreters.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _shutdown_pool()
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context())
+            _pool_workers = workers
+        return _pool
+
+
+def prepare_plugins():
+    """
+    Starts the process the worker interpreters are forked from, if it is not running yet.
+
+    `vs_build --server` calls this before serving any build: the process keeps the standard output
+    and error it is started with, which must not be those of a client connection.
+    """
+    context = _worker_context()
+    if context.get_start_method() == "forkserver":
+        from multiprocessing import forkserver
+
+        forkserver.ensure_running()
+
+
+def _worker_context():
+    """
+    Returns the multiprocessing context the worker interpreters are started with.
+
+    The workers are forked from a clean server process where available, never from vs_build
+    itself, which may have threads running.
+
+    Returns:
+        The multiprocessing context.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+atexit.register(shutdown_plugins)
+
+
+def _call_plugin(script_path, arguments, params, file_name, output_directory, current_directory, environment):
+    """
+    Calls the `generate` function of a plugin, in a worker interpreter.
+
+    The call sees the same working directory, environment and sys.argv as the script would if it
+    was run. If `generate` returns a string, it is written to the requested file in the output
+    directory; otherwise the plugin is expected to write its files there itself.
+
+    Args:
+        script_path (str): Path to the plugin.
+        arguments (list): The argument vector the script would be run with.
+        params (dict): The parameters of the requesting file, by name.
+        file_name (str): The Verilog file the plugin is expected to generate.
+        output_directory (str or None): Directory where the plugin writes its files.
+        current_directory (str): The working directory of vs_build.
+        environment (dict): The environment of vs_build.
+
+    Returns:
+        tuple: The exit code of the call, its standard output and its standard error.
+    """
+    os.chdir(current_directory)
+    os.environ.clear()
+    os.environ.update(environment)
+    if output_directory is not None:
+        os.environ["VS_OUTPUT_DIR"] = output_directory
+    sys.argv = list(arguments)
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    returncode = 0
+    # Like a script being run, the plugin can import the modules next to it, during this call only
+    saved_path = list(sys.path)
+    imported_before = set(sys.modules)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            module = _load_plugin(script_path)
+            content = module.generate(arguments[1], arguments[2], arguments[3], params)
+            if isinstance(content, str):
+                if os.path.splitext(file_name)[1] == "":
+                    file_name = f"{file_name}.v"
+                with open(os.path.join(output_directory or current_directory, file_name), "w") as file:
+                    file.write(content)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                returncode = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            sys.path[:] = saved_path
+            _forget_script_modules(script_path, imported_before)
+    return returncode, stdout.getvalue().encode(), stderr.getvalue().encode()
+
+
+def _load_plugin(script_path):
+    """
+    Imports a plugin, or returns the module imported by a previous call if neither the script nor
+    the modules it imported from its directory changed.
+
+    Args:
+        script_path (str): Path to the plugin.
+
+    Returns:
+        module: The plugin module.
+    """
+    global _plugins_loaded
+    status = os.stat(script_path)
+    signature = (status.st_mtime_ns, status.st_size)
+    loaded = _loaded_plugins.get(script_path)
+    if loaded is not None:
+        if loaded[0] == signature and all(
+            _file_signature(file_path) == helper_signature for file_path, helper_signature in loaded[2].items()
+        ):
+            return loaded[1]
+        sys.modules.pop(loaded[1].__name__, None)
+        del _loaded_plugins[script_path]
+
+    _plugins_loaded += 1
+    script_name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(script_path))[0])
+    module_name = f"vs_plugin_{_plugins_loaded}_{script_name}"
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    _loaded_plugins[script_path] = (signature, module, {})
+    return module
+
+
+def _forget_script_modules(script_path, imported_before):
+    """
+    Removes the modules a plugin call imported from the directory of the plugin.
+
+    The worker runs plugins of any project, so a helper module must not be found by the plugins of
+    another directory importing the same name. The plugin keeps the helper modules it imported, and
+    is imported again when one of them changes.
+
+    Args:
+        script_path (str): Path to the plugin.
+        imported_before (set): The names of the modules imported before the call.
+    """
+    script_directory = os.path.join(os.path.dirname(os.path.abspath(script_path)), "")
+    loaded = _loaded_plugins.get(script_path)
+    for name in set(sys.modules) - imported_before:
+        file_path = getattr(sys.modules[name], "__file__", None)
+        if name.startswith("vs_plugin_") or file_path is None:
+            continue
+        file_path = os.path.abspath(file_path)
+        if not file_path.startswith(script_directory):
+            continue
+        del sys.modules[name]
+        if loaded is not None:
+            loaded[2][file_path] = _file_signature(file_path)
+
+
+def _file_signature(file_path):
+    """
+    Returns the modification time and size of a file, or None if it does not exist anymore.
+    """
+    try:
+        status = os.stat(file_path)
+    except OSError:
+        return None
+    return (status.st_mtime_ns, status.st_size)
@@ -0,0 +1,346 @@
+"""This module scans Verilog sources in a single pass, finding what vs_build needs to resolve their dependencies."""
+
+import mmap
+import os
+import re
+from contextlib import contextmanager
+
+# Version of the facts returned by `scan_verilog`, cached facts from other versions are discarded
+SCANNER_VERSION = "3"
+
+# Files from this size on are scanned through a memory map instead of being read and decoded
+LARGE_FILE_SIZE = 16 * 1024 * 1024
+
+# Pages of a memory map behind the scan are released every time it moves this far
+_RELEASE_INTERVAL = 16 * 1024 * 1024
+
+# Keywords that can start a line followed by two identifiers and a parenthesis
+_KEYWORDS = frozenset(
+    [
+        "module", "macromodule", "primitive", "interface", "program", "package", "class",
+        "function", "task", "input", "output", "inout", "wire", "reg", "logic", "integer",
+        "real", "time", "genvar", "localparam", "parameter", "defparam", "assign", "always",
+        "always_ff", "always_comb", "always_latch", "initial", "final", "if", "else", "for",
+        "while", "repeat", "forever", "case", "casex", "casez", "begin", "end", "generate",
+        "endgenerate", "return", "typedef", "struct", "enum", "import", "export",
+    ]
+)
+
+# Comments and strings are skipped, so nothing inside them is matched.
+# Includes, parameter definitions and instantiations are only looked for at the start of a line
+# other than the first, and only words followed by "#" or by another word and "(" (or by a
+# comment) can start an instantiation. Every alternative starts with one of "/", newline or '"',
+# which lets the regular expression engine skip everything else without leaving C code.
+_SCANNER_PATTERN = r"""
+      //[^\n]*
+    | /\*.*?(?:\*/|\Z)
+    | \n[ \t]*(?:
+          `include[ \t]+"(?P<include>[^"\n]*)"
+        | (?P<parameter>parameter)\b
+        | (?!(?:%s)\b)(?P<word>[A-Za-z_]\w*)(?=\s*(?:[\#/]|[A-Za-z_]\w*\s*[(/]))
+      )
+    | "(?:[^"\\\n]|\\.)*"?
+    """ % "|".join(sorted(_KEYWORDS))
+
+
+class _Patterns:
+    """
+    The regular expressions of the scanner, compiled for text or for bytes.
+
+    Bytes are scanned straight from a memory map, without decoding the file. Their line endings
+    are not translated, so only the values found are, and files ending their lines with a lone
+    carriage return must be scanned as text.
+    """
+
+    def __init__(self, encode):
+        self.scanner = re.compile(encode(_SCANNER_PATTERN), re.DOTALL | re.VERBOSE)
+        # Instantiations without comments and with at most one level of parentheses in their parameters
+        self.simple_instantiation = re.compile(
+            encode(r"\s*(?:\#\s*\(((?:[^()]|\([^()]*\))*)\)\s*)?([A-Za-z_]\w*)\s*\(\s*(\.)?")
+        )
+        self.gap = re.compile(encode(r"(?:\s+|//[^\n]*|/\*.*?\*/)*"), re.DOTALL)
+        self.block_argument = re.compile(encode(r"\s*/\*(.*?)\*/"), re.DOTALL)
+        self.line_argument = re.compile(encode(r"[^\n]*"))
+        self.parameter_definition = re.compile(encode(r"\s+(?:\w+\s+)?(\w+)\s*=\s*([^,;\n)]+)"))
+        self.parameter_value = re.compile(encode(r"\.(\w+)\s*\(\s*([^)]+?)\s*\)"))
+        self.identifier = re.compile(encode(r"[A-Za-z_]\w*"))
+        self.parentheses = re.compile(
+            encode(r'//[^\n]*|/\*.*?\*/|"(?:[^"\\\n]|\\.)*"|[()]'), re.DOTALL
+        )
+        self.hash, self.open, self.close, self.dot = (encode(token) for token in "#().")
+
+
+_TEXT_PATTERNS = _Patterns(lambda pattern: pattern)
+_BYTES_PATTERNS = _Patterns(lambda pattern: pattern.encode())
+
+
+def scan_verilog(content):
+    """
+    Extract the dependencies and parameters of Verilog file content in a single pass.
+
+    Args:
+        content (str or bytes-like): The content of the Verilog file, as text, or as bytes or a
+            memory map of the file to scan it without decoding it.
+
+    Returns:
+        dict: The facts found in the file:
+            "parameter_definitions" (list): [name, value] pairs of the parameter definitions.
+            "parameter_instantiations" (list): [name, value] pairs of the parameter values in module instantiations.
+            "instance_parameters" (list): [module, [[name, value], ...]] pairs of the module
+                instantiations, with the parameter values given by each.
+            "dependencies" (list): [module, instance] pairs of the module instantiations,
+                then [file, comment] pairs of the includes followed by a "//" comment or nothing,
+                then [file, comment] pairs of the includes followed by a "/* */" comment.
+
+    Each match is resolved with a few anchored regular expressions from the position where it
+    was found, so the content is scanned once and nothing backtracks over more than one statement.
+    Only the first instantiation of each module and the first of identical parameter pairs are
+    kept, the others resolve to the same files and parameters. The instance parameters keep one
+    instantiation of each module for each different set of parameter values. The facts of a
+    netlist instantiating a few cells millions of times stay as small as the number of different
+    cells and parameterisations.
+    """
+    patterns = _TEXT_PATTERNS if isinstance(content, str) else _BYTES_PATTERNS
+    definitions = []
+    instantiations = []
+    instances = []
+    parameterisations = []
+    line_includes = []
+    block_includes = []
+    # Modules and parameter pairs already found
+    seen = set()
+
+    position = 0
+    released = 0
+    release = isinstance(content, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED")
+    search = patterns.scanner.search
+    while True:
+        match = search(content, position)
+        if match is None:
+            break
+        position = match.end()
+        if release and position - released >= _RELEASE_INTERVAL:
+            # Nothing before the current position is read again
+            released = position - position % mmap.PAGESIZE
+            content.madvise(mmap.MADV_DONTNEED, 0, released)
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        if kind == "include":
+            block_argument = patterns.block_argument.match(content, position)
+            if block_argument:
+                block_includes.append([match.group("include"), block_argument.group(1)])
+                position = block_argument.end()
+            else:
+                line_argument = patterns.line_argument.match(content, position)
+                line_includes.append([match.group("include"), line_argument.group(0)])
+                position = line_argument.end()
+        elif kind == "parameter":
+            definition = patterns.parameter_definition.match(content, position)
+            if definition:
+                _add_once(definitions, seen, definition.group(1), definition.group(2).strip())
+        else:
+            _scan_instantiation(
+                patterns, content, match, instances, instantiations, parameterisations, seen
+            )
+
+    facts = {
+        "parameter_definitions": definitions,
+        "parameter_instantiations": instantiations,
+        "instance_parameters": parameterisations,
+        "dependencies": instances + line_includes + block_includes,
+    }
+    if patterns is _BYTES_PATTERNS:
+        for kind in ["parameter_definitions", "parameter_instantiations", "dependencies"]:
+            for pair in facts[kind]:
+                pair[:] = [_decode(value) for value in pair]
+        for pair in parameterisations:
+            pair[0] = _decode(pair[0])
+            for value_pair in pair[1]:
+                value_pair[:] = [_decode(value) for value in value_pair]
+    return facts
+
+
+def scan_verilog_file(file_path):
+    """
+    Extract the dependencies and parameters of a Verilog file in a single pass.
+
+    Files of LARGE_FILE_SIZE or more are scanned through a memory map, so scanning them needs
+    the same memory whatever their size.
+
+    Args:
+        file_path (str): Path to the Verilog file.
+
+    Returns:
+        dict: The facts found in the file, see `scan_verilog`.
+    """
+    if os.path.getsize(file_path) >= LARGE_FILE_SIZE:
+        with mapped_file(file_path) as content:
+            return scan_verilog(content)
+    # Decoded like the values found in a memory map, see `_decode`
+    with open(file_path, "r", encoding="utf-8", errors="replace") as file:
+        return scan_verilog(file.read())
+
+
+@contextmanager
+def mapped_file(file_path):
+    """
+    Maps a file in memory, read-only.
+
+    Args:
+        file_path (str): Path to the file, which must not be empty.
+
+    Yields:
+        mmap.mmap: The memory map of the file.
+    """
+    with open(file_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            if hasattr(content, "madvise"):
+                content.madvise(mmap.MADV_SEQUENTIAL)
+            yield content
+
+
+def _decode(value):
+    """
+    Decodes a value found in the bytes of a file, translating its "\\r\\n" line endings like text files.
+
+    Args:
+        value (bytes): The value.
+
+    Returns:
+        str: The decoded value.
+    """
+    # A value ending a line keeps the carriage return of a "\r\n" line ending
+    return value.decode(errors="replace").replace("\r\n", "\n").rstrip("\r")
+
+
+def _add_once(pairs, seen, first, second, key=None):
+    """
+    Adds a pair to a list of facts, unless an identical one was already found.
+
+    Args:
+        pairs (list): The list of pairs.
+        seen (set): Keys of the pairs already found, updated.
+        first: The first value of the pair.
+        second: The second value of the pair.
+        key (hashable, optional): Identifies the pair, by default the list and both values.
+    """
+    if key is None:
+        key = (id(pairs), first, second)
+    if key not in seen:
+        seen.add(key)
+        pairs.append([first, second])
+
+
+def _scan_instantiation(patterns, content, match, instances, instantiations, parameterisations, seen):
+    """
+    Checks whether a word at the start of a line begins a module instantiation.
+
+    Args:
+        patterns (_Patterns): The regular expressions for the type of the content.
+        content (str or bytes-like): The content of the Verilog file.
+        match (re.Match): The match of the word.
+        instances (list): List where the [module, instance] pair is added, unless the module was found before.
+        instantiations (list): List where the new [name, value] pairs of the parameter values are added.
+        parameterisations (list): List where the [module, [[name, value], ...]] pair is added,
+            unless the module was found before with the same parameter values.
+        seen (set): Keys of the modules and pairs already found, updated.
+    """
+    simple = patterns.simple_instantiation.match(content, match.end())
+    if simple:
+        parameter_block, instance, port = simple.groups()
+        values = _parameter_values(patterns, parameter_block, instantiations, seen)
+        if port is not None:
+            _add_instance(match.group("word"), instance, values, instances, parameterisations, seen)
+        return
+
+    gap = patterns.gap.match
+    position = gap(content, match.end()).end()
+    parameter_block = None
+    if content[position : position + 1] == patterns.hash:
+        position = gap(content, position + 1).end()
+        if content[position : position + 1] != patterns.open:
+            return
+        closing = _find_closing_parenthesis(patterns, content, position)
+        if closing is None:
+            return
+        parameter_block = content[position + 1 : closing]
+        position = gap(content, closing + 1).end()
+
+    instance = patterns.identifier.match(content, position)
+    if instance is None:
+        return
+    position = gap(content, instance.end()).end()
+    if content[position : position + 1] != patterns.open:
+        return
+
+    values = _parameter_values(patterns, parameter_block, instantiations, seen)
+    position = gap(content, position + 1).end()
+    if content[position : position + 1] == patterns.dot:
+        _add_instance(
+            match.group("word"), instance.group(0), values, instances, parameterisations, seen
+        )
+
+
+def _parameter_values(patterns, parameter_block, instantiations, seen):
+    """
+    Finds the parameter values given by an instantiation.
+
+    Args:
+        patterns (_Patterns): The regular expressions for the type of the content.
+        parameter_block (str or bytes or None): The content of the "#( )" of the instantiation.
+        instantiations (list): List where the new [name, value] pairs are added.
+        seen (set): Keys of the pairs already found, updated.
+
+    Returns:
+        list: The [name, value] pairs, in the order they are given.
+    """
+    if parameter_block is None:
+        return []
+    values = []
+    for name, value in patterns.parameter_value.findall(parameter_block):
+        value = value.strip()
+        values.append([name, value])
+        _add_once(instantiations, seen, name, value)
+    return values
+
+
+def _add_instance(module, instance, values, instances, parameterisations, seen):
+    """
+    Adds a module instantiation to the facts.
+
+    Args:
+        module (str or bytes): The instantiated module.
+        instance (str or bytes): The instance name.
+        values (list): The [name, value] pairs of the parameter values given to the module.
+        instances (list): List where the [module, instance] pair is added, unless the module was found before.
+        parameterisations (list): List where the [module, values] pair is added, unless the module
+            was found before with the same values.
+        seen (set): Keys of the modules and pairs already found, updated.
+    """
+    _add_once(instances, seen, module, instance, (id(instances), module))
+    key = (id(parameterisations), module, tuple(tuple(pair) for pair in values))
+    _add_once(parameterisations, seen, module, values, key)
+
+
+def _find_closing_parenthesis(patterns, content, position):
+    """
+    Finds the parenthesis closing the one at the given position, skipping comments and strings.
+
+    Args:
+        patterns (_Patterns): The regular expressions for the type of the content.
+        content (str or bytes-like): The content of the Verilog file.
+        position (int): Position of the opening parenthesis.
+
+    Returns:
+        int or None: Position of the closing parenthesis, or None if it is not closed.
+    """
+    depth = 0
+    for token in patterns.parentheses.finditer(content, position):
+        if token.group(0) == patterns.open:
+            depth += 1
+        elif token.group(0) == patterns.close:
+            depth -= 1
+            if depth == 0:
+                return token.start()
+    return None
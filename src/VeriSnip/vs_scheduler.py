@@ -0,0 +1,322 @@
+"""This module schedules the generator scripts called by vs_build, running independent scripts concurrently."""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from .vs_colours import flush_log
+from .vs_plugins import is_plugin, run_plugin
+from .vs_trace import span
+
+# A script supports batches if this marker appears near its start, usually in a comment
+_BATCH_MARKER = re.compile(rb"\bVS_BATCH\b")
+_BATCH_MARKER_SEARCH_SIZE = 4096
+
+# Whether each script supports batches, by path, with the modification time and size it was checked at
+_batch_scripts = {}
+
+
+class GeneratorJob:
+    """
+    A single call to a generator script.
+
+    Attributes:
+        file_name (str): The Verilog file the script is expected to generate.
+        script_path (str): Path to the script to run.
+        arguments (list): The full argument vector, starting with the script path.
+        callee_filename (str): Name of the file requesting the generation.
+        output_directory (str or None): Directory where the script writes its files, given to it
+            in the VS_OUTPUT_DIR environment variable.
+        batch (list or None): The jobs sent together to the script by this call, see `batch_jobs`.
+        input (bytes or None): Data written to the standard input of the script.
+        duration (float or None): How long the call took, in seconds, once it ran.
+        parameters (dict or None): The parameters of the requesting file in the scope it is used
+            in, by name, given to the script if it is a plugin. None for other scripts, which only
+            receive their arguments.
+    """
+
+    def __init__(self, file_name, script_path, arguments, callee_filename, parameters=None):
+        self.file_name = file_name
+        self.script_path = script_path
+        self.arguments = arguments
+        self.callee_filename = callee_filename
+        self.parameters = parameters
+        self.output_directory = None
+        self.batch = None
+        self.input = None
+        self.duration = None
+        self.returncode = None
+        self.stdout = b""
+        self.stderr = b""
+
+
+class GeneratorScheduler:
+    """
+    Collects the generator jobs discovered while analysing the sources and runs them in waves.
+
+    Every job queued during one pass over the known sources is independent of the others, since
+    the files they generate have not been analysed yet. A wave is run on at most `jobs` concurrent
+    worker processes and its results are always reported in the order the jobs were queued, so
+    the build output does not depend on which script finishes first.
+
+    Attributes:
+        jobs (int): Maximum number of scripts running at the same time.
+        cache (GeneratorCache or None): Cache of the files generated by previous script calls.
+        run_times (RunTimes or None): Record of how long the calls to each script take, updated
+            with every job that runs.
+        plan (BuildPlan or None): Plan where the queued jobs are recorded instead of being run,
+            set by `vs_build --plan`.
+        job_slots (JobServer or None): GNU Make jobserver every concurrent job takes a slot from
+            before it runs, on top of the `jobs` limit.
+        pending (dict): The queued jobs, by the name of the file they generate.
+        history (dict): Every job taken from the queue, by the name of the file it generates.
+    """
+
+    def __init__(self, jobs=None, cache=None, run_times=None, job_slots=None):
+        self.jobs = jobs if jobs else (os.cpu_count() or 1)
+        self.cache = cache
+        self.run_times = run_times
+        self.plan = None
+        self.job_slots = job_slots
+        self.pending = {}
+        self.history = {}
+
+    def submit(self, job):
+        """
+        Queues a job, unless another job already generates the same file.
+
+        Args:
+            job (GeneratorJob): The job to queue.
+        """
+        if job.file_name not in self.pending:
+            self.pending[job.file_name] = job
+
+    def take_pending(self):
+        """
+        Removes and returns all the queued jobs.
+
+        Returns:
+            list: The queued jobs, in the order they were submitted.
+        """
+        jobs = list(self.pending.values())
+        self.history.update(self.pending)
+        self.pending = {}
+        return jobs
+
+    def run(self, jobs):
+        """
+        Runs the given jobs, at most `self.jobs` at a time.
+
+        When more than one job runs concurrently the output of each script is captured and replayed
+        in submission order once every job has finished. Python plugins are called in the worker
+        interpreters of `vs_plugins` instead of running their script. Under a GNU Make jobserver,
+        each concurrent job also waits for a job slot, and jobs running one at a time use the slot
+        make runs vs_build in.
+
+        Args:
+            jobs (list): The jobs to run.
+        """
+        # The scripts write to the standard output too
+        flush_log()
+        if self.jobs == 1 or len(jobs) == 1:
+            for job in jobs:
+                start = time.perf_counter()
+                if is_plugin(job.script_path):
+                    self._run_plugin(job)
+                    job.duration = time.perf_counter() - start
+                    _print_output([job])
+                    continue
+                with span(os.path.basename(job.script_path), "generator", _span_args(job)):
+                    job.returncode = subprocess.run(
+                        job.arguments, input=job.input, env=_environment(job)
+                    ).returncode
+                job.duration = time.perf_counter() - start
+        else:
+
+            def run_job(job):
+                with self.job_slots.slot() if self.job_slots is not None else nullcontext():
+                    start = time.perf_counter()
+                    if is_plugin(job.script_path):
+                        self._run_plugin(job)
+                    else:
+                        _run_captured(job)
+                    job.duration = time.perf_counter() - start
+
+            with ThreadPoolExecutor(max_workers=min(self.jobs, len(jobs))) as pool:
+                list(pool.map(run_job, jobs))
+            _print_output(jobs)
+        if self.run_times is not None:
+            for job in jobs:
+                # The requests of a batch share the duration of its call
+                members = job.batch if job.batch is not None else [job]
+                for member in members:
+                    self.run_times.record(member.script_path, job.duration / len(members))
+
+    def _run_plugin(self, job):
+        """
+        Runs a job whose script is a Python plugin, capturing its output.
+
+        Args:
+            job (GeneratorJob): The job to run.
+        """
+        trace_args = dict(_span_args(job), plugin=True)
+        with span(os.path.basename(job.script_path), "generator", trace_args):
+            run_plugin(job, self.jobs)
+
+
+def _print_output(jobs):
+    """
+    Prints the captured output of jobs, in order.
+
+    Args:
+        jobs (list): The jobs that ran.
+    """
+    for job in jobs:
+        sys.stdout.write(job.stdout.decode(errors="replace"))
+        sys.stderr.write(job.stderr.decode(errors="replace"))
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+def _run_captured(job):
+    """
+    Runs a job capturing its output.
+
+    Args:
+        job (GeneratorJob): The job to run.
+    """
+    with span(os.path.basename(job.script_path), "generator", _span_args(job)):
+        result = subprocess.run(
+            job.arguments, input=job.input, capture_output=True, env=_environment(job)
+        )
+    job.returncode = result.returncode
+    job.stdout = result.stdout
+    job.stderr = result.stderr
+
+
+def _environment(job):
+    """
+    Returns the environment a job runs with.
+
+    Args:
+        job (GeneratorJob): The job.
+
+    Returns:
+        dict or None: The environment of vs_build with VS_OUTPUT_DIR set to the output directory
+            of the job, and VS_BATCH set if it is a batch, or None to inherit the environment.
+    """
+    environment = None
+    if job.output_directory is not None:
+        environment = dict(os.environ, VS_OUTPUT_DIR=job.output_directory)
+    if job.batch is not None:
+        environment = dict(environment or os.environ, VS_BATCH="1")
+    return environment
+
+
+def supports_batches(script_path):
+    """
+    Checks whether a generator script accepts several requests in one call.
+
+    A script declares it with the word VS_BATCH in its first 4 KB, usually in a comment.
+
+    Args:
+        script_path (str): Path to the script.
+
+    Returns:
+        bool: True if the script supports batches.
+    """
+    try:
+        status = os.stat(script_path)
+    except OSError:
+        return False
+    signature = (status.st_mtime_ns, status.st_size)
+    checked = _batch_scripts.get(script_path)
+    if checked is None or checked[0] != signature:
+        with open(script_path, "rb") as file:
+            head = file.read(_BATCH_MARKER_SEARCH_SIZE)
+        checked = (signature, _BATCH_MARKER.search(head) is not None)
+        _batch_scripts[script_path] = checked
+    return checked[1]
+
+
+def batch_jobs(jobs):
+    """
+    Groups the jobs of scripts supporting batches into one call per script.
+
+    A batch is run as `<script> <vs_build arguments>`, with VS_BATCH=1 in its environment and a
+    JSON manifest on its standard input:
+    {"arguments": [...], "requests": [{"file", "suffix", "comment", "callee"}, ...]}
+    with one request for each job, holding the arguments the job would run the script with.
+    Python plugins are not batched, calling them is already cheap.
+
+    Args:
+        jobs (list): The jobs to run.
+
+    Returns:
+        list: The jobs to run, where the jobs of each script supporting batches are replaced by a
+            single batch job in place of the first of them.
+    """
+    jobs_by_script = {}
+    for job in jobs:
+        jobs_by_script.setdefault(job.script_path, []).append(job)
+    grouped = []
+    for job in jobs:
+        members = jobs_by_script[job.script_path]
+        if len(members) == 1 or is_plugin(job.script_path) or not supports_batches(job.script_path):
+            grouped.append(job)
+        elif members[0] is job:
+            grouped.append(_batch_job(members))
+    return grouped
+
+
+def _batch_job(members):
+    """
+    Creates the job running the requests of several jobs in one call to their script.
+
+    Args:
+        members (list): The jobs of the batch, all of the same script.
+
+    Returns:
+        GeneratorJob: The batch job.
+    """
+    script_path = members[0].script_path
+    arguments = members[0].arguments[4:]
+    manifest = {
+        "arguments": arguments,
+        "requests": [
+            {
+                "file": member.file_name,
+                "suffix": member.arguments[1],
+                "comment": member.arguments[2],
+                "callee": member.arguments[3],
+            }
+            for member in members
+        ],
+    }
+    job = GeneratorJob(
+        ", ".join(member.file_name for member in members),
+        script_path,
+        [script_path] + arguments,
+        None,
+    )
+    job.batch = members
+    job.input = json.dumps(manifest).encode()
+    return job
+
+
+def _span_args(job):
+    """
+    Returns the details of a job shown in the build trace.
+
+    Args:
+        job (GeneratorJob): The job.
+
+    Returns:
+        dict: The script path, its arguments and the file it generates.
+    """
+    return {"script": job.script_path, "arguments": job.arguments[1:], "file": job.file_name}
@@ -0,0 +1,358 @@
+"""This module lets vs_build serve build requests from a long-lived process on a Unix domain socket, and provides the thin client sending them."""
+
+import json
+import os
+import re
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from .vs_colours import ERROR, INFO, WARNING, flush_log, vs_print
+from .vs_plugins import prepare_plugins
+
+# Frame types sent by the server: output of the build, then its exit code
+_STDOUT = b"1"
+_STDERR = b"2"
+_EXIT = b"x"
+_HEADER = struct.Struct(">cI")
+# Process id, user id and group id of the process at the other end of a socket
+_PEER_CREDENTIALS = struct.Struct("3i")
+
+
+def default_socket_path():
+    """
+    Returns the path of the socket used when none is given with "--socket=<path>".
+
+    Returns:
+        str: A per-user socket path in the runtime directory, or in a private directory of the
+            temporary directory.
+    """
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_directory:
+        return os.path.join(runtime_directory, f"vs_build-{os.getuid()}.sock")
+    return os.path.join(_private_directory(), "server.sock")
+
+
+def _private_directory():
+    """
+    Returns the directory of the default socket outside of the runtime directory.
+
+    Returns:
+        str: A directory of the temporary directory, named after the user.
+    """
+    return os.path.join(tempfile.gettempdir(), f"vs_build-{os.getuid()}")
+
+
+def _check_socket_directory(socket_path, create=False):
+    """
+    Checks that nobody else can reach the default socket through its directory.
+
+    Its name is predictable, another user could create it first. Other socket paths are left to
+    the user choosing them, the peer of every connection is checked anyway.
+
+    Args:
+        socket_path (str): Path of the socket.
+        create (bool, optional): Creates the directory if it does not exist.
+
+    Raises:
+        OSError: If the directory is not a directory owned by the user and private to them.
+    """
+    directory = os.path.dirname(socket_path)
+    if directory != _private_directory():
+        return
+    if create:
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    directory_stat = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(directory_stat.st_mode)
+        or directory_stat.st_uid != os.getuid()
+        or directory_stat.st_mode & 0o077
+    ):
+        raise PermissionError(f"{directory} is not a directory only its owner, user {os.getuid()}, can access")
+
+
+def _peer_uid(connection):
+    """
+    Returns the user id of the process at the other end of a connection.
+
+    Args:
+        connection (socket.socket): A connected Unix domain socket.
+
+    Returns:
+        int or None: The user id, or None if the platform does not tell.
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _PEER_CREDENTIALS.size)
+    return _PEER_CREDENTIALS.unpack(credentials)[1]
+
+
+def parse_socket_path(arguments):
+    """
+    Finds the socket path given in the arguments.
+
+    Args:
+        arguments (list): The command-line arguments.
+
+    Returns:
+        str: The path given with "--socket=<path>", or the default socket path.
+    """
+    for argument in arguments:
+        socket_argument = re.match(r'^--socket="?(.+?)"?$', argument)
+        if socket_argument:
+            return os.path.abspath(socket_argument.group(1))
+    return default_socket_path()
+
+
+def serve_builds(socket_path, handle_request):
+    """
+    Serves build requests on a Unix domain socket until interrupted.
+
+    Requests are handled one at a time, in the order they arrive: a build changes the working
+    directory, the arguments and the output of the whole process, so two builds can never
+    overlap, whether or not they are for the same project.
+
+    Args:
+        socket_path (str): Path of the socket to listen on.
+        handle_request (callable): Called with the project directory of each request, once the
+            working directory and sys.argv are set for it. Its output is sent to the client.
+    """
+    try:
+        _check_socket_directory(socket_path, create=True)
+    except OSError as e:
+        vs_print(ERROR, f"Cannot serve builds on {socket_path}. {e}")
+        exit(1)
+    if os.path.exists(socket_path):
+        if _is_served(socket_path):
+            vs_print(ERROR, f"Another vs_build server is already listening on {socket_path}.")
+            exit(1)
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The socket is created private, other users cannot connect before the chmod
+    saved_umask = os.umask(0o077)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(saved_umask)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+    prepare_plugins()
+    vs_print(INFO, f"Serving builds on {socket_path}, press Ctrl+C to stop.")
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                peer_uid = _peer_uid(connection)
+                if peer_uid is not None and peer_uid != os.getuid():
+                    vs_print(WARNING, f"Refused a build request from user {peer_uid}.")
+                    continue
+                _serve_connection(connection, handle_request)
+    except KeyboardInterrupt:
+        vs_print(INFO, "Stopped serving builds.")
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def _is_served(socket_path):
+    """
+    Checks whether a server is listening on a socket.
+
+    Args:
+        socket_path (str): Path of the socket.
+
+    Returns:
+        bool: True if a connection to the socket succeeds.
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def _serve_connection(connection, handle_request):
+    """
+    Runs the build requested on a connection, sending it the build output and exit code.
+
+    Args:
+        connection (socket.socket): The client connection.
+        handle_request (callable): The request handler, see `serve_builds`.
+    """
+    try:
+        request = json.loads(connection.makefile("rb").readline())
+    except (OSError, ValueError):
+        return
+    saved_directory = os.getcwd()
+    saved_arguments = sys.argv
+    saved_environment = dict(os.environ)
+    exit_code = 0
+    with _redirect_output(connection):
+        try:
+            os.chdir(request["cwd"])
+            sys.argv = ["vs_build"] + request["argv"]
+            os.environ.clear()
+            os.environ.update(request.get("env", saved_environment))
+            handle_request(request["cwd"])
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                exit_code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except Exception as e:
+            vs_print(ERROR, f"The build failed: {e!r}")
+            exit_code = 1
+        finally:
+            sys.argv = saved_arguments
+            os.environ.clear()
+            os.environ.update(saved_environment)
+            os.chdir(saved_directory)
+    try:
+        connection.sendall(_HEADER.pack(_EXIT, 4) + struct.pack(">i", exit_code))
+    except OSError:
+        pass
+
+
+@contextmanager
+def _redirect_output(connection):
+    """
+    Sends everything written to the standard output and error of the process to a client.
+
+    The file descriptors themselves are redirected, so the output of the generator scripts run by
+    the build is sent too.
+
+    Args:
+        connection (socket.socket): The client connection.
+    """
+    send_lock = threading.Lock()
+    flush_log()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_descriptors = [os.dup(1), os.dup(2)]
+    relays = []
+    for descriptor, frame_type in [(1, _STDOUT), (2, _STDERR)]:
+        read_end, write_end = os.pipe()
+        os.dup2(write_end, descriptor)
+        os.close(write_end)
+        relay = threading.Thread(
+            target=_relay_output, args=(read_end, frame_type, connection, send_lock)
+        )
+        relay.start()
+        relays.append(relay)
+    try:
+        yield
+    finally:
+        flush_log()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_descriptors[0], 1)
+        os.dup2(saved_descriptors[1], 2)
+        for descriptor in saved_descriptors:
+            os.close(descriptor)
+        for relay in relays:
+            relay.join()
+
+
+def _relay_output(read_end, frame_type, connection, send_lock):
+    """
+    Sends what is written to a pipe to the client, until the pipe is closed.
+
+    Args:
+        read_end (int): File descriptor of the read end of the pipe.
+        frame_type (bytes): Type of the frames sent.
+        connection (socket.socket): The client connection.
+        send_lock (threading.Lock): Lock keeping the frames of both pipes apart.
+    """
+    connected = True
+    with os.fdopen(read_end, "rb", buffering=0) as pipe:
+        for data in iter(lambda: pipe.read(65536), b""):
+            if not connected:
+                continue
+            try:
+                with send_lock:
+                    connection.sendall(_HEADER.pack(frame_type, len(data)) + data)
+            except OSError:
+                # The client went away, keep draining the pipe so the build is not blocked
+                connected = False
+
+
+def request_build(socket_path, current_directory, arguments):
+    """
+    Sends a build request to a vs_build server and writes its output as it arrives.
+
+    The request carries the environment of the client, it is only sent to a server run by the
+    same user.
+
+    Args:
+        socket_path (str): Path of the server socket.
+        current_directory (str): The project directory.
+        arguments (list): The vs_build arguments.
+
+    Returns:
+        int or None: The exit code of the build, or None if no server of the user is listening.
+    """
+    try:
+        _check_socket_directory(socket_path)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        vs_print(WARNING, f"Not using the vs_build server on {socket_path}. {e}")
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        peer_uid = _peer_uid(connection)
+    except OSError:
+        connection.close()
+        return None
+    if peer_uid is not None and peer_uid != os.getuid():
+        connection.close()
+        vs_print(WARNING, f"Not using the vs_build server on {socket_path}, it is run by user {peer_uid}.")
+        return None
+    with connection:
+        request = {"cwd": current_directory, "argv": arguments, "env": dict(os.environ)}
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        stream = connection.makefile("rb")
+        while True:
+            header = stream.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                vs_print(ERROR, "The vs_build server closed the connection.")
+                return 1
+            frame_type, length = _HEADER.unpack(header)
+            data = stream.read(length)
+            if frame_type == _EXIT:
+                return struct.unpack(">i", data)[0]
+            output = sys.stdout if frame_type == _STDOUT else sys.stderr
+            output.buffer.write(data)
+            output.buffer.flush()
+
+
+def client_main():
+    """
+    Thin client for a vs_build server, taking the same arguments as vs_build.
+
+    If no server is listening, the build runs in this process instead, and so does `--help`.
+    """
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--socket=")]
+    exit_code = None
+    if arguments and arguments[0] != "--help":
+        exit_code = request_build(parse_socket_path(sys.argv[1:]), os.getcwd(), arguments)
+    if exit_code is None:
+        from .vs_build import main
+
+        sys.argv = sys.argv[:1] + arguments
+        main()
+        return
+    exit(exit_code)
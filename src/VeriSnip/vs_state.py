@@ -0,0 +1,274 @@
+"""This module keeps the state of the previous builds of a project in a SQLite database under its build directory: the outputs and what they were written from, the generated files of each target and the stamps vs_build skips an unchanged build with."""
+
+import json
+import os
+import sqlite3
+import threading
+
+from .vs_colours import WARNING, vs_print
+
+STATE_FILE = ".vs_state.db"
+
+# Version of the tables, a database with another version is emptied
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT PRIMARY KEY,
+    target TEXT,
+    source TEXT,
+    script TEXT,
+    sha256 TEXT,
+    size INTEGER,
+    mtime INTEGER
+);
+CREATE TABLE IF NOT EXISTS generated (
+    path TEXT NOT NULL,
+    target TEXT NOT NULL,
+    script TEXT,
+    PRIMARY KEY (path, target)
+);
+CREATE TABLE IF NOT EXISTS stamps (
+    target TEXT PRIMARY KEY,
+    stamp TEXT NOT NULL
+);
+"""
+
+
+class BuildState:
+    """
+    The state of the previous builds of a project, kept in build/.vs_state.db.
+
+    A target is the directory one vs_build invocation builds into, "build" or "build/<name>" with
+    --build_dir. For each output the database keeps the digest, size and modification time it was
+    written with, the target it belongs to, the file it was written from and the script that
+    generated that file, if any. It also keeps the files each target used from the generated
+    directory, and a stamp of each target: the arguments it was built with and the size and
+    modification time of every file it read or wrote.
+
+    Paths are stored relative to the project directory. The outputs are written from several
+    threads, every access holds a lock.
+    """
+
+    def __init__(self, current_directory):
+        self.current_directory = current_directory
+        self.path = os.path.join(current_directory, "build", STATE_FILE)
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def open(self):
+        """
+        Opens the database, creating it if needed.
+
+        Raises:
+            OSError, sqlite3.Error: If the database cannot be opened.
+        """
+        with self._lock:
+            self._connect()
+
+    def _connect(self):
+        """
+        Opens the database if it is not open yet. The caller holds the lock.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != _SCHEMA_VERSION:
+                connection.executescript(
+                    "DROP TABLE IF EXISTS outputs; DROP TABLE IF EXISTS generated; DROP TABLE IF EXISTS stamps;"
+                )
+                connection.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _relative(self, path):
+        """
+        Returns a path as it is stored, relative to the project directory.
+        """
+        return os.path.relpath(path, self.current_directory)
+
+    def _absolute(self, path):
+        """
+        Returns the absolute path of a stored path.
+        """
+        return os.path.join(self.current_directory, path)
+
+    def output_hashes(self, build_dir):
+        """
+        Returns the digests recorded for the outputs of a build directory.
+
+        Args:
+            build_dir (str): Path to the build directory.
+
+        Returns:
+            dict: Digest, size and modification time of each output, by file name.
+        """
+        directory = self._relative(build_dir)
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path, sha256, size, mtime FROM outputs WHERE sha256 IS NOT NULL"
+            ).fetchall()
+        return {
+            os.path.basename(path): {"sha256": sha256, "size": size, "mtime": mtime}
+            for path, sha256, size, mtime in rows
+            if os.path.dirname(path) == directory
+        }
+
+    def save_output_hashes(self, build_dir, output_hashes):
+        """
+        Records the digests of the outputs of a build directory.
+
+        Args:
+            build_dir (str): Path to the build directory.
+            output_hashes (dict): Digest, size and modification time of each output, by file name.
+        """
+        rows = [
+            (self._relative(os.path.join(build_dir, file_name)), record["sha256"], record["size"], record["mtime"])
+            for file_name, record in output_hashes.items()
+        ]
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(
+                    "INSERT INTO outputs (path, sha256, size, mtime) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(path) DO UPDATE SET sha256=excluded.sha256, size=excluded.size, mtime=excluded.mtime",
+                    rows,
+                )
+
+    def record_outputs(self, target, outputs):
+        """
+        Records the outputs a target wrote, and forgets those it no longer writes.
+
+        Args:
+            target (str): Path to the target directory.
+            outputs (dict): The (source path, generating script path or None) of each output, by path.
+
+        Returns:
+            list: Paths of the outputs the target wrote before and no longer writes.
+        """
+        target = self._relative(target)
+        rows = [
+            (
+                self._relative(output_path),
+                target,
+                self._relative(source_path),
+                self._relative(script_path) if script_path is not None else None,
+            )
+            for output_path, (source_path, script_path) in outputs.items()
+        ]
+        current = {row[0] for row in rows}
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                recorded = connection.execute(
+                    "SELECT path FROM outputs WHERE target = ?", (target,)
+                ).fetchall()
+                stale = [path for (path,) in recorded if path not in current]
+                connection.executemany("DELETE FROM outputs WHERE path = ?", [(path,) for path in stale])
+                connection.executemany(
+                    "INSERT INTO outputs (path, target, source, script) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(path) DO UPDATE SET target=excluded.target, source=excluded.source, script=excluded.script",
+                    rows,
+                )
+        return [self._absolute(path) for path in stale]
+
+    def record_generated(self, target, generated_files):
+        """
+        Records the generated files a target used, replacing those it used before.
+
+        Args:
+            target (str): Path to the target directory.
+            generated_files (dict): The path of the script that generated each file, or None if
+                unknown, by file path.
+
+        Returns:
+            list: Paths of the generated files the target used before that no target uses now.
+                Files never recorded are not listed.
+        """
+        target = self._relative(target)
+        rows = [
+            (self._relative(file_path), target, self._relative(script_path) if script_path else None)
+            for file_path, script_path in generated_files.items()
+        ]
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                recorded = connection.execute(
+                    "SELECT path FROM generated WHERE target = ?", (target,)
+                ).fetchall()
+                connection.execute("DELETE FROM generated WHERE target = ?", (target,))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO generated (path, target, script) VALUES (?, ?, ?)", rows
+                )
+                used = {path for (path,) in connection.execute("SELECT DISTINCT path FROM generated")}
+        return [self._absolute(path) for (path,) in recorded if path not in used]
+
+    def stamp(self, target):
+        """
+        Returns the stamp of the last build of a target.
+
+        Args:
+            target (str): Path to the target directory.
+
+        Returns:
+            dict or None: The stamp given to `set_stamp`, or None if the target has none.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT stamp FROM stamps WHERE target = ?", (self._relative(target),)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set_stamp(self, target, stamp):
+        """
+        Records the stamp of a target, or forgets it.
+
+        Args:
+            target (str): Path to the target directory.
+            stamp (dict or None): The stamp, any JSON serialisable dictionary, or None to forget it.
+        """
+        with self._lock:
+            connection = self._connect()
+            if stamp is None:
+                connection.execute("DELETE FROM stamps WHERE target = ?", (self._relative(target),))
+            else:
+                connection.execute(
+                    "INSERT OR REPLACE INTO stamps (target, stamp) VALUES (?, ?)",
+                    (self._relative(target), json.dumps(stamp)),
+                )
+
+    def close(self):
+        """
+        Closes the database, it is opened again by the next access.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def open_state(current_directory):
+    """
+    Opens the build state of a project.
+
+    Args:
+        current_directory (str): The project directory.
+
+    Returns:
+        BuildState or None: The state, or None if the database cannot be opened.
+    """
+    state = BuildState(current_directory)
+    try:
+        state.open()
+    except (OSError, sqlite3.Error) as e:
+        vs_print(WARNING, f"Could not open the build state {state.path}, every output is checked. {e}")
+        return None
+    return state
@@ -0,0 +1,125 @@
+"""This module records how long each stage of a build takes, for `vs_build --profile`."""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from .vs_colours import OK, vs_print
+
+# Returned by `span` while not tracing, entering and leaving it does nothing
+_NOT_TRACING = nullcontext()
+
+_events = None
+
+
+class _Span:
+    """
+    A traced interval, recorded when its `with` block ends.
+    """
+
+    __slots__ = ("events", "name", "category", "args", "begin")
+
+    def __init__(self, events, name, category, args):
+        self.events = events
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.begin = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exception):
+        end = time.perf_counter_ns()
+        self.events.append(
+            (self.name, self.category, self.args, self.begin, end - self.begin, threading.get_ident())
+        )
+        return False
+
+
+def span(name, category, args=None):
+    """
+    Returns a context manager tracing the time spent in its `with` block.
+
+    Args:
+        name (str): Name of the span, for example the file being analysed.
+        category (str): The kind of work, for example "stage" or "analyse".
+        args (dict, optional): Details shown with the span in the trace viewer.
+
+    Returns:
+        The span, or a context manager doing nothing if tracing is off.
+    """
+    if _events is None:
+        return _NOT_TRACING
+    return _Span(_events, name, category, args)
+
+
+def start_tracing():
+    """
+    Starts recording spans, discarding any recorded before.
+    """
+    global _events
+    _events = []
+
+
+def stop_tracing(trace_path, top=20):
+    """
+    Stops recording spans, writes them as a Chrome trace and prints a summary.
+
+    The trace uses the Trace Event Format, it can be opened with chrome://tracing or Perfetto.
+
+    Args:
+        trace_path (str): Path of the trace file.
+        top (int, optional): Number of slowest spans listed in the summary.
+    """
+    global _events
+    events = _events
+    _events = None
+    if events is None:
+        return
+    events = sorted(events, key=lambda event: event[3])
+    start = events[0][3] if events else 0
+    thread_numbers = {}
+    for event in events:
+        thread_numbers.setdefault(event[5], len(thread_numbers) + 1)
+
+    trace_events = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": number,
+            "args": {"name": "main" if number == 1 else f"worker {number - 1}"},
+        }
+        for number in thread_numbers.values()
+    ]
+    for name, category, args, begin, duration, thread in events:
+        trace_event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (begin - start) / 1000,
+            "dur": duration / 1000,
+            "pid": os.getpid(),
+            "tid": thread_numbers[thread],
+        }
+        if args:
+            trace_event["args"] = args
+        trace_events.append(trace_event)
+    os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+    with open(trace_path, "w") as file:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
+
+    totals = {}
+    for _, category, _, _, duration, _ in events:
+        count, total = totals.get(category, (0, 0))
+        totals[category] = (count + 1, total + duration)
+    lines = [f"Wrote the trace of {len(events)} spans to {trace_path}.", "Time by kind of span (stages include the spans inside them):"]
+    for category, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        lines.append(f"  {total / 1e6:10.1f} ms  {category} ({count} spans)")
+    lines.append(f"Slowest {min(top, len(events))} spans:")
+    for name, category, _, _, duration, _ in sorted(events, key=lambda event: -event[4])[:top]:
+        lines.append(f"  {duration / 1e6:10.1f} ms  {category}: {name}")
+    vs_print(OK, "\n".join(lines))
@@ -0,0 +1,46 @@
+"""This module detects changes to the project files, for vs_build to rebuild the project while watching it."""
+
+import os
+
+# Seconds between two checks of the project files
+POLL_INTERVAL = 0.5
+
+
+class FileWatcher:
+    """
+    Detects the files that changed between two polls, by their modification time and size.
+
+    Polling only needs a stat call per file, works on every platform and file system, and the
+    directories are already checked for added and removed files by `ProjectIndex`.
+    """
+
+    def __init__(self):
+        self._stats = {}
+
+    def poll(self, file_paths):
+        """
+        Checks the given files against the previous poll.
+
+        Args:
+            file_paths (iterable): Paths of the files to watch.
+
+        Returns:
+            tuple: The paths of the files that changed, were added and were removed since the previous poll.
+        """
+        stats = {}
+        changed_files = []
+        added_files = []
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            stats[file_path] = (stat.st_mtime_ns, stat.st_size)
+            previous = self._stats.get(file_path)
+            if previous is None:
+                added_files.append(file_path)
+            elif previous != stats[file_path]:
+                changed_files.append(file_path)
+        removed_files = [file_path for file_path in self._stats if file_path not in stats]
+        self._stats = stats
+        return changed_files, added_files, removed_files
@@ -0,0 +1,35 @@
+"""Fixtures shared by the tests, including the helpers of the scanner benchmark."""
+
+import importlib.util
+import os
+
+import pytest
+
+BENCH_SCANNER = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "bench_scanner.py")
+
+
+@pytest.fixture(scope="session")
+def bench_scanner():
+    """
+    The scanner benchmark, loaded from its file: the benchmarks are scripts, not a package.
+    """
+    spec = importlib.util.spec_from_file_location("bench_scanner", BENCH_SCANNER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def legacy_scan(bench_scanner):
+    """
+    Extracts the facts of a file with the regular expressions vs_build used before its scanner.
+    """
+    return bench_scanner.legacy_scan
+
+
+@pytest.fixture(scope="session")
+def synthetic_netlist(bench_scanner):
+    """
+    Generates a flat Verilog netlist of roughly the given size.
+    """
+    return bench_scanner.synthetic_netlist
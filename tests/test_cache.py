@@ -0,0 +1,158 @@
+"""Tests of the generator cache, of the artifact store shared by many vs_build processes and of the parse cache."""
+
+import os
+
+import pytest
+
+from VeriSnip.vs_cache import ArtifactStore, GeneratorCache, ParseCache
+from VeriSnip.vs_scan import scan_verilog, scan_verilog_file
+from VeriSnip.vs_scheduler import GeneratorJob
+
+
+@pytest.fixture
+def script(tmp_path):
+    """
+    A generator script with a data file next to it.
+    """
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    (scripts / "regs.py").write_text("#!/usr/bin/env python3\nprint('regs')\n")
+    (scripts / "regs.txt").write_text("A\n")
+    return scripts / "regs.py"
+
+
+def job(script, suffix="a.vs", *arguments, parameters=None):
+    """
+    Creates the job of a call to the script.
+    """
+    return GeneratorJob(
+        f"regs_{suffix}", str(script), [str(script), suffix, "", "top.v", *arguments], "top.v", parameters
+    )
+
+
+def generate(tmp_path, name, content):
+    """
+    Writes a file as if a script generated it.
+
+    Returns:
+        str: Path of the file.
+    """
+    output_directory = tmp_path / "output"
+    output_directory.mkdir(exist_ok=True)
+    (output_directory / name).write_text(content)
+    return str(output_directory / name)
+
+
+def test_miss_then_hit(tmp_path, script):
+    cache = GeneratorCache(str(tmp_path / "cache"))
+    generated = tmp_path / "generated"
+    generated.mkdir()
+    assert cache.restore(job(script), str(generated)) is None
+
+    cache.store(job(script), [generate(tmp_path, "regs_a.vs", "// A\n")])
+    assert cache.restore(job(script), str(generated)) == [str(generated / "regs_a.vs")]
+    assert (generated / "regs_a.vs").read_text() == "// A\n"
+    # The entry is found by another cache instance too, a call with other arguments is not
+    assert GeneratorCache(str(tmp_path / "cache")).lookup(job(script)) is not None
+    assert cache.lookup(job(script, "b.vs")) is None
+
+
+def test_key_follows_the_call(tmp_path, script):
+    cache = GeneratorCache(str(tmp_path / "cache"))
+    key = cache.key(job(script))
+    assert cache.key(job(script, "b.vs")) != key
+    assert cache.key(job(script, "a.vs", "WIDTH=8")) != key
+    # Options that do not change what the scripts generate are left out
+    assert cache.key(job(script, "a.vs", "--quiet", "-j", "4")) == key
+    # Plugins also receive the parameters of the requesting file
+    assert cache.key(job(script, parameters={"WIDTH": "8"})) != cache.key(job(script, parameters={"WIDTH": "16"}))
+
+    # The files next to the script are followed without forgetting the script
+    (script.parent / "regs.txt").write_text("B, C\n")
+    inputs_key = cache.key(job(script))
+    assert inputs_key != key
+    (script.parent / "template.v").write_text("module regs;\n")
+    assert cache.key(job(script)) != inputs_key
+
+    # The hash of the script itself is kept until the script is forgotten
+    inputs_key = cache.key(job(script))
+    script.write_text("#!/usr/bin/env python3\nprint('other regs')\n")
+    assert cache.key(job(script)) == inputs_key
+    cache.forget_script(str(script))
+    assert cache.key(job(script)) != inputs_key
+
+
+def test_without_lookups_the_entry_is_replaced(tmp_path, script):
+    generated = tmp_path / "generated"
+    generated.mkdir()
+    GeneratorCache(str(tmp_path / "cache")).store(job(script), [generate(tmp_path, "regs_a.vs", "// old\n")])
+
+    # Like with --no-cache, the entry is not used but the new files replace it
+    cache = GeneratorCache(str(tmp_path / "cache"), lookups=False)
+    assert cache.restore(job(script), str(generated)) is None
+    assert cache.lookup(job(script)) is None
+    cache.store(job(script), [generate(tmp_path, "regs_a.vs", "// new\n")])
+
+    GeneratorCache(str(tmp_path / "cache")).restore(job(script), str(generated))
+    assert (generated / "regs_a.vs").read_text() == "// new\n"
+
+
+def test_eviction_by_size_and_last_use(tmp_path, script):
+    cache = GeneratorCache(str(tmp_path / "cache"), max_size=250)
+    generated = tmp_path / "generated"
+    generated.mkdir()
+    for index, suffix in enumerate(["a.vs", "b.vs"]):
+        cache.store(job(script, suffix), [generate(tmp_path, f"regs_{suffix}", "x" * 100)])
+        os.utime(tmp_path / "cache" / cache.key(job(script, suffix)), (1000 + index, 1000 + index))
+
+    # Restoring an entry makes it the most recently used, the least recently used one is evicted
+    cache.restore(job(script, "a.vs"), str(generated))
+    cache.store(job(script, "c.vs"), [generate(tmp_path, "regs_c.vs", "x" * 100)])
+    assert cache.lookup(job(script, "a.vs")) is not None
+    assert cache.lookup(job(script, "b.vs")) is None
+    assert cache.lookup(job(script, "c.vs")) is not None
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted(
+        [cache.key(job(script, "a.vs")), cache.key(job(script, "c.vs"))]
+    )
+
+
+def test_store_publish_and_lookup(tmp_path, script):
+    store = ArtifactStore(str(tmp_path / "store"))
+    generated = tmp_path / "generated"
+    generated.mkdir()
+    GeneratorCache(str(tmp_path / "first"), shared=store).store(
+        job(script), [generate(tmp_path, "regs_a.vs", "// A\n")]
+    )
+    # The first process to publish an entry wins
+    store.store(job(script), [generate(tmp_path, "regs_a.vs", "// other\n")])
+    assert store.published == 1
+
+    # Another process misses in its own cache, restores from the store and keeps a copy
+    other_store = ArtifactStore(str(tmp_path / "store"))
+    cache = GeneratorCache(str(tmp_path / "second"), shared=other_store)
+    assert cache.restore(job(script, "b.vs"), str(generated)) is None
+    assert cache.restore(job(script), str(generated)) == [str(generated / "regs_a.vs")]
+    assert (generated / "regs_a.vs").read_text() == "// A\n"
+    assert (other_store.hits, other_store.misses) == (1, 1)
+    assert GeneratorCache(str(tmp_path / "second")).lookup(job(script)) is not None
+
+
+def test_store_removes_stale_leftovers_only(tmp_path):
+    store_directory = tmp_path / "store"
+    leftovers = [f"{'0' * 64}.tmphost-1", f"{'1' * 64}.evictedhost-2"]
+    for name in [*leftovers, "recent", f"{'2' * 64}.tmphost-3"]:
+        (store_directory / name).mkdir(parents=True)
+    for name in [*leftovers, "recent"]:
+        os.utime(store_directory / name, (1000, 1000))
+
+    ArtifactStore(str(store_directory))._load_entries()
+    # Leftovers of a process still publishing and other files of the directory are kept
+    assert sorted(os.listdir(store_directory)) == [f"{'2' * 64}.tmphost-3", "recent"]
+
+
+def test_parse_cache_decodes_like_the_scanner(tmp_path):
+    file_path = tmp_path / "latin1.v"
+    file_path.write_bytes("module top;\n  `include \"regs.vs\" // R\xe9GS\nendmodule\n".encode("latin-1"))
+    facts = ParseCache(str(tmp_path / "parse_cache.json")).facts(str(file_path), scan_verilog)
+    assert facts == scan_verilog_file(str(file_path))
+    assert facts["dependencies"] == [["regs.vs", " // R\ufffdGS"]]
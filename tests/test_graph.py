@@ -0,0 +1,143 @@
+"""Tests of the parameter scopes files are analysed in."""
+
+import pytest
+
+from VeriSnip import vs_build
+from VeriSnip.vs_graph import DependencyGraph, ParameterScope
+
+
+def test_scope_precedence():
+    scope = ParameterScope({"A": "inherited", "B": "inherited", "C": "inherited"}, {"C": "override"})
+    definitions = [["B", "definition"], ["C", "definition"], ["D", "definition"]]
+    assert scope.parameters(definitions) == {
+        "A": "inherited",
+        "B": "definition",
+        "C": "override",
+        "D": "definition",
+    }
+
+
+def test_equal_scopes_have_equal_keys():
+    assert ParameterScope({"A": "1", "B": "2"}, {"C": "3"}).key == ParameterScope({"B": "2", "A": "1"}, {"C": "3"}).key
+    assert ParameterScope({"A": "1"}, {}).key != ParameterScope({}, {"A": "1"}).key
+
+
+def test_take_scopes():
+    graph = DependencyGraph()
+    default = ParameterScope({}, {})
+    narrow = ParameterScope({}, {"WIDTH": "8"})
+    wide = ParameterScope({}, {"WIDTH": "16"})
+
+    # A file used in no scope is analysed once in the default scope
+    assert graph.take_scopes("rtl/other.v", default) == [default]
+    assert graph.take_scopes("rtl/other.v", default) == []
+
+    # A module is found by its name, a scope recorded twice is analysed once
+    graph.add_scope("sub", narrow)
+    graph.add_scope("sub", ParameterScope({}, {"WIDTH": "8"}))
+    graph.add_scope("sub", wide)
+    assert graph.take_new_scope_names() == {"sub"}
+    assert [scope.key for scope in graph.take_scopes("rtl/sub.v", default)] == [narrow.key, wide.key]
+    assert graph.take_scopes("rtl/sub.v", default) == []
+
+    # Only the scopes it was not analysed in yet are returned
+    wider = ParameterScope({}, {"WIDTH": "32"})
+    graph.add_scope("sub", wider)
+    assert graph.take_scopes("rtl/sub.v", default) == [wider]
+
+    # Forgetting a file analyses it again in every scope
+    graph.forget("rtl/sub.v")
+    assert len(graph.take_scopes("rtl/sub.v", default)) == 3
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    A project instantiating the same module twice with different parameters.
+    """
+    rtl = tmp_path / "rtl"
+    rtl.mkdir()
+    (rtl / "top.v").write_text(
+        """module top #(
+  parameter WIDTH = 4
+) ();
+  sub #(.WIDTH(8)) u_narrow (
+    .clk(clk)
+  );
+  sub #(.WIDTH(16)) u_wide (
+    .clk(clk)
+  );
+  sub u_default (
+    .clk(clk)
+  );
+endmodule
+"""
+    )
+    (rtl / "sub.v").write_text(
+        """module sub #(
+  parameter WIDTH = 1,
+  parameter DEPTH = 2
+) ();
+  leaf #(.SIZE(WIDTH)) u_leaf (
+    .clk(clk)
+  );
+  `include "sub_regs.vs" // {WIDTH}x{DEPTH}
+endmodule
+"""
+    )
+    (rtl / "leaf.v").write_text("module leaf #(\n  parameter SIZE = 1\n) ();\nendmodule\n")
+    (rtl / "sub_regs.vs").write_text("wire [{WIDTH}-1:0] regs;\n")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def analysed_parameters(project, monkeypatch, parameters):
+    """
+    Resolves the dependencies of the top module, recording the parameters each file is analysed with.
+
+    Returns:
+        dict: The sorted parameter values of each analysis, by file name.
+    """
+    analysed = {}
+    analyse_file = vs_build.analyse_file
+
+    def recording_analyse_file(current_directory, file_path, *arguments):
+        scope = arguments[-1]
+        facts = vs_build.scan_verilog_file(file_path)
+        values = scope.parameters(facts["parameter_definitions"])
+        analysed.setdefault(file_path.split("/")[-1], []).append(values)
+        return analyse_file(current_directory, file_path, *arguments)
+
+    monkeypatch.setattr(vs_build, "analyse_file", recording_analyse_file)
+    script_files, verilog_files = vs_build.find_existing_files(str(project), [])
+    vs_build.build_dependency_tree(
+        str(project), verilog_files, script_files, "top", parameters, DependencyGraph()
+    )
+    return analysed
+
+
+def test_module_analysed_in_each_scope(project, monkeypatch):
+    analysed = analysed_parameters(project, monkeypatch, {})
+    assert analysed["top.v"] == [{"WIDTH": "4"}]
+    # Instance overrides replace the definitions, the defaults apply where none is given
+    assert analysed["sub.v"] == [
+        {"WIDTH": "8", "DEPTH": "2"},
+        {"WIDTH": "16", "DEPTH": "2"},
+        {"WIDTH": "1", "DEPTH": "2"},
+    ]
+    # Parameters given by an instantiation are resolved in the scope of the instantiating file
+    assert [values["SIZE"] for values in analysed["leaf.v"]] == ["8", "16", "1"]
+    # A .vs file sees the parameters of the file including it
+    assert [(values["WIDTH"], values["DEPTH"]) for values in analysed["sub_regs.vs"]] == [
+        ("8", "2"),
+        ("16", "2"),
+        ("1", "2"),
+    ]
+
+
+def test_command_line_parameters_replace_every_value(project, monkeypatch):
+    analysed = analysed_parameters(project, monkeypatch, {"WIDTH": "32"})
+    assert analysed["top.v"] == [{"WIDTH": "32"}]
+    # Every instantiation now gives the same values, the module is analysed once
+    assert analysed["sub.v"] == [{"WIDTH": "32", "DEPTH": "2"}]
+    assert [values["SIZE"] for values in analysed["leaf.v"]] == ["32"]
@@ -0,0 +1,122 @@
+"""Tests of the client of the GNU Make jobserver, over a pipe standing for the one make shares."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from VeriSnip.vs_jobserver import JobServer, job_server
+
+TOKENS = 2
+
+
+@pytest.fixture
+def pipe():
+    """
+    A jobserver pipe holding the tokens of a `make -j3`: the slot of vs_build is implicit.
+    """
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"+" * TOKENS)
+    yield read_fd, write_fd
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def free_tokens(read_fd, write_fd):
+    """
+    Counts the tokens in the pipe, leaving them there.
+    """
+    os.set_blocking(read_fd, False)
+    try:
+        tokens = os.read(read_fd, 64)
+    except BlockingIOError:
+        tokens = b""
+    finally:
+        os.set_blocking(read_fd, True)
+    if tokens:
+        os.write(write_fd, tokens)
+    return len(tokens)
+
+
+def test_implicit_slot_then_tokens(pipe):
+    job_slots = JobServer(*pipe)
+    # The slot make runs vs_build in is taken first, without reading a token
+    assert job_slots.acquire() is None
+    assert free_tokens(*pipe) == TOKENS
+    tokens = [job_slots.acquire() for _ in range(TOKENS)]
+    assert tokens == [b"+"] * TOKENS
+    assert free_tokens(*pipe) == 0
+
+    for token in tokens:
+        job_slots.release(token)
+    assert free_tokens(*pipe) == TOKENS
+    job_slots.release(None)
+    assert job_slots.acquire() is None
+    assert free_tokens(*pipe) == TOKENS
+
+
+def test_slots_are_released_when_a_job_fails(pipe):
+    job_slots = JobServer(*pipe)
+    with pytest.raises(RuntimeError):
+        with job_slots.slot():
+            with job_slots.slot():
+                assert free_tokens(*pipe) == TOKENS - 1
+                raise RuntimeError("the script failed")
+    assert free_tokens(*pipe) == TOKENS
+    assert job_slots.acquire() is None
+
+
+def test_slots_limit_the_running_jobs(pipe):
+    job_slots = JobServer(*pipe)
+    lock = threading.Lock()
+    running = []
+    most_running = []
+
+    def run_job():
+        with job_slots.slot():
+            with lock:
+                running.append(None)
+                most_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=run_job) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(most_running) <= 1 + TOKENS
+    assert free_tokens(*pipe) == TOKENS
+
+
+def test_tokens_of_a_closed_client_are_dropped(pipe):
+    job_slots = JobServer(*pipe)
+    job_slots.acquire()
+    token = job_slots.acquire()
+    job_slots.close()
+    job_slots.release(token)
+    assert free_tokens(*pipe) == TOKENS - 1
+
+
+def test_connect_to_a_pipe(pipe):
+    makeflags = f" -j3 --jobserver-auth={pipe[0]},{pipe[1]}"
+    job_slots = job_server(makeflags)
+    assert job_slots is not None and job_slots.limit == 3
+    # The descriptors of a pipe are only usable by the processes make started
+    assert job_server(makeflags, inherited=False) is None
+    # Make disables the jobserver of recipes it does not consider make commands
+    assert job_server(" -j3 --jobserver-auth=-2,-2") is None
+    assert job_server(" -j3") is None
+
+
+def test_connect_to_a_fifo(tmp_path):
+    fifo_path = tmp_path / "jobserver"
+    os.mkfifo(fifo_path)
+    job_slots = job_server(f" -j2 --jobserver-auth=fifo:{fifo_path}", inherited=False)
+    assert job_slots is not None and job_slots.limit == 2
+    assert job_slots.acquire() is None
+    job_slots.release(None)
+    job_slots.close()
+    assert job_server(f" -j2 --jobserver-auth=fifo:{tmp_path / 'missing'}") is None
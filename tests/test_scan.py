@@ -0,0 +1,199 @@
+"""Tests of the single-pass Verilog scanner, against the regular expressions vs_build used before it."""
+
+import pytest
+
+from VeriSnip import vs_scan
+from VeriSnip.vs_scan import mapped_file, scan_verilog, scan_verilog_file
+
+LEGACY_FACTS = ["parameter_definitions", "parameter_instantiations", "dependencies"]
+
+# Comment-free module the old regular expressions read correctly
+PLAIN_MODULE = """module top #(
+  parameter WIDTH = 8,
+  parameter integer DEPTH = 4
+) (
+  input clk
+);
+  sub_d #(.WIDTH(WIDTH), .DEPTH(2)) u_d (
+    .clk(clk)
+  );
+  sub_e u_e (.clk(clk));
+  sub_d #(.WIDTH(16)) u_d2 (.clk(clk));
+  `include "regs.vs" // REGS {WIDTH}
+  `include "ios.vs" /*
+    first
+    second */
+  `include "plain.vs"
+endmodule
+"""
+
+
+def legacy_facts(legacy_scan, content):
+    """
+    Returns the facts the old regular expressions find, for the kinds they found.
+    """
+    return {kind: legacy_scan(content)[kind] for kind in LEGACY_FACTS}
+
+
+def scanner_facts(content):
+    """
+    Returns the facts the scanner finds, for the kinds the old regular expressions found.
+    """
+    return {kind: scan_verilog(content)[kind] for kind in LEGACY_FACTS}
+
+
+def test_plain_module_matches_legacy(legacy_scan):
+    assert scanner_facts(PLAIN_MODULE) == legacy_facts(legacy_scan, PLAIN_MODULE)
+
+
+@pytest.mark.parametrize("size, delays", [(64 * 1024, False), (8 * 1024, True)])
+def test_synthetic_netlist_matches_legacy(legacy_scan, synthetic_netlist, size, delays):
+    # The old regular expressions take quadratic time on delayed assignments
+    content = synthetic_netlist(size, delays)
+    assert scanner_facts(content) == legacy_facts(legacy_scan, content)
+
+
+def test_plain_module_facts():
+    facts = scan_verilog(PLAIN_MODULE)
+    assert facts["parameter_definitions"] == [["WIDTH", "8"], ["DEPTH", "4"]]
+    assert facts["parameter_instantiations"] == [["WIDTH", "WIDTH"], ["DEPTH", "2"], ["WIDTH", "16"]]
+    assert facts["instance_parameters"] == [
+        ["sub_d", [["WIDTH", "WIDTH"], ["DEPTH", "2"]]],
+        ["sub_e", []],
+        ["sub_d", [["WIDTH", "16"]]],
+    ]
+    # Instantiations first, then includes with a line argument, then includes with a block argument
+    assert facts["dependencies"] == [
+        ["sub_d", "u_d"],
+        ["sub_e", "u_e"],
+        ["regs.vs", " // REGS {WIDTH}"],
+        ["plain.vs", ""],
+        ["ios.vs", "\n    first\n    second "],
+    ]
+
+
+def test_comments_are_ignored():
+    content = """module top;
+  // sub_a u_line (.clk(clk));
+  /* sub_b u_block (
+       .clk(clk)
+     ); */
+  // `include "line.vs"
+  /*
+  `include "block.vs"
+  parameter HIDDEN = 1;
+  */
+  sub_c u_c (.clk(clk));
+endmodule
+"""
+    facts = scan_verilog(content)
+    assert facts["dependencies"] == [["sub_c", "u_c"]]
+    assert facts["parameter_definitions"] == []
+
+
+def test_comments_inside_an_instantiation():
+    content = """module top;
+  sub_a /* cell */ #( // parameters
+    .WIDTH(8) /* ) */
+  ) u_a /* instance */ (
+    .clk(clk)
+  );
+endmodule
+"""
+    facts = scan_verilog(content)
+    assert facts["dependencies"] == [["sub_a", "u_a"]]
+    assert facts["instance_parameters"] == [["sub_a", [["WIDTH", "8"]]]]
+
+
+def test_strings_do_not_start_comments():
+    content = """module top;
+  initial $display("/* \\" // ");
+  sub_a u_a (.clk(clk));
+  initial $display("*/");
+  sub_b #(.NAME("u_b (")) u_b (.clk(clk));
+endmodule
+"""
+    facts = scan_verilog(content)
+    assert facts["dependencies"] == [["sub_a", "u_a"], ["sub_b", "u_b"]]
+    assert facts["instance_parameters"] == [["sub_a", []], ["sub_b", [["NAME", '"u_b ("']]]]
+
+
+def test_delays_are_not_instantiations():
+    content = """module top;
+  assign #(2) n1 = n0;
+  always #5 clk = ~clk;
+  assign #(1, 2) n2 = n1;
+  sub_a #(.WIDTH(4)) u_a (.clk(clk));
+endmodule
+"""
+    facts = scan_verilog(content)
+    assert facts["dependencies"] == [["sub_a", "u_a"]]
+    assert facts["parameter_instantiations"] == [["WIDTH", "4"]]
+
+
+def test_include_arguments():
+    content = """module top;
+  `include "line.vs" // WIDTH=8 "quoted" /* not a block */
+  `include "block.vs" /* WIDTH=8
+    // not a line comment
+  */
+  `include "bare.vs"
+  `include "next.vs"
+  /* a block on the next line */
+endmodule
+"""
+    assert scan_verilog(content)["dependencies"] == [
+        ["line.vs", ' // WIDTH=8 "quoted" /* not a block */'],
+        ["bare.vs", ""],
+        ["block.vs", " WIDTH=8\n    // not a line comment\n  "],
+        # Like the old regular expressions, a block comment on the next line is the argument
+        ["next.vs", " a block on the next line "],
+    ]
+
+
+def test_include_on_the_first_line_is_not_found():
+    # Like the old regular expressions, includes are only found after a newline
+    assert scan_verilog('`include "first.vs"\n')["dependencies"] == []
+
+
+def test_repeated_instantiations_are_kept_once():
+    content = "module top;\n" + "".join(
+        f"  cell #(.INIT({index % 2})) u_{index} (.a(a));\n" for index in range(10)
+    ) + "endmodule\n"
+    facts = scan_verilog(content)
+    assert facts["dependencies"] == [["cell", "u_0"]]
+    assert facts["instance_parameters"] == [["cell", [["INIT", "0"]]], ["cell", [["INIT", "1"]]]]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_bytes_match_text(synthetic_netlist, newline):
+    content = (PLAIN_MODULE + synthetic_netlist(16 * 1024)).replace("\n", newline)
+    text = content.replace("\r\n", "\n")
+    assert scan_verilog(content.encode()) == scan_verilog(text)
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_large_files_are_mapped(tmp_path, monkeypatch, synthetic_netlist, newline):
+    content = PLAIN_MODULE + synthetic_netlist(256 * 1024)
+    file_path = tmp_path / "netlist.v"
+    file_path.write_bytes(content.replace("\n", newline).encode())
+    expected = scan_verilog(content)
+
+    assert scan_verilog_file(str(file_path)) == expected
+    with mapped_file(str(file_path)) as mapped:
+        assert scan_verilog(mapped) == expected
+
+    # Scanned from the memory map, releasing its pages as the scan moves on
+    monkeypatch.setattr(vs_scan, "LARGE_FILE_SIZE", 1024)
+    monkeypatch.setattr(vs_scan, "_RELEASE_INTERVAL", 64 * 1024)
+    assert scan_verilog_file(str(file_path)) == expected
+
+
+def test_invalid_utf8_is_replaced(tmp_path, monkeypatch):
+    # The same bytes are decoded alike, read as text or through a memory map
+    file_path = tmp_path / "latin1.v"
+    file_path.write_bytes(PLAIN_MODULE.replace("// REGS", "// R\xe9GS").encode("latin-1"))
+    expected = scan_verilog(PLAIN_MODULE.replace("// REGS", "// R\ufffdGS"))
+    assert scan_verilog_file(str(file_path)) == expected
+    monkeypatch.setattr(vs_scan, "LARGE_FILE_SIZE", 1)
+    assert scan_verilog_file(str(file_path)) == expected
@@ -0,0 +1,154 @@
+"""Tests of the state vs_build keeps of the previous builds of a project."""
+
+import os
+import sys
+import time
+
+import pytest
+
+from VeriSnip import vs_build
+from VeriSnip.vs_state import BuildState
+
+# Older than the racy interval, so the stamps of the builds are recorded
+PAST = time.time() - 60
+
+GENERATOR = """#!/usr/bin/env python3
+import os
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(here, "regs.txt")) as file:
+    value = file.read().strip()
+with open(os.path.join(os.environ["VS_OUTPUT_DIR"], f"regs_{sys.argv[1]}"), "w") as file:
+    file.write(f"// {value}\\n")
+"""
+
+TOP = """module top ();
+  `include "{include}" // REGS
+{instance}endmodule
+"""
+SUB_INSTANCE = """  sub u_sub (
+    .clk(clk)
+  );
+"""
+
+
+def write(path, content, mtime=PAST):
+    """
+    Writes a file of the project, dated in the past unless told otherwise.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    A project instantiating a module and including a file generated by a script reading a data file next to it.
+    """
+    write(tmp_path / "rtl" / "top.v", TOP.format(include="regs_a.vs", instance=SUB_INSTANCE))
+    write(tmp_path / "rtl" / "sub.v", "module sub ();\nendmodule\n")
+    write(tmp_path / "tb" / "top_tb.v", "module top_tb ();\n  top u_top ();\nendmodule\n")
+    write(tmp_path / "scripts" / "regs.py", GENERATOR)
+    os.chmod(tmp_path / "scripts" / "regs.py", 0o755)
+    write(tmp_path / "scripts" / "regs.txt", "A\n")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def build(project, monkeypatch, capsys, *arguments):
+    """
+    Builds the top module of the project.
+
+    Returns:
+        str: The standard output of the build.
+    """
+    capsys.readouterr()
+    monkeypatch.setattr(sys, "argv", ["vs_build", "top", "--quiet", *arguments])
+    vs_build.run_build(str(project))
+    return capsys.readouterr().out
+
+
+def generated(project):
+    """
+    Returns the content of the generated file.
+    """
+    return (project / "generated" / "regs_a.vs").read_text()
+
+
+def test_unchanged_build_is_skipped(project, monkeypatch, capsys):
+    assert "up to date" not in build(project, monkeypatch, capsys)
+    assert "up to date" in build(project, monkeypatch, capsys)
+
+
+def test_script_input_invalidates_the_stamp(project, monkeypatch, capsys):
+    build(project, monkeypatch, capsys)
+    assert generated(project) == "// A\n"
+
+    write(project / "scripts" / "regs.txt", "B\n", PAST + 1)
+    assert "up to date" not in build(project, monkeypatch, capsys)
+    assert generated(project) == "// B\n"
+
+
+def test_changed_build_is_not_skipped(project, monkeypatch, capsys):
+    build(project, monkeypatch, capsys)
+    assert "up to date" not in build(project, monkeypatch, capsys, "WIDTH=8")
+    assert "up to date" in build(project, monkeypatch, capsys, "WIDTH=8")
+
+    write(project / "rtl" / "sub.v", "module sub ();\n  wire unused;\nendmodule\n", PAST + 1)
+    assert "up to date" not in build(project, monkeypatch, capsys, "WIDTH=8")
+    assert "wire unused;" in (project / "build" / "RTL" / "sub.v").read_text()
+
+
+def test_files_no_longer_built_are_removed(project, monkeypatch, capsys):
+    build(project, monkeypatch, capsys)
+    assert (project / "build" / "RTL" / "sub.v").is_file()
+    # Files the state never recorded
+    write(project / "build" / "RTL" / "notes.v", "// notes\n")
+    write(project / "generated" / "hand.vs", "// hand made\n")
+
+    write(project / "rtl" / "top.v", TOP.format(include="regs_b.vs", instance=""), PAST + 1)
+    build(project, monkeypatch, capsys)
+    assert not (project / "build" / "RTL" / "sub.v").exists()
+    assert not (project / "build" / "deps" / "RTL" / "sub.v.d").exists()
+    assert not (project / "generated" / "regs_a.vs").exists()
+    assert (project / "generated" / "regs_b.vs").is_file()
+    assert (project / "build" / "RTL" / "notes.v").is_file()
+    assert (project / "generated" / "hand.vs").is_file()
+
+
+def test_generated_files_used_by_another_target_are_kept(project, monkeypatch, capsys):
+    build(project, monkeypatch, capsys)
+    build(project, monkeypatch, capsys, "--build_dir=other")
+
+    write(project / "rtl" / "top.v", TOP.format(include="regs_b.vs", instance=SUB_INSTANCE), PAST + 1)
+    build(project, monkeypatch, capsys)
+    assert generated(project) == "// A\n"
+    build(project, monkeypatch, capsys, "--build_dir=other")
+    assert not (project / "generated" / "regs_a.vs").exists()
+
+
+def test_state_records(tmp_path):
+    state = BuildState(str(tmp_path))
+    target = str(tmp_path / "build")
+    other_target = str(tmp_path / "build" / "other")
+    generated_file = str(tmp_path / "generated" / "regs_a.vs")
+    shared_file = str(tmp_path / "generated" / "regs_b.vs")
+    script = str(tmp_path / "scripts" / "regs.py")
+
+    assert state.record_outputs(target, {f"{target}/RTL/top.v": (str(tmp_path / "rtl" / "top.v"), None)}) == []
+    assert state.record_outputs(target, {}) == [f"{target}/RTL/top.v"]
+
+    assert state.record_generated(target, {generated_file: script, shared_file: script}) == []
+    assert state.record_generated(other_target, {shared_file: script}) == []
+    # Only the files no target uses anymore are listed
+    assert state.record_generated(target, {}) == [generated_file]
+    assert state.record_generated(other_target, {}) == [shared_file]
+
+    assert state.stamp(target) is None
+    state.set_stamp(target, {"arguments": ["top"]})
+    state.close()
+    assert BuildState(str(tmp_path)).stamp(target) == {"arguments": ["top"]}
+    state.set_stamp(target, None)
+    assert state.stamp(target) is None